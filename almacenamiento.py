@@ -0,0 +1,315 @@
+"""
+Almacenamiento en SQLite del Sistema de Bazar
+Motor alternativo a los CSV: se activa con MOTOR_ALMACENAMIENTO = 'sqlite' en config.py
+"""
+import csv
+import os
+import sqlite3
+import threading
+from config import *
+
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (
+    codigo TEXT PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    precio REAL NOT NULL,
+    categoria TEXT NOT NULL,
+    stock INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS ventas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha TEXT NOT NULL,
+    hora TEXT NOT NULL,
+    codigo TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    precio_unitario REAL NOT NULL,
+    subtotal REAL NOT NULL,
+    metodo_pago TEXT NOT NULL,
+    categoria TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas (fecha);
+CREATE INDEX IF NOT EXISTS idx_ventas_codigo ON ventas (codigo);
+CREATE INDEX IF NOT EXISTS idx_ventas_categoria ON ventas (categoria);
+CREATE INDEX IF NOT EXISTS idx_ventas_metodo_pago ON ventas (metodo_pago);
+
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+_almacenamiento = None
+_candado_instancia = threading.Lock()
+
+# Filas que recorrer_ventas trae por vez (el candado se suelta entre tandas)
+FILAS_POR_TANDA = 1000
+
+
+def obtener_almacenamiento():
+    """
+    Retorna la instancia compartida del almacenamiento SQLite.
+    La primera llamada puede llegar a la vez desde el hilo que carga el catálogo y
+    el hilo escritor: el candado asegura que se cree (y migre) una sola vez.
+    """
+    global _almacenamiento
+    with _candado_instancia:
+        if _almacenamiento is None:
+            _almacenamiento = AlmacenamientoSQLite()
+        return _almacenamiento
+
+
+class AlmacenamientoSQLite:
+    """
+    Guarda productos y ventas en una base SQLite (modo WAL).
+    La conexión se comparte entre la interfaz, el hilo escritor y el que carga el
+    catálogo: cada consulta y cada transacción se hace con self.candado tomado.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or RUTA_BD
+        self.candado = threading.RLock()
+        # La conexión puede crearse en el hilo que carga el catálogo al arrancar
+        self.conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        self.conexion.row_factory = sqlite3.Row
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.executescript(ESQUEMA)
+
+        # Importar el historial CSV la primera vez que se usa la base
+        if not self.obtener_meta('migracion_csv'):
+            self.migrar_ventas_csv()
+
+    def consultar(self, consulta, parametros=()):
+        """Ejecuta una consulta de lectura y retorna todas sus filas"""
+        with self.candado:
+            return self.conexion.execute(consulta, parametros).fetchall()
+
+    def obtener_meta(self, clave):
+        """Lee un valor de la tabla meta"""
+        filas = self.consultar("SELECT valor FROM meta WHERE clave = ?", (clave,))
+        return filas[0]['valor'] if filas else None
+
+    def guardar_meta(self, clave, valor):
+        """Guarda un valor en la tabla meta"""
+        with self.candado, self.conexion:
+            self.conexion.execute(
+                "INSERT INTO meta (clave, valor) VALUES (?, ?) "
+                "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+                (clave, valor))
+
+    # === PRODUCTOS ===
+
+    def hay_productos(self):
+        """Indica si la tabla de productos tiene datos"""
+        return bool(self.consultar("SELECT 1 FROM productos LIMIT 1"))
+
+    def cargar_productos(self):
+        """Retorna los productos como lista de dicts (en orden de alta)"""
+        filas = self.consultar(
+            "SELECT codigo, nombre, precio, categoria, stock FROM productos ORDER BY rowid")
+        return [dict(fila) for fila in filas]
+
+    def guardar_productos(self, productos):
+        """Reemplaza el catálogo completo en una transacción"""
+        with self.candado, self.conexion:
+            self.conexion.execute("DELETE FROM productos")
+            self.conexion.executemany(
+                "INSERT OR IGNORE INTO productos (codigo, nombre, precio, categoria, stock) "
+                "VALUES (:codigo, :nombre, :precio, :categoria, :stock)",
+                productos)
+
+    def aplicar_cambios(self, registros):
+        """Aplica un lote de cambios (mismo formato que el journal) en una transacción"""
+        with self.candado, self.conexion:
+            for registro in registros:
+                operacion = registro.get('op')
+                if operacion == 'stock':
+                    self.conexion.execute("UPDATE productos SET stock = ? WHERE codigo = ?",
+                                          (registro['stock'], registro['codigo']))
+                elif operacion == 'guardar':
+                    self.conexion.execute(
+                        "INSERT INTO productos (codigo, nombre, precio, categoria, stock) "
+                        "VALUES (:codigo, :nombre, :precio, :categoria, :stock) "
+                        "ON CONFLICT(codigo) DO UPDATE SET nombre = excluded.nombre, "
+                        "precio = excluded.precio, categoria = excluded.categoria, "
+                        "stock = excluded.stock",
+                        registro['producto'])
+                elif operacion == 'eliminar':
+                    self.conexion.execute("DELETE FROM productos WHERE codigo = ?",
+                                          (registro['codigo'],))
+
+    # === VENTAS ===
+
+    def insertar_ventas(self, ventas):
+        """Inserta ventas (con fecha y hora ya asignadas) en una transacción"""
+        with self.candado, self.conexion:
+            self.insertar_filas_ventas(ventas)
+
+    def insertar_filas_ventas(self, ventas):
+        """INSERT de las ventas, dentro de la transacción (y con el candado) del llamador"""
+        self.conexion.executemany(
+            "INSERT INTO ventas (fecha, hora, codigo, nombre, cantidad, precio_unitario, "
+            "subtotal, metodo_pago, categoria) VALUES (:fecha, :hora, :codigo, :nombre, "
+            ":cantidad, :precio_unitario, :subtotal, :metodo_pago, :categoria)",
+            ventas)
+
+    def recorrer_ventas(self, fecha_inicio, fecha_fin):
+        """
+        Genera las ventas entre dos fechas (inclusive) una por una, como dicts.
+        Se leen en tandas por id, sin dejar el candado tomado mientras se recorren.
+        """
+        ultimo_id = 0
+        while True:
+            filas = self.consultar(
+                "SELECT id, fecha, hora, codigo, nombre, cantidad, precio_unitario, subtotal, "
+                "metodo_pago, categoria FROM ventas WHERE fecha BETWEEN ? AND ? AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (fecha_inicio, fecha_fin, ultimo_id, FILAS_POR_TANDA))
+            for fila in filas:
+                venta = dict(fila)
+                ultimo_id = venta.pop('id')
+                yield venta
+            if len(filas) < FILAS_POR_TANDA:
+                return
+
+    def ventas_rango(self, fecha_inicio, fecha_fin):
+        """Retorna las ventas entre dos fechas (inclusive) como lista de dicts"""
+        return list(self.recorrer_ventas(fecha_inicio, fecha_fin))
+
+    def ventas_fecha(self, fecha):
+        """Retorna las ventas de una fecha"""
+        return self.ventas_rango(fecha, fecha)
+
+    def todas_las_ventas(self):
+        """Retorna todo el historial de ventas"""
+        filas = self.consultar(
+            "SELECT fecha, hora, codigo, nombre, cantidad, precio_unitario, subtotal, "
+            "metodo_pago, categoria FROM ventas ORDER BY id")
+        return [dict(fila) for fila in filas]
+
+    def hay_ventas(self, fecha_inicio, fecha_fin):
+        """Indica si hay ventas en el rango (usa el índice de fecha)"""
+        filas = self.consultar(
+            "SELECT 1 FROM ventas WHERE fecha BETWEEN ? AND ? LIMIT 1",
+            (fecha_inicio, fecha_fin))
+        return bool(filas)
+
+    def fechas_con_ventas(self, fecha_inicio, fecha_fin):
+        """Fechas distintas con ventas en el rango, ordenadas (usa el índice de fecha)"""
+        filas = self.consultar(
+            "SELECT DISTINCT fecha FROM ventas WHERE fecha BETWEEN ? AND ? ORDER BY fecha",
+            (fecha_inicio, fecha_fin))
+        return [fila[0] for fila in filas]
+
+    def inventario_vendido(self, fecha_inicio, fecha_fin, categoria=None, codigo_producto=None):
+        """
+        Agrega en SQL las ventas del rango por producto.
+        Mismo resultado que AnalizadorVentas.inventario_vendido sobre las filas crudas:
+        nombre y categoría de la última venta, orden por cantidad descendente.
+        """
+        condiciones = ["fecha BETWEEN ? AND ?"]
+        parametros = [fecha_inicio, fecha_fin]
+        if categoria:
+            condiciones.append("categoria = ?")
+            parametros.append(categoria)
+        if codigo_producto:
+            condiciones.append("codigo = ?")
+            parametros.append(codigo_producto)
+
+        # Nombre y categoría se toman de la venta más reciente (MAX(id)); el
+        # desempate por MIN(id) conserva el orden de aparición del cálculo en Python
+        consulta = (
+            "SELECT v.codigo, v.nombre, v.categoria, a.cantidad_total, a.ingresos_totales "
+            "FROM (SELECT codigo, SUM(cantidad) AS cantidad_total, "
+            "SUM(subtotal) AS ingresos_totales, MAX(id) AS ultima, MIN(id) AS primera "
+            f"FROM ventas WHERE {' AND '.join(condiciones)} GROUP BY codigo) AS a "
+            "JOIN ventas AS v ON v.id = a.ultima "
+            "ORDER BY a.cantidad_total DESC, a.primera"
+        )
+        return [{
+            'nombre': fila['nombre'],
+            'categoria': fila['categoria'],
+            'cantidad_total': fila['cantidad_total'],
+            'ingresos_totales': fila['ingresos_totales'],
+            'codigo': fila['codigo']
+        } for fila in self.consultar(consulta, parametros)]
+
+    def grupos_ventas(self, fecha_inicio, fecha_fin, por_hora=False):
+        """
+        Ventas del rango agrupadas por producto y método de pago (y hora del día con
+        por_hora), con el formato de los grupos de resumenes.py (primera/ultima son ids)
+        """
+        hora = ", CAST(substr(hora, 1, 2) AS INTEGER) AS hora_dia" if por_hora else ""
+        filas = self.consultar(
+            "SELECT codigo, nombre, categoria, metodo_pago, SUM(cantidad), SUM(subtotal), "
+            f"MIN(id), MAX(id){hora} FROM ventas WHERE fecha BETWEEN ? AND ? "
+            f"GROUP BY codigo, nombre, categoria, metodo_pago{', hora_dia' if por_hora else ''} "
+            "ORDER BY MIN(id)",
+            (fecha_inicio, fecha_fin))
+        return [list(fila) for fila in filas]
+
+    def horas_ventas(self, fecha_inicio, fecha_fin):
+        """
+        Cantidad e ingresos del rango por día de la semana (0 = lunes) y hora del día,
+        con el formato de 'horas' de resumenes.py
+        """
+        filas = self.consultar(
+            "SELECT (CAST(strftime('%w', fecha) AS INTEGER) + 6) % 7 AS dia, "
+            "CAST(substr(hora, 1, 2) AS INTEGER) AS hora_dia, SUM(cantidad), SUM(subtotal) "
+            "FROM ventas WHERE fecha BETWEEN ? AND ? GROUP BY dia, hora_dia",
+            (fecha_inicio, fecha_fin))
+        return [list(fila) for fila in filas]
+
+    # === MIGRACIÓN ===
+
+    def migrar_ventas_csv(self):
+        """
+        Importa (una sola vez) el historial de ventas_YYYY-MM-DD.csv de RUTA_VENTAS_APP.
+        Todo va en una transacción BEGIN IMMEDIATE que vuelve a mirar la marca de meta:
+        si otra conexión (u otra instancia del programa) ya migró, no se importa dos veces.
+        Returns: cantidad de ventas importadas
+        """
+        importadas = 0
+        with self.candado:
+            self.conexion.execute("BEGIN IMMEDIATE")
+            try:
+                if self.conexion.execute("SELECT 1 FROM meta WHERE clave = 'migracion_csv'").fetchone():
+                    self.conexion.rollback()
+                    return 0
+
+                if os.path.exists(RUTA_VENTAS_APP):
+                    for archivo in sorted(os.listdir(RUTA_VENTAS_APP)):
+                        if not (archivo.startswith('ventas_') and archivo.endswith('.csv')):
+                            continue
+                        ruta = os.path.join(RUTA_VENTAS_APP, archivo)
+                        try:
+                            with open(ruta, 'r', encoding='utf-8') as f:
+                                ventas = list(csv.DictReader(f))
+                            for venta in ventas:
+                                venta['cantidad'] = int(venta['cantidad'])
+                                venta['precio_unitario'] = float(venta['precio_unitario'])
+                                venta['subtotal'] = float(venta['subtotal'])
+                        except Exception as e:
+                            print(f"Error al migrar {archivo}: {e}")
+                            continue
+                        self.insertar_filas_ventas(ventas)
+                        importadas += len(ventas)
+
+                self.conexion.execute(
+                    "INSERT INTO meta (clave, valor) VALUES ('migracion_csv', ?) "
+                    "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+                    (str(importadas),))
+                self.conexion.commit()
+            except BaseException:
+                self.conexion.rollback()
+                raise
+        return importadas
+
+
+if __name__ == "__main__":
+    almacen = AlmacenamientoSQLite()
+    print(f"Base de datos: {almacen.ruta} (ventas importadas: {almacen.obtener_meta('migracion_csv')})")
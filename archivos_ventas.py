@@ -0,0 +1,63 @@
+"""
+Archivos de ventas del Sistema de Bazar
+Rutas, firmas e índice de fechas de los ventas_YYYY-MM-DD.csv de la carpeta de ventas.
+Lo usan los resúmenes, los archivos columnares y los reportes.
+"""
+import os
+import re
+import time
+from bisect import bisect_left, bisect_right
+from config import RUTA_VENTAS_APP
+
+PATRON_VENTAS = re.compile(r'ventas_(\d{4}-\d{2}-\d{2})\.csv')
+# Algunos discos guardan el mtime de la carpeta con resolución de segundos: un archivo
+# creado en el mismo segundo que el último escaneo no lo cambiaría
+MARGEN_MTIME_NS = 2_000_000_000
+
+_indices = {}  # carpeta -> (mtime_ns de la carpeta, fechas ordenadas)
+
+
+def ruta_ventas_dia(fecha, ruta_ventas=None):
+    """Ruta del CSV de ventas de una fecha (YYYY-MM-DD)"""
+    return os.path.join(ruta_ventas or RUTA_VENTAS_APP, f'ventas_{fecha}.csv')
+
+
+def fechas_disponibles(ruta_ventas=None):
+    """
+    Fechas (YYYY-MM-DD, ordenadas) que tienen CSV de ventas en la carpeta.
+    Se arma con un solo os.scandir y se reutiliza mientras no cambie el mtime de la carpeta.
+    """
+    ruta = ruta_ventas or RUTA_VENTAS_APP
+    try:
+        mtime = os.stat(ruta).st_mtime_ns
+    except OSError:
+        return ()
+    
+    indice = _indices.get(ruta)
+    if indice is not None and indice[0] == mtime:
+        return indice[1]
+    
+    fechas = []
+    with os.scandir(ruta) as entradas:
+        for entrada in entradas:
+            coincide = PATRON_VENTAS.fullmatch(entrada.name)
+            if coincide and entrada.is_file():
+                fechas.append(coincide.group(1))
+    fechas = tuple(sorted(fechas))
+    
+    # Si la carpeta cambió hace muy poco no se guarda: se vuelve a escanear la próxima vez
+    if time.time_ns() - mtime > MARGEN_MTIME_NS:
+        _indices[ruta] = (mtime, fechas)
+    return fechas
+
+
+def fechas_en_rango(fecha_inicio, fecha_fin, ruta_ventas=None):
+    """Fechas con ventas entre fecha_inicio y fecha_fin (inclusive), por búsqueda binaria"""
+    fechas = fechas_disponibles(ruta_ventas)
+    return fechas[bisect_left(fechas, fecha_inicio):bisect_right(fechas, fecha_fin)]
+
+
+def firma_archivo(ruta):
+    """(mtime_ns, tamaño) del CSV: si cambia, el resumen quedó desactualizado"""
+    estado = os.stat(ruta)
+    return [estado.st_mtime_ns, estado.st_size]
@@ -0,0 +1,35 @@
+"""
+Medición de tiempos de arranque del Sistema de Bazar
+Cada arranque agrega una línea a arranque.log con la duración de cada fase
+"""
+import time
+from datetime import datetime
+from config import RUTA_LOG_ARRANQUE
+
+INICIO = time.perf_counter()
+FASES_FINALES = {'primer_cuadro', 'catalogo_listo'}
+
+_fases = []
+_guardado = False
+
+
+def marcar(fase):
+    """Registra el momento en que termina una fase (segundos desde el inicio)"""
+    _fases.append((fase, time.perf_counter() - INICIO))
+    if FASES_FINALES <= {nombre for nombre, _ in _fases}:
+        guardar_log()
+
+
+def guardar_log():
+    """Agrega los tiempos registrados al log (una sola vez por arranque)"""
+    global _guardado
+    if _guardado:
+        return
+    _guardado = True
+
+    fases = ' | '.join(f"{nombre}={segundos:.3f}s" for nombre, segundos in _fases)
+    try:
+        with open(RUTA_LOG_ARRANQUE, 'a', encoding='utf-8') as f:
+            f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {fases}\n")
+    except Exception as e:
+        print(f"Error al guardar log de arranque: {e}")
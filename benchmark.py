@@ -0,0 +1,448 @@
+"""
+Micro-benchmarks del Sistema de Bazar
+Uso: python benchmark.py
+Trabaja sobre catálogos sintéticos en una carpeta temporal (no toca productos.csv)
+"""
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+import logica
+import columnar
+import motor_numpy
+import reportes
+import resumenes
+from config import COLUMNAS_PRODUCTOS
+
+TAMANOS_CATALOGO = [1_000, 10_000, 50_000, 200_000]
+CATEGORIAS = ['Bebidas', 'Snacks', 'Dulces', 'Panadería', 'Lácteos', 'Limpieza', 'Varios']
+
+
+def generar_catalogo(ruta, cantidad):
+    """Escribe un productos.csv sintético con `cantidad` productos"""
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.DictWriter(archivo, fieldnames=COLUMNAS_PRODUCTOS)
+        escritor.writeheader()
+        for i in range(cantidad):
+            escritor.writerow({
+                'codigo': f'{i:06d}',
+                'nombre': f'Producto {i} {random.choice(CATEGORIAS)}',
+                'precio': f'{random.uniform(0.5, 50):.2f}',
+                'categoria': random.choice(CATEGORIAS),
+                'stock': random.randint(0, 200)
+            })
+
+
+def crear_gestor(carpeta, cantidad):
+    """Crea un GestorProductos apuntando a un catálogo sintético"""
+    ruta = os.path.join(carpeta, f'productos_{cantidad}.csv')
+    generar_catalogo(ruta, cantidad)
+    logica.RUTA_PRODUCTOS = ruta
+    logica.RUTA_JOURNAL_PRODUCTOS = ruta + '.journal'
+    return logica.GestorProductos()
+
+
+def bench_busqueda_codigo(carpeta):
+    """Latencia de buscar_producto (debe ser plana respecto al tamaño)"""
+    print("\n== buscar_producto: latencia por búsqueda ==")
+    for cantidad in TAMANOS_CATALOGO:
+        gestor = crear_gestor(carpeta, cantidad)
+        codigos = [f'{random.randrange(cantidad):06d}' for _ in range(1000)]
+
+        def buscar():
+            for codigo in codigos:
+                gestor.buscar_producto(codigo)
+
+        mejor = min(timeit.repeat(buscar, number=10, repeat=5))
+        por_busqueda = mejor / (10 * len(codigos)) * 1e9
+        print(f"{cantidad:>8} productos: {por_busqueda:8.1f} ns/búsqueda")
+
+
+def bench_busqueda_texto(carpeta, cantidad=100_000):
+    """Latencia de buscar_coincidencias por tecla (búsqueda en vivo)"""
+    print(f"\n== buscar_coincidencias: {cantidad} productos ==")
+    gestor = crear_gestor(carpeta, cantidad)
+    for consulta in ['p', 'pr', 'pro', 'producto 12', 'bebidas', '0042', 'lacteos', 'zzz']:
+        mejor = min(timeit.repeat(lambda: gestor.buscar_coincidencias(consulta, 10),
+                                  number=20, repeat=5))
+        print(f"{consulta!r:>15}: {mejor / 20 * 1e3:7.3f} ms/tecla")
+
+
+def bench_stock_bajo(carpeta, cantidad=100_000):
+    """Listado de stock bajo: recorrido completo vs índice ordenado por stock"""
+    print(f"\n== productos_stock_bajo: {cantidad} productos ==")
+    gestor = crear_gestor(carpeta, cantidad)
+    logica.config.STOCK_ACTIVADO = True
+    umbral = logica.UMBRAL_STOCK_LISTADO
+    recorrido = min(timeit.repeat(lambda: [p for p in gestor.productos if p['stock'] <= umbral],
+                                  number=10, repeat=5)) / 10
+    indice = min(timeit.repeat(lambda: gestor.productos_stock_bajo(umbral),
+                               number=10, repeat=5)) / 10
+    print(f"{'recorrido':>12}: {recorrido * 1e3:7.3f} ms")
+    print(f"{'índice':>12}: {indice * 1e3:7.3f} ms  ({len(gestor.productos_stock_bajo(umbral))} productos)")
+    
+    productos = [gestor.buscar_producto(f'{random.randrange(cantidad):06d}') for _ in range(1000)]
+    mejor = min(timeit.repeat(lambda: [gestor.cambiar_stock(p, p['stock']) for p in productos],
+                              number=1, repeat=5))
+    print(f"{'cambio stock':>12}: {mejor / len(productos) * 1e6:7.2f} µs (mantiene el índice)")
+
+
+def bench_autoguardado(carpeta, lineas=500):
+    """Caja abierta de `lineas` ítems: JSON completo por ítem vs WAL de una línea por ítem"""
+    print(f"\n== Autoguardado de la caja: {lineas} ítems ==")
+    logica.RUTA_TEMPORAL_WAL = os.path.join(carpeta, 'ventas_temporales.wal')
+    producto = {'codigo': '000001', 'nombre': 'Producto 1', 'precio': 3.5, 'categoria': 'Bebidas'}
+    
+    def json_completo():
+        ventas = []
+        for _ in range(lineas):
+            ventas.append(dict(producto, cantidad=1, subtotal=3.5, metodo_pago='E'))
+            with open(os.path.join(carpeta, 'ventas_temporales.json'), 'w', encoding='utf-8') as f:
+                json.dump({'ventas': ventas}, f, ensure_ascii=False, indent=2)
+    
+    def wal():
+        gestor = logica.GestorVentas()
+        for _ in range(lineas):
+            gestor.agregar_venta(producto, 1, 'E')
+            gestor.autoguardar_temporal()
+        gestor.limpiar_temporal()
+    
+    # Sin fsync para comparar solo el costo de serializar y escribir
+    logica.FSYNC_TEMPORAL_CADA = 0
+    for nombre, funcion in [('JSON completo', json_completo), ('WAL', wal)]:
+        segundos = min(timeit.repeat(funcion, number=1, repeat=3))
+        print(f"{nombre:>14}: {segundos * 1e3:8.1f} ms total  ({segundos / lineas * 1e6:7.1f} µs/ítem)")
+
+
+def leer_productos_como_dicts(ruta):
+    """Formato anterior: lista de dicts de csv.DictReader convertidos en sitio"""
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        productos = list(csv.DictReader(archivo))
+    for producto in productos:
+        producto['precio'] = float(producto['precio'])
+        producto['stock'] = int(producto['stock'])
+    return productos
+
+
+def medir_carga(funcion, ruta):
+    """Retorna (segundos, MB retenidos) de cargar el catálogo con `funcion`"""
+    inicio = time.perf_counter()
+    funcion(ruta)
+    segundos = time.perf_counter() - inicio
+    
+    tracemalloc.start()
+    productos = funcion(ruta)
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del productos
+    return segundos, memoria / 1e6
+
+
+def bench_memoria_catalogo(carpeta, cantidad=150_000):
+    """Memoria y tiempo de carga: dicts por fila vs registros Producto con __slots__"""
+    print(f"\n== Carga de catálogo: {cantidad} productos ==")
+    ruta = os.path.join(carpeta, f'productos_{cantidad}.csv')
+    generar_catalogo(ruta, cantidad)
+    for nombre, funcion in [('dict por fila', leer_productos_como_dicts),
+                            ('Producto (__slots__)', logica.leer_productos_csv)]:
+        segundos, memoria = medir_carga(funcion, ruta)
+        print(f"{nombre:>22}: {segundos * 1e3:7.1f} ms  {memoria:7.1f} MB")
+
+
+def generar_ventas(carpeta, dias, filas_por_dia):
+    """Crea `dias` archivos ventas_YYYY-MM-DD.csv sintéticos desde 2025-01-01"""
+    campos = ['fecha', 'hora', 'codigo', 'nombre', 'cantidad', 'precio_unitario',
+              'subtotal', 'metodo_pago', 'categoria']
+    inicio = datetime(2025, 1, 1)
+    for dia in range(dias):
+        fecha = (inicio + timedelta(days=dia)).strftime('%Y-%m-%d')
+        with open(os.path.join(carpeta, f'ventas_{fecha}.csv'), 'w', newline='', encoding='utf-8') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(campos)
+            for _ in range(filas_por_dia):
+                codigo = random.randint(1, 300)
+                cantidad = random.randint(1, 5)
+                hora = f"{random.randint(8, 20):02d}:{random.randint(0, 59):02d}:00"
+                escritor.writerow([fecha, hora, f"{codigo:06d}", f"Producto {codigo}", cantidad,
+                                   2.5, 2.5 * cantidad, random.choice('EYPO'), 'Bebidas'])
+    return inicio.strftime('%Y-%m-%d'), (inicio + timedelta(days=dias - 1)).strftime('%Y-%m-%d')
+
+
+def bench_reporte_rango(carpeta, dias=3 * 365, filas_por_dia=150):
+    """Inventario vendido de varios años: releer todas las filas vs combinar resúmenes (año/mes/día)"""
+    print(f"\n== Reporte por rango: {dias} días x {filas_por_dia} ventas ==")
+    ventas = os.path.join(carpeta, 'ventas')
+    os.makedirs(os.path.join(ventas, 'resumenes'))
+    reportes.RUTA_VENTAS_APP = ventas
+    reportes.RUTA_RESUMENES = os.path.join(ventas, 'resumenes')
+    inicio, fin = generar_ventas(ventas, dias, filas_por_dia)
+    
+    def filas():
+        # Cálculo anterior: todas las filas del rango en memoria
+        analizador = reportes.AnalizadorVentas()
+        todas = []
+        for archivo in sorted(os.listdir(ventas)):
+            if archivo.endswith('.csv'):
+                analizador.cargar_ventas_fecha(archivo[7:17])
+                todas.extend(analizador.ventas)
+        analizador.ventas = todas
+        return analizador.inventario_vendido()
+    
+    def con_resumenes():
+        analizador = reportes.AnalizadorVentas()
+        analizador.cargar_ventas_rango(inicio, fin)
+        return analizador.inventario_vendido()
+    
+    segundos = timeit.timeit(con_resumenes, number=1)
+    print(f"{'primera vez (arma resúmenes)':>30}: {segundos * 1e3:8.1f} ms")
+    for nombre, funcion in [('filas', filas), ('resúmenes', con_resumenes)]:
+        segundos = min(timeit.repeat(funcion, number=1, repeat=3))
+        print(f"{nombre:>30}: {segundos * 1e3:8.1f} ms")
+
+
+def bench_filtros_bitmap(carpeta, dias=3 * 365, filas_por_dia=150):
+    """Filtros combinados sobre un periodo ya cargado: recorrer los grupos vs índice bitmap"""
+    print(f"\n== Filtros combinados sobre {dias} días cargados ==")
+    ventas = os.path.join(carpeta, 'filtros')
+    os.makedirs(os.path.join(ventas, 'resumenes'))
+    reportes.RUTA_VENTAS_APP = ventas
+    reportes.RUTA_RESUMENES = os.path.join(ventas, 'resumenes')
+    inicio, fin = generar_ventas(ventas, dias, filas_por_dia)
+    analizador = reportes.AnalizadorVentas()
+    analizador.cargar_ventas_rango(inicio, fin)
+    grupos = analizador.resumen_por_hora()['grupos']
+    condicion = {'metodo_pago': ['Y', 'P'], 'hora': range(18, 21),
+                 'codigo': [f"{codigo:06d}" for codigo in range(1, 301, 3)]}
+    
+    conjuntos = [(reportes.COLUMNAS_FILTRO[columna], set(valores))
+                 for columna, valores in condicion.items()]
+    
+    def recorriendo():
+        # Sin índice: probar cada grupo contra el filtro
+        elegidos = [grupo for grupo in grupos
+                    if all(grupo[posicion] in valores for posicion, valores in conjuntos)]
+        return reportes.agregar_inventario_grupos(elegidos)
+    
+    armado = timeit.timeit(analizador.indice_por_hora, number=1)
+    print(f"{'armar índice':>14}: {armado * 1e3:7.1f} ms ({len(grupos)} grupos, una vez por carga)")
+    for nombre, funcion in [('recorriendo', recorriendo),
+                            ('bitmap', lambda: analizador.consultar(condicion))]:
+        segundos = min(timeit.repeat(funcion, number=1, repeat=5))
+        print(f"{nombre:>14}: {segundos * 1e3:7.1f} ms")
+
+
+def bench_mapa_horas(carpeta, dias=365, filas_por_dia=150):
+    """Mapas de calor de un año: recorrer todas las filas vs resúmenes por hora"""
+    print(f"\n== Ventas por hora: {dias} días x {filas_por_dia} ventas ==")
+    ventas = os.path.join(carpeta, 'horas')
+    os.makedirs(os.path.join(ventas, 'resumenes'))
+    reportes.RUTA_VENTAS_APP = ventas
+    reportes.RUTA_RESUMENES = os.path.join(ventas, 'resumenes')
+    inicio, fin = generar_ventas(ventas, dias, filas_por_dia)
+    
+    def filas():
+        # Sin resúmenes: leer cada venta y sumarla a su día de la semana y hora
+        semana = [[0] * 24 for _ in range(7)]
+        productos = {}
+        for fecha in resumenes.fechas_en_rango(inicio, fin, ventas):
+            dia = datetime.strptime(fecha, '%Y-%m-%d').weekday()
+            for venta in reportes.leer_filas(fecha):
+                hora = int(venta['hora'][:2])
+                semana[dia][hora] += venta['cantidad']
+                productos.setdefault(venta['codigo'], [0] * 24)[hora] += venta['cantidad']
+        return semana, productos
+    
+    def con_resumenes():
+        analizador = reportes.AnalizadorVentas()
+        analizador.cargar_ventas_rango(inicio, fin)
+        return analizador.mapa_semana(promedio=True), analizador.mapa_productos()
+    
+    segundos = timeit.timeit(con_resumenes, number=1)
+    print(f"{'primera vez (arma resúmenes)':>30}: {segundos * 1e3:8.1f} ms")
+    for nombre, funcion in [('filas', filas), ('resúmenes', con_resumenes)]:
+        segundos = min(timeit.repeat(funcion, number=1, repeat=3))
+        print(f"{nombre:>30}: {segundos * 1e3:8.1f} ms")
+
+
+def bench_descubrir_dias(carpeta, anios=5):
+    """Días con ventas en un rango: os.path.exists por día del calendario vs índice de la carpeta"""
+    print(f"\n== Días con ventas en {anios} años (abre 3 días por semana) ==")
+    ventas = os.path.join(carpeta, 'dias')
+    os.makedirs(ventas)
+    inicio = datetime(2020, 1, 1)
+    dias = anios * 365
+    for dia in range(dias):
+        fecha = inicio + timedelta(days=dia)
+        if fecha.weekday() in (4, 5, 6):
+            open(os.path.join(ventas, f"ventas_{fecha.strftime('%Y-%m-%d')}.csv"), 'w').close()
+    # Índice con mtime de la carpeta "viejo" (como en uso normal)
+    hace_un_rato = time.time() - 60
+    os.utime(ventas, (hace_un_rato, hace_un_rato))
+    fecha_inicio = inicio.strftime('%Y-%m-%d')
+    fecha_fin = (inicio + timedelta(days=dias - 1)).strftime('%Y-%m-%d')
+    
+    def por_dia():
+        fechas = []
+        for dia in range(dias):
+            fecha = (inicio + timedelta(days=dia)).strftime('%Y-%m-%d')
+            if os.path.exists(os.path.join(ventas, f'ventas_{fecha}.csv')):
+                fechas.append(fecha)
+        return fechas
+    
+    def con_indice():
+        return resumenes.fechas_en_rango(fecha_inicio, fecha_fin, ventas)
+    
+    for nombre, funcion in [('exists por día', por_dia), ('índice (scandir)', con_indice)]:
+        segundos = min(timeit.repeat(funcion, number=5, repeat=3)) / 5
+        print(f"{nombre:>18}: {segundos * 1e3:8.3f} ms  ({len(funcion())} días)")
+
+
+def bench_resumenes_paralelo(carpeta, filas_por_dia=400):
+    """Calcular resúmenes diarios desde los CSV: en serie vs pool de procesos, según la cantidad de días"""
+    procesos = max(2, os.cpu_count() or 1)
+    print(f"\n== Resúmenes desde CSV: serie vs {procesos} procesos ({os.cpu_count()} núcleos) ==")
+    ventas = os.path.join(carpeta, 'paralelo')
+    destino = os.path.join(ventas, 'resumenes')
+    os.makedirs(destino)
+    generar_ventas(ventas, 480, filas_por_dia)
+    todas = list(resumenes.fechas_disponibles(ventas))
+    resumenes.MIN_DIAS_PARALELO = 0  # medir el pool aun con pocos días
+    
+    for dias in (15, 30, 60, 120, 240, 480):
+        fechas = todas[:dias]
+        serie = timeit.timeit(lambda: resumenes.calcular_resumenes(fechas, ventas, destino), number=1)
+        paralelo = timeit.timeit(
+            lambda: resumenes.calcular_en_paralelo(fechas, ventas, destino, procesos), number=1)
+        ganador = 'pool' if paralelo < serie else 'serie'
+        print(f"{dias:>5} días: serie {serie * 1e3:8.1f} ms  pool {paralelo * 1e3:8.1f} ms  -> {ganador}")
+    print("  (MIN_DIAS_PARALELO en config.py debería quedar cerca del primer 'pool')")
+
+
+def bench_reporte_dia_memoria(carpeta, filas=100_000):
+    """Reporte del día: cargar todas las filas en self.ventas vs recorrerlas en una pasada"""
+    print(f"\n== Reporte del día: {filas} ventas ==")
+    ventas = os.path.join(carpeta, 'dia')
+    os.makedirs(ventas)
+    reportes.RUTA_VENTAS_APP = ventas
+    fecha, _ = generar_ventas(ventas, 1, filas)
+    
+    def con_filas():
+        analizador = reportes.AnalizadorVentas()
+        analizador.cargar_ventas_fecha(fecha)
+        return reportes.agregar_reporte_dia(analizador.ventas)
+    
+    def en_una_pasada():
+        return reportes.AnalizadorVentas().reporte_dia(fecha)
+    
+    for nombre, funcion in [('filas en memoria', con_filas), ('una pasada', en_una_pasada)]:
+        inicio = time.perf_counter()
+        tracemalloc.start()
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        segundos = time.perf_counter() - inicio
+        print(f"{nombre:>18}: {segundos * 1e3:8.1f} ms  pico {pico / 1e6:6.1f} MB")
+
+
+def bench_cache_reportes(carpeta, filas=5_000):
+    """Ir y volver entre los mismos días en el Reporte del Día: sin caché vs con caché"""
+    print(f"\n== Reporte del día, 3 días x {filas} ventas, 30 consultas ==")
+    ventas = os.path.join(carpeta, 'cache')
+    os.makedirs(ventas)
+    reportes.RUTA_VENTAS_APP = ventas
+    generar_ventas(ventas, 3, filas)
+    fechas = list(resumenes.fechas_disponibles(ventas)) * 10
+    analizador = reportes.AnalizadorVentas()
+    
+    def sin_cache():
+        for fecha in fechas:
+            analizador.calcular_reporte_dia(fecha)
+    
+    def con_cache():
+        for fecha in fechas:
+            analizador.reporte_dia(fecha)
+    
+    for nombre, funcion in [('sin caché', sin_cache), ('con caché', con_cache)]:
+        segundos = timeit.timeit(funcion, number=1)
+        print(f"{nombre:>10}: {segundos * 1e3:8.1f} ms")
+    print(f"{'':>10}  {reportes.cache_reportes.estadisticas()}")
+
+
+def bench_columnar(carpeta, filas=100_000):
+    """Leer un día: CSV (int/float por fila) vs archivo columnar con mmap"""
+    print(f"\n== Lectura de un día: {filas} ventas, CSV vs columnar ==")
+    ventas = os.path.join(carpeta, 'columnar')
+    os.makedirs(ventas)
+    reportes.RUTA_VENTAS_APP = ventas
+    fecha, _ = generar_ventas(ventas, 1, filas)
+    ruta_col = columnar.ruta_columnas(fecha, ventas)
+    
+    def leer():
+        for _ in reportes.leer_filas(fecha):
+            pass
+    
+    def reporte():
+        reportes.AnalizadorVentas().calcular_reporte_dia(fecha)
+    
+    for nombre in ('CSV', 'columnar'):
+        if nombre == 'columnar':
+            columnar.convertir_dia(fecha, ventas)
+        tamano = os.path.getsize(ruta_col if nombre == 'columnar' else
+                                 resumenes.ruta_ventas_dia(fecha, ventas))
+        filas_seg = min(timeit.repeat(leer, number=1, repeat=3))
+        reporte_seg = min(timeit.repeat(reporte, number=1, repeat=3))
+        print(f"{nombre:>9}: filas {filas_seg * 1e3:7.1f} ms  reporte {reporte_seg * 1e3:7.1f} ms  "
+              f"archivo {tamano / 1e6:5.2f} MB")
+
+
+def bench_motor_numpy(carpeta, filas=200_000):
+    """Agregar un día columnar grande: bucle en Python vs NumPy (si está instalado)"""
+    print(f"\n== Agregación de un día de {filas} ventas: Python vs NumPy ==")
+    if not motor_numpy.NUMPY_DISPONIBLE:
+        print("NumPy no está instalado: se omite")
+        return
+    ventas = os.path.join(carpeta, 'numpy')
+    os.makedirs(ventas)
+    reportes.RUTA_VENTAS_APP = ventas
+    fecha, _ = generar_ventas(ventas, 1, filas)
+    columnar.convertir_dia(fecha, ventas)
+    
+    motor_original = motor_numpy.MOTOR_AGREGACION
+    try:
+        for motor in ('python', 'numpy'):
+            motor_numpy.MOTOR_AGREGACION = motor
+            resumen = min(timeit.repeat(lambda: resumenes.calcular_resumen(fecha, ventas),
+                                        number=1, repeat=3))
+            reporte = min(timeit.repeat(lambda: reportes.acumular_dia(fecha), number=1, repeat=3))
+            print(f"{motor:>7}: resumen {resumen * 1e3:7.1f} ms  reporte del día {reporte * 1e3:7.1f} ms")
+    finally:
+        motor_numpy.MOTOR_AGREGACION = motor_original
+
+
+def main():
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as carpeta:
+        bench_busqueda_codigo(carpeta)
+        bench_busqueda_texto(carpeta)
+        bench_stock_bajo(carpeta)
+        bench_autoguardado(carpeta)
+        bench_memoria_catalogo(carpeta)
+        bench_reporte_rango(carpeta)
+        bench_descubrir_dias(carpeta)
+        bench_filtros_bitmap(carpeta)
+        bench_mapa_horas(carpeta)
+        bench_resumenes_paralelo(carpeta)
+        bench_reporte_dia_memoria(carpeta)
+        bench_cache_reportes(carpeta)
+        bench_columnar(carpeta)
+        bench_motor_numpy(carpeta)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Archivo columnar de ventas del Sistema de Bazar
+Junto a cada ventas_YYYY-MM-DD.csv de un día ya terminado se guarda una copia
+binaria por columnas (Excel_app/columnas/ventas_YYYY-MM-DD.col) que los reportes
+leen con mmap, sin convertir texto a números fila por fila. El CSV sigue siendo la fuente de verdad:
+si cambió desde que se armó la copia, la copia se ignora.
+
+Formato: b'VCOL1' | largo del encabezado (uint32) | encabezado JSON | columnas.
+Código, nombre, categoría y método van como índices a un diccionario; precio y
+subtotal en céntimos; la hora en segundos desde medianoche.
+"""
+import bisect
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date
+from archivos_ventas import ruta_ventas_dia, fechas_disponibles, firma_archivo
+from config import RUTA_VENTAS_APP
+
+MAGICO = b'VCOL1'
+ALINEACION = 8  # cada columna empieza en múltiplo de 8 bytes (memoryview.cast)
+
+# Columnas de texto codificadas con diccionario y columnas numéricas (typecode de array)
+COLUMNAS_TEXTO = ('codigo', 'nombre', 'categoria', 'metodo_pago')
+COLUMNAS_NUMERO = (('cantidad', 'i'), ('precio_unitario', 'q'), ('subtotal', 'q'), ('hora', 'i'))
+
+
+def ruta_columnas(fecha, ruta_ventas=None):
+    """Ruta del archivo columnar de una fecha (en la carpeta columnas/ junto a los CSV)"""
+    return os.path.join(ruta_ventas or RUTA_VENTAS_APP, 'columnas', f'ventas_{fecha}.col')
+
+
+def a_centimos(valor):
+    """Convierte un monto a céntimos; None si tiene más de 2 decimales"""
+    centimos = round(float(valor) * 100)
+    if abs(centimos / 100 - float(valor)) > 1e-9:
+        return None
+    return centimos
+
+
+def a_segundos(hora):
+    """'HH:MM:SS' -> segundos desde medianoche"""
+    horas, minutos, segundos = hora.split(':')
+    return int(horas) * 3600 + int(minutos) * 60 + int(segundos)
+
+
+def a_hora(segundos):
+    """Segundos desde medianoche -> 'HH:MM:SS'"""
+    return f"{segundos // 3600:02d}:{segundos // 60 % 60:02d}:{segundos % 60:02d}"
+
+
+class Columnas:
+    """Columnas de un día en memoria (para armar el archivo)"""
+
+    def __init__(self, fecha):
+        self.fecha = fecha
+        self.diccionarios = {nombre: [] for nombre in COLUMNAS_TEXTO}
+        self.indices = {nombre: {} for nombre in COLUMNAS_TEXTO}
+        self.datos = {nombre: array('i') for nombre in COLUMNAS_TEXTO}
+        for nombre, tipo in COLUMNAS_NUMERO:
+            self.datos[nombre] = array(tipo)
+
+    def agregar(self, venta):
+        """
+        Agrega una venta (valores del CSV, texto o número)
+        Returns: False si no se puede representar sin perder datos (no se agrega nada)
+        """
+        try:
+            numeros = (int(venta['cantidad']), a_centimos(venta['precio_unitario']),
+                       a_centimos(venta['subtotal']), a_segundos(venta['hora']))
+        except (ValueError, TypeError, KeyError):
+            return False
+        # Al leer se reconstruye fecha y hora: tienen que volver idénticas
+        if None in numeros or venta['fecha'] != self.fecha or a_hora(numeros[3]) != venta['hora']:
+            return False
+
+        for nombre in COLUMNAS_TEXTO:
+            texto = venta[nombre]
+            indice = self.indices[nombre].get(texto)
+            if indice is None:
+                indice = self.indices[nombre][texto] = len(self.diccionarios[nombre])
+                self.diccionarios[nombre].append(texto)
+            self.datos[nombre].append(indice)
+        for (nombre, _), valor in zip(COLUMNAS_NUMERO, numeros):
+            self.datos[nombre].append(valor)
+        return True
+
+    def guardar(self, ruta, firma):
+        """Escribe el archivo de forma atómica (temporal + renombrar)"""
+        filas = len(self.datos['cantidad'])
+        columnas = {}
+        desplazamiento = 0
+        for nombre, datos in self.datos.items():
+            columnas[nombre] = [datos.typecode, desplazamiento]
+            desplazamiento += -(-datos.itemsize * filas // ALINEACION) * ALINEACION
+
+        encabezado = json.dumps({
+            'fecha': self.fecha, 'filas': filas, 'firma': firma, 'orden': sys.byteorder,
+            'diccionarios': self.diccionarios, 'columnas': columnas
+        }, ensure_ascii=False).encode('utf-8')
+        # Las columnas empiezan alineadas después del encabezado
+        inicio = len(MAGICO) + 4 + len(encabezado)
+        relleno = -inicio % ALINEACION
+
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(MAGICO + struct.pack('<I', len(encabezado)) + encabezado + b' ' * relleno)
+            for datos in self.datos.values():
+                datos.tofile(f)
+                f.write(b'\0' * (-datos.itemsize * filas % ALINEACION))
+        os.replace(temporal, ruta)
+
+
+class ArchivoColumnar:
+    """Archivo columnar abierto con mmap (usar con 'with' para liberarlo)"""
+
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as f:
+            self.mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.vistas = []
+        try:
+            if self.mapa[:len(MAGICO)] != MAGICO:
+                raise ValueError("no es un archivo columnar")
+            largo, = struct.unpack_from('<I', self.mapa, len(MAGICO))
+            inicio = len(MAGICO) + 4
+            self.encabezado = json.loads(self.mapa[inicio:inicio + largo].decode('utf-8'))
+            if self.encabezado['orden'] != sys.byteorder:
+                raise ValueError("orden de bytes distinto")
+
+            base = inicio + largo
+            base += -base % ALINEACION
+            self.filas = self.encabezado['filas']
+            self.columnas = {}
+            for nombre, (tipo, desplazamiento) in self.encabezado['columnas'].items():
+                tamano = array(tipo).itemsize * self.filas
+                vista = memoryview(self.mapa)[base + desplazamiento:base + desplazamiento + tamano]
+                self.vistas.append(vista)
+                self.columnas[nombre] = vista.cast(tipo)
+                self.vistas.append(self.columnas[nombre])
+        except Exception:
+            self.cerrar()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        self.cerrar()
+
+    def cerrar(self):
+        """Libera las vistas y el mmap (en Windows el archivo queda bloqueado mientras tanto)"""
+        for vista in reversed(self.vistas):
+            vista.release()
+        self.vistas = []
+        self.columnas = {}
+        self.mapa.close()
+
+    def firma(self):
+        """Firma del CSV con la que se armó"""
+        return self.encabezado['firma']
+
+    def filas_dict(self):
+        """Genera las ventas como dicts (mismas claves y tipos que el CSV ya convertido)"""
+        fecha = self.encabezado['fecha']
+        diccionarios = self.encabezado['diccionarios']
+        codigos, nombres = diccionarios['codigo'], diccionarios['nombre']
+        categorias, metodos = diccionarios['categoria'], diccionarios['metodo_pago']
+        c = self.columnas
+        horas = {}
+        for hora, codigo, nombre, cantidad, precio, subtotal, metodo, categoria in zip(
+                c['hora'], c['codigo'], c['nombre'], c['cantidad'], c['precio_unitario'],
+                c['subtotal'], c['metodo_pago'], c['categoria']):
+            texto_hora = horas.get(hora)
+            if texto_hora is None:
+                texto_hora = horas[hora] = a_hora(hora)
+            yield {
+                'fecha': fecha,
+                'hora': texto_hora,
+                'codigo': codigos[codigo],
+                'nombre': nombres[nombre],
+                'cantidad': cantidad,
+                'precio_unitario': precio / 100,
+                'subtotal': subtotal / 100,
+                'metodo_pago': metodos[metodo],
+                'categoria': categorias[categoria]
+            }
+
+
+def abrir_dia(fecha, ruta_ventas=None, firma=None):
+    """
+    Abre el archivo columnar de una fecha si existe y corresponde al CSV actual
+    (o a la firma indicada)
+    Returns: ArchivoColumnar (cerrarlo con 'with') o None
+    """
+    try:
+        if firma is None:
+            firma = firma_archivo(ruta_ventas_dia(fecha, ruta_ventas))
+        archivo = ArchivoColumnar(ruta_columnas(fecha, ruta_ventas))
+    except (OSError, ValueError, KeyError):
+        return None
+    if archivo.firma() != firma:
+        archivo.cerrar()
+        return None
+    return archivo
+
+
+def filas_dia(fecha, ruta_ventas=None):
+    """Ventas del archivo columnar de una fecha, leyendo solo el encabezado (0 si no está al día)"""
+    try:
+        firma = firma_archivo(ruta_ventas_dia(fecha, ruta_ventas))
+        with open(ruta_columnas(fecha, ruta_ventas), 'rb') as f:
+            if f.read(len(MAGICO)) != MAGICO:
+                return 0
+            largo, = struct.unpack('<I', f.read(4))
+            encabezado = json.loads(f.read(largo).decode('utf-8'))
+    except (OSError, ValueError, struct.error):
+        return 0
+    return encabezado.get('filas', 0) if encabezado.get('firma') == firma else 0
+
+
+def convertir_dia(fecha, ruta_ventas=None):
+    """
+    Arma el archivo columnar de un día leyendo su CSV
+    Returns: True si se guardó, False si el CSV tiene valores que no se pueden representar
+    """
+    ruta_csv = ruta_ventas_dia(fecha, ruta_ventas)
+    firma = firma_archivo(ruta_csv)
+    columnas = Columnas(fecha)
+    with open(ruta_csv, 'r', encoding='utf-8') as f:
+        for venta in csv.DictReader(f):
+            if not columnas.agregar(venta):
+                eliminar_dia(fecha, ruta_ventas)
+                return False
+    columnas.guardar(ruta_columnas(fecha, ruta_ventas), firma)
+    return True
+
+
+def convertir_anterior(fecha, ruta_ventas=None):
+    """
+    Arma el archivo columnar del último día con ventas antes de fecha, si no lo tiene al día.
+    Se llama al cerrar caja: ese día ya terminó y su CSV no vuelve a cambiar, así que
+    cada día se convierte una sola vez (el día en curso se sigue leyendo del CSV).
+    Returns: True si el día anterior quedó con su archivo (o no hay día anterior)
+    """
+    fechas = fechas_disponibles(ruta_ventas)
+    i = bisect.bisect_left(fechas, fecha)
+    if i == 0:
+        return True
+    anterior = fechas[i - 1]
+    archivo = abrir_dia(anterior, ruta_ventas)
+    if archivo is not None:
+        archivo.cerrar()
+        return True
+    return convertir_dia(anterior, ruta_ventas)
+
+
+def eliminar_dia(fecha, ruta_ventas=None):
+    """Borra el archivo columnar de un día (los reportes vuelven a usar el CSV)"""
+    try:
+        os.remove(ruta_columnas(fecha, ruta_ventas))
+    except OSError:
+        pass
+
+
+def convertir_historial(ruta_ventas=None):
+    """
+    Arma (o rehace) el archivo columnar de cada día del historial que no lo tenga al día.
+    El día en curso no se convierte: su CSV sigue cambiando (se convierte al cerrar caja
+    el día siguiente, ver convertir_anterior).
+    Returns: (convertidos, ya al día, omitidos por valores no representables)
+    """
+    hoy = date.today().isoformat()
+    convertidos = al_dia = omitidos = 0
+    for fecha in fechas_disponibles(ruta_ventas):
+        if fecha >= hoy:
+            continue
+        archivo = abrir_dia(fecha, ruta_ventas)
+        if archivo is not None:
+            archivo.cerrar()
+            al_dia += 1
+            continue
+        try:
+            if convertir_dia(fecha, ruta_ventas):
+                convertidos += 1
+            else:
+                omitidos += 1
+        except (OSError, ValueError) as e:
+            print(f"Error al convertir ventas del {fecha}: {e}")
+            omitidos += 1
+    return convertidos, al_dia, omitidos
+
+
+if __name__ == "__main__":
+    convertidos, al_dia, omitidos = convertir_historial()
+    print(f"Archivos columnares: {convertidos} convertidos, {al_dia} ya al día, {omitidos} omitidos")
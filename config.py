@@ -28,8 +28,13 @@ RUTA_PRODUCTOS = os.path.join(RUTA_BASE, "productos.csv")
 RUTA_VENTAS = os.path.join(RUTA_BASE, "ventas_diarias")  # Carpeta principal
 RUTA_VENTAS_APP = os.path.join(RUTA_VENTAS, "Excel_app")  # CSV para el programa
 RUTA_VENTAS_REGISTRO = os.path.join(RUTA_VENTAS, "Excel_registro")  # Excel visual
+RUTA_RESUMENES = os.path.join(RUTA_VENTAS_APP, "resumenes")  # resumen precalculado de cada día
 RUTA_CONFIG_STOCK = os.path.join(RUTA_BASE, "config_stock.txt")
-RUTA_TEMPORAL = os.path.join(RUTA_BASE, "ventas_temporales.json")  # temp para guardar ventas en curso
+RUTA_TEMPORAL = os.path.join(RUTA_BASE, "ventas_temporales.json")  # temp de versiones anteriores (se migra al WAL)
+RUTA_TEMPORAL_WAL = os.path.join(RUTA_BASE, "ventas_temporales.wal")  # temp para guardar ventas en curso
+RUTA_JOURNAL_PRODUCTOS = os.path.join(RUTA_BASE, "productos.journal")  # cambios pendientes de compactar
+RUTA_BD = os.path.join(RUTA_BASE, "bazar.db")  # base SQLite (solo con MOTOR_ALMACENAMIENTO = 'sqlite')
+RUTA_LOG_ARRANQUE = os.path.join(RUTA_BASE, "arranque.log")  # tiempos de cada fase del arranque
 
 # Crear carpetas si no existen
 if not os.path.exists(RUTA_VENTAS):
@@ -38,6 +43,8 @@ if not os.path.exists(RUTA_VENTAS_APP):
     os.makedirs(RUTA_VENTAS_APP)
 if not os.path.exists(RUTA_VENTAS_REGISTRO):
     os.makedirs(RUTA_VENTAS_REGISTRO)
+if not os.path.exists(RUTA_RESUMENES):
+    os.makedirs(RUTA_RESUMENES)
 
 # Métodos de pago
 METODOS_PAGO = {
@@ -77,6 +84,57 @@ COLUMNAS_PRODUCTOS = ['codigo', 'nombre', 'precio', 'categoria', 'stock']
 COLUMNAS_VENTAS = ['fecha', 'hora', 'codigo', 'nombre', 'cantidad', 'precio_unitario', 
                    'subtotal', 'metodo_pago', 'categoria']
 
+# Motor de almacenamiento: 'csv' (archivos planos) o 'sqlite' (bazar.db).
+# Al usar 'sqlite' por primera vez se importan productos.csv y el historial de ventas CSV.
+MOTOR_ALMACENAMIENTO = 'csv'
+
+# Arranque rápido: la ventana se muestra de inmediato y el catálogo se carga en
+# segundo plano (la búsqueda se habilita cuando termina)
+ARRANQUE_RAPIDO = True
+
+# Journal de productos (solo motor 'csv'): los cambios (stock, ediciones) se agregan al final de
+# productos.journal y se compactan en productos.csv al cerrar o al superar el límite
+JOURNAL_PRODUCTOS_ACTIVADO = True
+LIMITE_JOURNAL_BYTES = 256 * 1024
+
+# Guardado diferido del stock: los cambios se acumulan en memoria y se escriben
+# en lote cada INTERVALO_GUARDADO_MS, cada MAX_CAMBIOS_PENDIENTES cambios,
+# al cerrar caja y al cerrar el programa
+INTERVALO_GUARDADO_MS = 5000
+MAX_CAMBIOS_PENDIENTES = 20
+
+# Verificación de totales de la caja: si es True, cada cálculo de totales se compara
+# con un recálculo completo de las ventas (AssertionError si no coinciden). Para pruebas.
+VERIFICAR_TOTALES = False
+
+# Temporal de la venta en curso (ventas_temporales.wal): cada cuántos autoguardados se
+# hace fsync. 1 = siempre (lo más seguro ante cortes de luz), 0 = nunca (lo decide el sistema)
+FSYNC_TEMPORAL_CADA = 1
+
+# Hilo escritor: máximo de escrituras en cola (si se llena, la interfaz espera)
+MAX_ESCRITURAS_EN_COLA = 100
+
+# Procesos para generar los Excel de registro en paralelo (0 = uno por núcleo)
+PROCESOS_EXCEL = 0
+
+# Resúmenes diarios a calcular desde los CSV en un reporte por rango:
+# desde MIN_DIAS_PARALELO días se reparten en tandas entre procesos (0 = uno por núcleo)
+PROCESOS_LECTURA = 0
+MIN_DIAS_PARALELO = 60
+DIAS_POR_TANDA = 16
+
+# Caché de reportes del día ya calculados (se descartan los menos usados)
+MAX_REPORTES_CACHE = 30
+MAX_MB_CACHE_REPORTES = 20
+
+# Agregación con NumPy (opcional) de los días guardados en formato columnar:
+# 'auto' = si NumPy está instalado y el rango a sumar llega a MIN_FILAS_NUMPY ventas en total
+# (importar NumPy tarda ~0,15 s); ya importado, también cada día desde MIN_FILAS_DIA_NUMPY,
+# 'numpy' = siempre que esté instalado, 'python' = nunca
+MOTOR_AGREGACION = 'auto'
+MIN_FILAS_NUMPY = 50000
+MIN_FILAS_DIA_NUMPY = 200
+
 # Configuración de stock
 def cargar_config_stock():
     """Carga la configuración de si el stock está activado"""
@@ -98,4 +156,8 @@ def guardar_config_stock(activado):
         return False
 
 # Variable global para control de stock
-STOCK_ACTIVADO = cargar_config_stock()
\ No newline at end of file
+STOCK_ACTIVADO = cargar_config_stock()
+
+# Umbrales de stock bajo: alerta al vender y listado de "Ver Productos con Stock Bajo"
+UMBRAL_STOCK_BAJO = 5
+UMBRAL_STOCK_LISTADO = 10
\ No newline at end of file
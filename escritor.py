@@ -0,0 +1,136 @@
+"""
+Hilo escritor del Sistema de Bazar
+Todas las escrituras a disco (ventas, productos, temporal) pasan por una cola
+acotada y un único hilo, así la interfaz no se congela en discos lentos.
+Los trabajos pesados de CPU (generar Excel) van a un pool de procesos.
+"""
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import MAX_ESCRITURAS_EN_COLA, PROCESOS_EXCEL
+
+_FIN = object()  # marca para detener el hilo
+
+
+def ejecutar(escritor, descripcion, funcion, *args, al_fallar=None, al_terminar=None):
+    """
+    Ejecuta una escritura en el hilo escritor (si hay uno) o aquí mismo.
+    al_terminar(resultado) / al_fallar(error) se llaman al terminar (en el hilo de la interfaz).
+    Returns: True si se encoló o se escribió bien, False si falló
+    """
+    if escritor is not None:
+        escritor.encolar(descripcion, funcion, *args, al_fallar=al_fallar, al_terminar=al_terminar)
+        return True
+
+    try:
+        resultado = funcion(*args)
+    except Exception as e:
+        print(f"Error al {descripcion}: {e}")
+        if al_fallar:
+            al_fallar(e)
+        return False
+
+    if al_terminar:
+        al_terminar(resultado)
+    return True
+
+
+class EscritorDisco:
+    """Serializa las escrituras en un hilo aparte y guarda los resultados para la interfaz"""
+
+    def __init__(self, max_en_cola=MAX_ESCRITURAS_EN_COLA):
+        self.cola = queue.Queue(maxsize=max_en_cola)
+        self.resultados = queue.Queue()
+        self.hilo = threading.Thread(target=self.trabajar, daemon=True)
+        self.hilo.start()
+        # Pool de procesos para trabajos de CPU (se crea al primer uso)
+        self.procesos = None
+        self.trabajos_en_proceso = 0
+        self.candado = threading.Lock()
+
+    def encolar(self, descripcion, funcion, *args, al_fallar=None, al_terminar=None):
+        """Agrega una escritura a la cola (si está llena espera a que se libere lugar)"""
+        self.cola.put((descripcion, funcion, args, al_fallar, al_terminar))
+
+    def trabajar(self):
+        """Bucle del hilo escritor: ejecuta las escrituras en orden de llegada"""
+        while True:
+            tarea = self.cola.get()
+            if tarea is _FIN:
+                self.cola.task_done()
+                return
+
+            descripcion, funcion, args, al_fallar, al_terminar = tarea
+            try:
+                resultado = funcion(*args)
+                self.resultados.put((descripcion, resultado, None, al_terminar))
+            except Exception as e:
+                print(f"Error al {descripcion}: {e}")
+                self.resultados.put((descripcion, None, e, al_fallar))
+            finally:
+                self.cola.task_done()
+
+    def en_proceso(self, descripcion, funcion, *args, al_fallar=None, al_terminar=None):
+        """
+        Ejecuta un trabajo pesado de CPU en el pool de procesos (funcion debe ser de módulo).
+        El resultado llega por obtener_resultados como el de una escritura.
+        """
+        with self.candado:
+            if self.procesos is None:
+                # 'spawn' para no copiar los hilos (Tk, escritor) al proceso hijo
+                self.procesos = ProcessPoolExecutor(max_workers=PROCESOS_EXCEL or None,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+            self.trabajos_en_proceso += 1
+        try:
+            futuro = self.procesos.submit(funcion, *args)
+        except Exception:
+            # Pool cerrado o roto: el trabajo no llegó a encolarse
+            with self.candado:
+                self.trabajos_en_proceso -= 1
+            raise
+        futuro.add_done_callback(
+            lambda f: self.terminar_proceso(descripcion, f, al_fallar, al_terminar))
+        return futuro
+
+    def terminar_proceso(self, descripcion, futuro, al_fallar, al_terminar):
+        """Pasa el resultado de un trabajo del pool a la cola de resultados"""
+        with self.candado:
+            self.trabajos_en_proceso -= 1
+        try:
+            resultado = futuro.result()
+            self.resultados.put((descripcion, resultado, None, al_terminar))
+        except Exception as e:
+            print(f"Error al {descripcion}: {e}")
+            self.resultados.put((descripcion, None, e, al_fallar))
+
+    def obtener_resultados(self):
+        """
+        Retorna (sin esperar) las escrituras terminadas desde la última consulta
+        Returns: lista de (descripcion, resultado, error o None, callback a llamar)
+        """
+        terminados = []
+        while True:
+            try:
+                terminados.append(self.resultados.get_nowait())
+            except queue.Empty:
+                return terminados
+
+    def pendientes(self):
+        """Cantidad aproximada de escrituras en cola"""
+        return self.cola.unfinished_tasks
+
+    def procesos_pendientes(self):
+        """Cantidad de trabajos en el pool de procesos sin terminar"""
+        return self.trabajos_en_proceso
+
+    def esperar(self):
+        """Bloquea hasta que se hayan escrito todas las tareas encoladas"""
+        self.cola.join()
+
+    def detener(self):
+        """Escribe todo lo pendiente, espera los trabajos del pool y termina (al cerrar el programa)"""
+        self.cola.put(_FIN)
+        self.hilo.join()
+        if self.procesos is not None:
+            self.procesos.shutdown(wait=True)
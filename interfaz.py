@@ -2,10 +2,15 @@
 Interfaz Gráfica del Sistema de Bazar - VERSIÓN LIMPIA
 Usando tkinter
 """
+import queue
+import threading
 import tkinter as tk
+from datetime import datetime
 from tkinter import ttk, messagebox, simpledialog
-from logica import GestorProductos, GestorVentas, validar_numero
-from ventana_reportes import VentanaInventarioVendido, VentanaReporteDia
+from logica import GestorProductos, GestorVentas, validar_numero, OPENPYXL_DISPONIBLE
+from escritor import EscritorDisco
+from ventana_reportes import VentanaInventarioVendido, VentanaReporteDia, VentanaMapaHoras
+import arranque
 import config
 from config import COLORES, FUENTES, METODOS_PAGO
 
@@ -20,12 +25,19 @@ class VentanaPrincipal:
         self.root.resizable(True, True) # Redimensionable
         self.root.configure(bg=COLORES['fondo'])
         
-        # Inicializar gestores
-        self.gestor_productos = GestorProductos()
+        # Hilo escritor: las escrituras a disco no congelan la interfaz
+        self.escritor = EscritorDisco()
+        
+        # Inicializar gestores (con arranque rápido el catálogo se carga después)
+        self.gestor_productos = GestorProductos(cargar=not config.ARRANQUE_RAPIDO)
+        self.gestor_productos.al_stock_bajo = self.alertar_stock_bajo
+        self.gestor_productos.escritor = self.escritor
         self.gestor_ventas = GestorVentas()
+        self.gestor_ventas.escritor = self.escritor
         
         # Variables
         self.producto_seleccionado = None
+        self.catalogo_listo = not config.ARRANQUE_RAPIDO
         
         # Crear interfaz
         self.crear_menu()
@@ -34,11 +46,91 @@ class VentanaPrincipal:
         self.crear_totales()
         
         # Actualizar
-        self.actualizar_productos_dict()
+        if config.ARRANQUE_RAPIDO:
+            self.iniciar_carga_catalogo()
+        else:
+            self.actualizar_productos_dict()
+            arranque.marcar('catalogo_listo')
         # Recuperar ventas temporales si existen
         self.recuperar_ventas_temporales()
         # Manejar cierre de ventana
         self.root.protocol("WM_DELETE_WINDOW", self.al_cerrar)
+        # Guardado periódico de los cambios de stock pendientes
+        self.root.after(config.INTERVALO_GUARDADO_MS, self.guardado_periodico)
+        # Resultados de las escrituras en segundo plano
+        self.root.after(100, self.revisar_escrituras)
+
+    def iniciar_carga_catalogo(self):
+        """Carga el catálogo en un hilo aparte para mostrar la ventana de inmediato"""
+        self.entry_busqueda.insert(0, "Cargando productos...")
+        self.entry_busqueda.config(state='disabled')
+        self.btn_otro.config(state='disabled')
+        
+        self.cola_catalogo = queue.Queue()
+        hilo = threading.Thread(target=lambda: self.cola_catalogo.put(GestorProductos()),
+                                daemon=True)
+        hilo.start()
+        self.root.after(50, self.revisar_carga_catalogo)
+    
+    def revisar_carga_catalogo(self):
+        """Revisa (desde el hilo de Tk) si el catálogo terminó de cargarse"""
+        try:
+            gestor = self.cola_catalogo.get_nowait()
+        except queue.Empty:
+            self.root.after(50, self.revisar_carga_catalogo)
+            return
+        
+        self.gestor_productos = gestor
+        self.gestor_productos.al_stock_bajo = self.alertar_stock_bajo
+        self.gestor_productos.escritor = self.escritor
+        self.catalogo_listo = True
+        self.actualizar_productos_dict()
+        
+        # Habilitar búsqueda
+        self.entry_busqueda.config(state='normal')
+        self.entry_busqueda.delete(0, tk.END)
+        self.btn_otro.config(state='normal')
+        self.entry_busqueda.focus_set()
+        arranque.marcar('catalogo_listo')
+    
+    def verificar_catalogo(self):
+        """Avisa si el catálogo todavía se está cargando"""
+        if not self.catalogo_listo:
+            messagebox.showinfo("Cargando", "Los productos se están cargando, intente en un momento.")
+        return self.catalogo_listo
+
+    def revisar_escrituras(self):
+        """Revisa (desde el hilo de Tk) las escrituras terminadas y avisa los errores"""
+        self.procesar_escrituras()
+        
+        excel = self.escritor.procesos_pendientes()
+        if excel:
+            estado = f"⏳ Generando Excel ({excel})..."
+        elif self.escritor.pendientes():
+            estado = "💾 Guardando..."
+        else:
+            estado = ""
+        self.label_estado.config(text=estado)
+        self.root.after(100, self.revisar_escrituras)
+    
+    def procesar_escrituras(self):
+        """Atiende los resultados del hilo escritor; los fallos se reintentan o se avisan"""
+        for descripcion, resultado, error, callback in self.escritor.obtener_resultados():
+            if error is None:
+                if callback:
+                    callback(resultado)
+                continue
+            if callback:
+                callback(error)
+            # Un guardado de ventas fallido devuelve las ventas a la caja
+            self.actualizar_lista()
+            self.actualizar_totales()
+            messagebox.showerror("Error al guardar", f"No se pudo {descripcion}:\n{error}")
+
+    def guardado_periodico(self):
+        """Escribe en lote los cambios de stock pendientes y se reprograma"""
+        self.gestor_productos.guardar_pendientes()
+        self.root.after(config.INTERVALO_GUARDADO_MS, self.guardado_periodico)
 
     def recuperar_ventas_temporales(self):
         """Recupera ventas de sesión anterior si existen"""
@@ -83,16 +175,27 @@ class VentanaPrincipal:
                 exito, resultado = self.gestor_ventas.guardar_ventas()
                 if exito:
                     self.mostrar_resumen_cierre(resultado)
-                    self.root.destroy()
+                    self.salir()
                 else:
                     messagebox.showerror("Error", resultado)
                     return
             else:  # No - Solo cerrar
                 # ✅ MODIFICADO: Limpiar temporal al salir sin guardar
                 self.gestor_ventas.limpiar_temporal()
-                self.root.destroy()
+                self.salir()
         else:
-            self.root.destroy()
+            self.salir()
+    
+    def salir(self):
+        """Guarda los cambios de productos pendientes y cierra la ventana"""
+        self.gestor_productos.cerrar()
+        # Esperar a que el hilo escritor termine todo lo encolado
+        self.escritor.detener()
+        # Lo que haya que reescribir por un fallo ya se escribe aquí mismo
+        self.gestor_productos.escritor = None
+        self.gestor_ventas.escritor = None
+        self.procesar_escrituras()
+        self.root.destroy()
     
     def mostrar_resumen_cierre(self, resultado):
         """Muestra resumen al cerrar caja"""
@@ -132,6 +235,8 @@ class VentanaPrincipal:
         menu_reportes.add_command(label="📊 Consultar Ventas Diarias", command=self.abrir_reporte_dia)
         menu_reportes.add_separator()
         menu_reportes.add_command(label="📋 Inventario Vendido", command=self.abrir_inventario_vendido)
+        menu_reportes.add_command(label="🕒 Ventas por Hora", command=self.abrir_mapa_horas)
+        menu_reportes.add_command(label="🧾 Regenerar Excel de Registro", command=self.regenerar_excel)
         menu_reportes.add_separator()
         menu_reportes.add_command(label="🗑️ Limpiar Caja (Emergencia)", command=self.limpiar_caja_emergencia)
         
@@ -193,17 +298,17 @@ class VentanaPrincipal:
         btn_agregar.pack(side=tk.LEFT, padx=5)
 
         # Botón Otro
-        btn_otro = tk.Button(frame_busqueda, text="Otro", command=self.agregar_producto_variable,
+        self.btn_otro = tk.Button(frame_busqueda, text="Otro", command=self.agregar_producto_variable,
                             bg=COLORES['primario'], fg='white', font=FUENTES['normal'],
                             cursor='hand2', padx=15)
-        btn_otro.pack(side=tk.LEFT, padx=5)
+        self.btn_otro.pack(side=tk.LEFT, padx=5)
         
         # Variable para productos completos
         self.productos_dict = {}
 
     def filtrar_productos(self, event):
         """Filtra productos mientras se escribe"""
-        texto = self.entry_busqueda.get().lower()
+        texto = self.entry_busqueda.get()
         
         if not texto:
             self.listbox_productos.pack_forget()
@@ -212,21 +317,13 @@ class VentanaPrincipal:
         # Limpiar listbox
         self.listbox_productos.delete(0, tk.END)
         
-        # Filtrar productos
-        coincidencias = []
-        for producto in self.gestor_productos.productos:
-            nombre_completo = f"{producto['nombre']} - S/ {producto['precio']:.2f}"
-            if config.STOCK_ACTIVADO:
-                nombre_completo += f" [STOCK: {producto['stock']}]"
-            
-            if texto in producto['nombre'].lower() or texto in producto['codigo'].lower():
-                coincidencias.append((nombre_completo, producto))
+        # Filtrar productos con el índice de búsqueda (limitado a 10)
+        coincidencias = self.gestor_productos.buscar_coincidencias(texto, limite=10)
         
         # Mostrar coincidencias
         if coincidencias:
-            for nombre_completo, producto in coincidencias[:10]:  # Limitar a 10
-                self.listbox_productos.insert(tk.END, nombre_completo)
-                self.productos_dict[nombre_completo] = producto
+            for producto in coincidencias:
+                self.listbox_productos.insert(tk.END, self.gestor_productos.texto_producto(producto))
             
             self.listbox_productos.pack()
             self.listbox_productos.config(height=min(len(coincidencias), 6))
@@ -331,6 +428,11 @@ class VentanaPrincipal:
         self.label_total_virtual = tk.Label(frame_virtual, text="S/ 0.00", 
                                            font=FUENTES['normal'], bg='#e8f5e9')
         self.label_total_virtual.pack(anchor='w')
+        
+        # Estado de los guardados y Excel en segundo plano
+        self.label_estado = tk.Label(frame_totales, text="", font=FUENTES['pequeña'],
+                                     fg=COLORES['advertencia'], bg='#e8f5e9')
+        self.label_estado.pack(side=tk.RIGHT, padx=20)
     
     def agregar_producto(self):
         """Agrega un producto a la lista de ventas"""
@@ -357,8 +459,6 @@ class VentanaPrincipal:
                 messagebox.showerror("Error de Stock", mensaje_stock)
                 self.gestor_ventas.eliminar_venta(len(self.gestor_ventas.ventas_actuales) - 1)
                 return
-            elif "ADVERTENCIA" in mensaje_stock:
-                messagebox.showwarning("Advertencia", mensaje_stock)
         
         # Actualizar interfaz
         self.agregar_item_lista(venta, len(self.gestor_ventas.ventas_actuales) - 1)
@@ -375,14 +475,16 @@ class VentanaPrincipal:
         self.producto_seleccionado = None
         self.entry_busqueda.focus_set()
 
+    def alertar_stock_bajo(self, producto):
+        """Avisa cuando un producto baja de UMBRAL_STOCK_BAJO (una vez por cruce)"""
+        messagebox.showwarning("Advertencia",
+                               f"ADVERTENCIA: Stock bajo para '{producto['nombre']}': "
+                               f"{producto['stock']} unidades")
+    
     def actualizar_productos_dict(self):
         """Actualiza el diccionario de productos después de cambios en stock"""
-        self.productos_dict = {}
-        for producto in self.gestor_productos.productos:
-            nombre_completo = f"{producto['nombre']} - S/ {producto['precio']:.2f}"
-            if config.STOCK_ACTIVADO:
-                nombre_completo += f" [STOCK: {producto['stock']}]"
-            self.productos_dict[nombre_completo] = producto
+        # El gestor mantiene el mapa al día producto por producto
+        self.productos_dict = self.gestor_productos.obtener_mapa_textos()
     
     def agregar_item_lista(self, venta, indice):
         """Agrega un item visual a la lista"""
@@ -408,21 +510,19 @@ class VentanaPrincipal:
     
     def eliminar_item(self, indice):
         """Elimina un item de la lista"""
-        if config.STOCK_ACTIVADO and indice < len(self.gestor_ventas.ventas_actuales):
-            venta = self.gestor_ventas.ventas_actuales[indice]
-            for producto in self.gestor_productos.productos:
-                if producto['codigo'] == venta['codigo']:
-                    producto['stock'] += venta['cantidad']
-                    self.gestor_productos.guardar_productos()
-                    break
-        
-        if self.gestor_ventas.eliminar_venta(indice):
+        if not self.verificar_catalogo():
+            return
+        if indice >= len(self.gestor_ventas.ventas_actuales):
+            return
+        venta = self.gestor_ventas.ventas_actuales[indice]
+        
+        # eliminar_venta ya anota la eliminación en el temporal
+        if self.gestor_ventas.eliminar_venta(indice, venta['codigo']):
+            if config.STOCK_ACTIVADO:
+                self.gestor_productos.devolver_stock(venta['codigo'], venta['cantidad'])
             self.actualizar_lista()
             self.actualizar_totales()
             self.actualizar_productos_dict()
-    
-            # ✅ NUEVO: Autoguardar después de eliminar
-            self.gestor_ventas.autoguardar_temporal()
 
     def actualizar_lista(self):
         """Actualiza la lista visual de ventas"""
@@ -461,6 +561,7 @@ class VentanaPrincipal:
         
         exito, resultado = self.gestor_ventas.guardar_ventas()
         if exito:
+            self.gestor_productos.guardar_pendientes()
             self.mostrar_resumen_cierre(resultado)
             self.actualizar_lista()
             self.actualizar_totales()
@@ -469,6 +570,8 @@ class VentanaPrincipal:
     
     def limpiar_caja_emergencia(self):
         """Limpia la caja actual sin guardar (EMERGENCIA)"""
+        if not self.verificar_catalogo():
+            return
         if not self.gestor_ventas.ventas_actuales:
             messagebox.showinfo("Información", "No hay ventas en la caja actual")
             return
@@ -497,10 +600,7 @@ class VentanaPrincipal:
             # Devolver stock si está activado
             if config.STOCK_ACTIVADO:
                 for venta in self.gestor_ventas.ventas_actuales:
-                    for producto in self.gestor_productos.productos:
-                        if producto['codigo'] == venta['codigo']:
-                            producto['stock'] += venta['cantidad']
-                self.gestor_productos.guardar_productos()
+                    self.gestor_productos.devolver_stock(venta['codigo'], venta['cantidad'])
             
             self.gestor_ventas.limpiar_ventas()
             self.actualizar_lista()
@@ -510,6 +610,8 @@ class VentanaPrincipal:
     
     def recargar_productos(self):
         """Recarga los productos del CSV"""
+        if not self.verificar_catalogo():
+            return
         if self.gestor_productos.cargar_productos():
             self.actualizar_productos_dict()
             messagebox.showinfo("Éxito", "Productos recargados correctamente")
@@ -518,6 +620,8 @@ class VentanaPrincipal:
     
     def agregar_producto_variable(self):
         """Abre ventana para agregar producto de precio variable Y guardarlo en productos.csv"""
+        if not self.verificar_catalogo():
+            return
         ventana = tk.Toplevel(self.root)
         ventana.title("Agregar Producto Variable")
         ventana.geometry("400x300")
@@ -646,11 +750,7 @@ class VentanaPrincipal:
             self.actualizar_productos_dict()
             
             # Buscar el producto recién agregado
-            producto_nuevo = None
-            for p in self.gestor_productos.productos:
-                if p['codigo'] == codigo:
-                    producto_nuevo = p
-                    break
+            producto_nuevo = self.gestor_productos.buscar_producto(codigo)
             
             if not producto_nuevo:
                 messagebox.showerror("Error", "Producto agregado pero no encontrado")
@@ -703,6 +803,8 @@ class VentanaPrincipal:
     
     def ventana_agregar_producto(self):
         """Abre ventana para agregar un nuevo producto"""
+        if not self.verificar_catalogo():
+            return
         ventana = tk.Toplevel(self.root)
         ventana.title("Agregar Producto")
         ventana.geometry("400x300")
@@ -776,6 +878,8 @@ class VentanaPrincipal:
     
     def ventana_editar_producto(self):
         """Abre ventana para editar un producto existente"""
+        if not self.verificar_catalogo():
+            return
         ventana_seleccion = tk.Toplevel(self.root)
         ventana_seleccion.title("Seleccionar Producto")
         ventana_seleccion.geometry("450x400")
@@ -892,6 +996,8 @@ class VentanaPrincipal:
     
     def ventana_eliminar_producto(self):
         """Abre ventana para eliminar un producto"""
+        if not self.verificar_catalogo():
+            return
         ventana = tk.Toplevel(self.root)
         ventana.title("Eliminar Producto")
         ventana.geometry("450x400")
@@ -946,15 +1052,52 @@ class VentanaPrincipal:
     
     def abrir_inventario_vendido(self):
         """Abre ventana de inventario vendido"""
+        if not self.verificar_catalogo():
+            return
         ventana = VentanaInventarioVendido(self.root)
         ventana.set_gestor_productos(self.gestor_productos)
     
+    def abrir_mapa_horas(self):
+        """Abre ventana de ventas por hora (mapas de calor)"""
+        VentanaMapaHoras(self.root)
+    
     def abrir_reporte_dia(self):
         """Abre ventana de reporte del día"""
-        VentanaReporteDia(self.root)
+        VentanaReporteDia(self.root, self.gestor_ventas)
+    
+    def regenerar_excel(self):
+        """Regenera los Excel de Excel_registro de un rango de fechas desde el historial"""
+        if not OPENPYXL_DISPONIBLE:
+            messagebox.showerror("Error", "openpyxl no está instalado.\nPara instalar: pip install openpyxl")
+            return
+        
+        hoy = datetime.now().strftime('%Y-%m-%d')
+        fecha_inicio = simpledialog.askstring("Regenerar Excel", "Fecha inicio (YYYY-MM-DD):",
+                                              initialvalue=hoy, parent=self.root)
+        if not fecha_inicio:
+            return
+        fecha_fin = simpledialog.askstring("Regenerar Excel", "Fecha fin (YYYY-MM-DD):",
+                                           initialvalue=fecha_inicio, parent=self.root)
+        if not fecha_fin:
+            return
+        
+        try:
+            datetime.strptime(fecha_inicio.strip(), '%Y-%m-%d')
+            datetime.strptime(fecha_fin.strip(), '%Y-%m-%d')
+        except ValueError:
+            messagebox.showerror("Error", "Formato de fecha inválido. Use YYYY-MM-DD")
+            return
+        
+        # Se genera en el hilo escritor; al terminar se avisa cuántos archivos se hicieron
+        self.gestor_ventas.regenerar_registros(
+            fecha_inicio.strip(), fecha_fin.strip(),
+            al_terminar=lambda generados: messagebox.showinfo(
+                "Excel Regenerados", f"Se generaron {generados} archivo(s) en Excel_registro"))
     
     def configurar_stock(self):
         """Abre ventana de configuración de stock"""
+        if not self.verificar_catalogo():
+            return
         ventana = tk.Toplevel(self.root)
         ventana.title("Configuración de Stock")
         ventana.geometry("500x500")
@@ -1009,12 +1152,13 @@ class VentanaPrincipal:
                 ventana.destroy()
         
         def ver_stock_bajo():
-            productos_bajo = self.gestor_productos.productos_stock_bajo(10)
+            umbral = config.UMBRAL_STOCK_LISTADO
+            productos_bajo = self.gestor_productos.productos_stock_bajo(umbral)
             if not productos_bajo:
-                messagebox.showinfo("Stock", "No hay productos con stock bajo (≤ 10 unidades)")
+                messagebox.showinfo("Stock", f"No hay productos con stock bajo (≤ {umbral} unidades)")
                 return
             
-            mensaje = "Productos con stock bajo (≤ 10 unidades):\n\n"
+            mensaje = f"Productos con stock bajo (≤ {umbral} unidades):\n\n"
             for p in productos_bajo:
                 mensaje += f"• {p['nombre']}: {p['stock']} unidades\n"
             
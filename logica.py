@@ -2,49 +2,240 @@
 Lógica de Negocio del Sistema de Bazar - VERSIÓN LIMPIA
 Manejo de CSV, validaciones y cálculos
 """
+import bisect
 import csv
 import os
+import heapq
+import threading
+import importlib.util
+import unicodedata
+from collections import defaultdict
 from datetime import datetime
+from fractions import Fraction
+from itertools import zip_longest
+import config
 from config import *
+from almacenamiento import obtener_almacenamiento
+from escritor import ejecutar
+import resumenes
+import columnar
+from reportes import cache_reportes, ReporteVivo
 import json 
 
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill
-    OPENPYXL_DISPONIBLE = True
-except ImportError:
-    OPENPYXL_DISPONIBLE = False
+# openpyxl se importa recién al generar el primer Excel (acelera el arranque);
+# aquí solo se verifica que esté instalado
+OPENPYXL_DISPONIBLE = importlib.util.find_spec('openpyxl') is not None
+if not OPENPYXL_DISPONIBLE:
     print("⚠️ Advertencia: openpyxl no está instalado. No se generarán archivos Excel.")
     print("   Para instalar: pip install openpyxl")
 
 
+class Producto:
+    """
+    Registro compacto de un producto (__slots__, sin diccionario por fila).
+    Conserva el acceso tipo dict (producto['precio'], producto.get('stock'))
+    que usan la interfaz y los reportes.
+    """
+    __slots__ = ('codigo', 'nombre', 'precio', 'categoria', 'stock')
+    CAMPOS = frozenset(__slots__)
+    
+    def __init__(self, codigo, nombre, precio, categoria, stock=0):
+        self.codigo = codigo
+        self.nombre = nombre
+        self.precio = precio
+        self.categoria = categoria
+        self.stock = stock
+    
+    def __getitem__(self, campo):
+        if campo not in Producto.CAMPOS:
+            raise KeyError(campo)
+        return getattr(self, campo)
+    
+    def __setitem__(self, campo, valor):
+        if campo not in Producto.CAMPOS:
+            raise KeyError(campo)
+        setattr(self, campo, valor)
+    
+    def __contains__(self, campo):
+        return campo in Producto.CAMPOS
+    
+    def get(self, campo, defecto=None):
+        """Igual que dict.get"""
+        return getattr(self, campo) if campo in Producto.CAMPOS else defecto
+    
+    def keys(self):
+        """Nombres de los campos, en el orden del CSV"""
+        return Producto.__slots__
+    
+    def como_tupla(self):
+        """Valores en el orden de COLUMNAS_PRODUCTOS"""
+        return (self.codigo, self.nombre, self.precio, self.categoria, self.stock)
+    
+    def como_dict(self):
+        """Copia como dict (para JSON y SQLite)"""
+        return dict(zip(Producto.__slots__, self.como_tupla()))
+    
+    def __repr__(self):
+        return f"Producto({self.codigo!r}, {self.nombre!r}, {self.precio!r}, {self.categoria!r}, {self.stock!r})"
+
+
+def leer_productos_csv(ruta):
+    """Lee productos.csv y retorna una lista de Producto con precio y stock numéricos"""
+    productos = []
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        lector = csv.reader(archivo)
+        encabezado = next(lector, None)
+        if not encabezado:
+            return productos
+        
+        i_codigo = encabezado.index('codigo')
+        i_nombre = encabezado.index('nombre')
+        i_precio = encabezado.index('precio')
+        i_categoria = encabezado.index('categoria')
+        # Si no existe la columna stock, se usa 0
+        i_stock = encabezado.index('stock') if 'stock' in encabezado else None
+        
+        for fila in lector:
+            if not fila:
+                continue
+            stock = 0
+            if i_stock is not None:
+                try:
+                    stock = int(fila[i_stock])
+                except (ValueError, IndexError):
+                    stock = 0
+            productos.append(Producto(fila[i_codigo], fila[i_nombre], float(fila[i_precio]),
+                                      fila[i_categoria], stock))
+    return productos
+
+
+def escribir_productos_csv(ruta, filas, ruta_journal=None):
+    """
+    Escribe productos.csv a partir de tuplas (codigo, nombre, precio, categoria, stock).
+    Escribe a un archivo temporal y lo renombra, para que un corte a mitad
+    de escritura nunca deje productos.csv incompleto.
+    Si se indica ruta_journal, lo borra después (compactación).
+    """
+    ruta_temporal = ruta + '.tmp'
+    with open(ruta_temporal, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(COLUMNAS_PRODUCTOS)
+        escritor.writerows(filas)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(ruta_temporal, ruta)
+    
+    if ruta_journal and os.path.exists(ruta_journal):
+        os.remove(ruta_journal)
+
+
+def agregar_lineas(ruta, lineas, sincronizar=False):
+    """Agrega texto al final de un archivo (journal o temporal); con sincronizar hace fsync"""
+    with open(ruta, 'a', encoding='utf-8') as archivo:
+        archivo.write(lineas)
+        if sincronizar:
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+
+def reemplazar_archivo(ruta, contenido):
+    """Reemplaza el contenido de un archivo de forma atómica (temporal + renombrar)"""
+    ruta_temporal = ruta + '.tmp'
+    with open(ruta_temporal, 'w', encoding='utf-8') as archivo:
+        archivo.write(contenido)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(ruta_temporal, ruta)
+
+
+def eliminar_archivos(*rutas):
+    """Elimina los archivos indicados que existan"""
+    for ruta in rutas:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+
+def normalizar_texto(texto):
+    """Pasa el texto a minúsculas y le quita las tildes (para búsquedas)"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def obtener_trigramas(texto):
+    """Retorna el conjunto de trigramas de un texto ya normalizado"""
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
 class GestorProductos:
     """Maneja la carga, guardado y manipulación de productos"""
     
-    def __init__(self):
+    def __init__(self, cargar=True):
         self.productos = []
-        self.cargar_productos()
+        self.cargado = False  # evita guardar un catálogo vacío si aún no se cargó
+        self.indice_codigos = {}  # codigo -> producto (búsqueda O(1))
+        # Índice de búsqueda por texto (nombre y código sin tildes)
+        self.textos_busqueda = {}  # codigo -> (nombre, codigo) normalizados, en orden de catálogo
+        self.indice_trigramas = defaultdict(set)  # trigrama -> {codigos}
+        self.orden_busqueda = {}  # codigo -> posición para ordenar resultados
+        self.siguiente_orden = 0
+        self.cambios_pendientes = []  # registros aún no escritos en disco
+        self.bytes_journal = 0  # tamaño estimado de productos.journal
+        self.escritor = None  # EscritorDisco (lo asigna la interfaz); None = escribir aquí mismo
+        # Índice de stock bajo: lista ordenada de (stock, codigo)
+        self.indice_stock = []
+        self.al_stock_bajo = None  # callback(producto) al bajar de UMBRAL_STOCK_BAJO
+        # Vistas derivadas memoizadas (se invalidan por producto)
+        self.version = 0  # aumenta con cada cambio del catálogo
+        self.textos_productos = {}  # codigo -> "Nombre - S/ 0.00 [STOCK: n]"
+        self.mapa_textos = {}  # texto mostrado -> producto
+        self.productos_por_texto = {}  # texto mostrado -> productos con ese texto (puede repetirse)
+        self.conteo_categorias = {}  # categoria -> cantidad de productos
+        self.categorias_ordenadas = None
+        self.textos_codigo_nombre = None
+        self.nombres_productos = None
+        self.version_nombres = -1
+        if cargar:
+            self.cargar_productos()
     
     def cargar_productos(self):
+        """Carga los productos desde el motor de almacenamiento configurado"""
+        # No perder cambios de stock aún no escritos al recargar
+        self.guardar_pendientes()
+        if self.escritor is not None:
+            self.escritor.esperar()
+        
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            return self.cargar_productos_sqlite()
+        return self.cargar_productos_csv()
+    
+    def cargar_productos_sqlite(self):
+        """Carga los productos desde SQLite (la primera vez los importa del CSV)"""
+        try:
+            almacen = obtener_almacenamiento()
+            if not almacen.hay_productos() and not almacen.obtener_meta('migracion_productos'):
+                # Primera vez: importar productos.csv (con su journal) a la base
+                self.cargar_productos_csv()
+                almacen.guardar_productos([p.como_dict() for p in self.productos])
+                almacen.guardar_meta('migracion_productos', str(len(self.productos)))
+            
+            self.productos = [Producto(**fila) for fila in almacen.cargar_productos()]
+            self.reconstruir_indice()
+            self.cargado = True
+            return True
+        except Exception as e:
+            print(f"Error al cargar productos: {e}")
+            return False
+    
+    def cargar_productos_csv(self):
         """Carga los productos desde el CSV"""
         if not os.path.exists(RUTA_PRODUCTOS):
             self.crear_csv_ejemplo()
         
         try:
-            with open(RUTA_PRODUCTOS, 'r', encoding='utf-8') as archivo:
-                lector = csv.DictReader(archivo)
-                self.productos = list(lector)
-                # Convertir precios y stock a numéricos
-                for producto in self.productos:
-                    producto['precio'] = float(producto['precio'])
-                    # Si no existe la columna stock, agregarla con valor 0
-                    if 'stock' not in producto:
-                        producto['stock'] = 0
-                    else:
-                        try:
-                            producto['stock'] = int(producto['stock'])
-                        except:
-                            producto['stock'] = 0
+            self.productos = leer_productos_csv(RUTA_PRODUCTOS)
+            self.reconstruir_indice()
+            self.aplicar_journal()
+            self.cargado = True
             return True
         except Exception as e:
             print(f"Error al cargar productos: {e}")
@@ -68,99 +259,456 @@ class GestorProductos:
             escritor.writeheader()
             escritor.writerows(productos_ejemplo)
     
-    def guardar_productos(self):
-        """Guarda los productos en el CSV"""
-        try:
-            with open(RUTA_PRODUCTOS, 'w', newline='', encoding='utf-8') as archivo:
-                escritor = csv.DictWriter(archivo, fieldnames=COLUMNAS_PRODUCTOS)
-                escritor.writeheader()
-                escritor.writerows(self.productos)
+    def reconstruir_indice(self):
+        """Reconstruye los índices (código, búsqueda y vistas) desde la lista completa"""
+        self.indice_codigos = {}
+        self.textos_busqueda = {}
+        self.indice_trigramas = defaultdict(set)
+        self.orden_busqueda = {}
+        self.siguiente_orden = 0
+        self.textos_productos = {}
+        self.mapa_textos = {}
+        self.productos_por_texto = {}
+        self.conteo_categorias = {}
+        self.categorias_ordenadas = None
+        self.textos_codigo_nombre = None
+        self.version += 1
+        for producto in self.productos:
+            # Si hay códigos duplicados en el CSV se conserva el primero
+            if producto['codigo'] not in self.indice_codigos:
+                self.indice_codigos[producto['codigo']] = producto
+                self.indexar_busqueda(producto)
+                self.agregar_a_vistas(producto)
+        self.indice_stock = sorted((p['stock'], codigo) for codigo, p in self.indice_codigos.items())
+    
+    def indexar_stock(self, producto):
+        """Agrega un producto al índice de stock bajo"""
+        bisect.insort(self.indice_stock, (producto['stock'], producto['codigo']))
+    
+    def desindexar_stock(self, producto):
+        """Quita un producto del índice de stock bajo (antes de cambiar su stock)"""
+        entrada = (producto['stock'], producto['codigo'])
+        i = bisect.bisect_left(self.indice_stock, entrada)
+        if i < len(self.indice_stock) and self.indice_stock[i] == entrada:
+            del self.indice_stock[i]
+    
+    def cambiar_stock(self, producto, nuevo_stock, avisar=True):
+        """
+        Cambia el stock manteniendo índice y texto al día.
+        Si el producto cruza UMBRAL_STOCK_BAJO hacia abajo se llama a al_stock_bajo
+        (una sola vez: vuelve a avisar solo si antes se repone por encima del umbral).
+        """
+        anterior = producto['stock']
+        self.desindexar_stock(producto)
+        producto['stock'] = nuevo_stock
+        self.indexar_stock(producto)
+        self.refrescar_texto(producto)
+        
+        if avisar and self.al_stock_bajo and anterior > UMBRAL_STOCK_BAJO >= nuevo_stock:
+            self.al_stock_bajo(producto)
+    
+    def formatear_producto(self, producto):
+        """Texto que se muestra en la búsqueda: nombre, precio y stock (si está activado)"""
+        texto = f"{producto['nombre']} - S/ {producto['precio']:.2f}"
+        if config.STOCK_ACTIVADO:
+            texto += f" [STOCK: {producto['stock']}]"
+        return texto
+    
+    def texto_producto(self, producto):
+        """Texto memoizado de un producto (se recalcula solo si el producto cambió)"""
+        texto = self.textos_productos.get(producto['codigo'])
+        if texto is None:
+            texto = self.formatear_producto(producto)
+        return texto
+    
+    def agregar_a_vistas(self, producto):
+        """Agrega un producto a las vistas derivadas (texto, mapa y categorías)"""
+        texto = self.formatear_producto(producto)
+        self.textos_productos[producto['codigo']] = texto
+        self.enlazar_texto(texto, producto)
+        
+        categoria = producto['categoria']
+        if categoria not in self.conteo_categorias:
+            self.conteo_categorias[categoria] = 0
+            self.categorias_ordenadas = None
+        self.conteo_categorias[categoria] += 1
+        self.textos_codigo_nombre = None
+        self.version += 1
+    
+    def quitar_de_vistas(self, producto):
+        """Quita un producto de las vistas derivadas (antes de editarlo o eliminarlo)"""
+        texto = self.textos_productos.pop(producto['codigo'], None)
+        if texto is not None:
+            self.desenlazar_texto(texto, producto)
+        
+        categoria = producto['categoria']
+        if categoria in self.conteo_categorias:
+            self.conteo_categorias[categoria] -= 1
+            if self.conteo_categorias[categoria] <= 0:
+                del self.conteo_categorias[categoria]
+                self.categorias_ordenadas = None
+        self.textos_codigo_nombre = None
+        self.version += 1
+    
+    def refrescar_texto(self, producto):
+        """Recalcula solo el texto mostrado de un producto (p. ej. tras cambiar su stock)"""
+        texto = self.textos_productos.get(producto['codigo'])
+        if texto is not None:
+            self.desenlazar_texto(texto, producto)
+        
+        texto = self.formatear_producto(producto)
+        self.textos_productos[producto['codigo']] = texto
+        self.enlazar_texto(texto, producto)
+        self.version += 1
+    
+    def enlazar_texto(self, texto, producto):
+        """Asocia un texto mostrado a un producto (si se repite, el mapa apunta al último)"""
+        self.productos_por_texto.setdefault(texto, []).append(producto)
+        self.mapa_textos[texto] = producto
+    
+    def desenlazar_texto(self, texto, producto):
+        """Quita un producto de su texto; el texto sigue en el mapa si otro producto lo usa"""
+        productos = self.productos_por_texto.get(texto, [])
+        for i, otro in enumerate(productos):
+            if otro is producto:
+                del productos[i]
+                break
+        if productos:
+            self.mapa_textos[texto] = productos[-1]
+        else:
+            self.productos_por_texto.pop(texto, None)
+            self.mapa_textos.pop(texto, None)
+    
+    def indexar_busqueda(self, producto):
+        """Agrega (o actualiza) un producto en el índice de búsqueda"""
+        codigo = producto['codigo']
+        if codigo in self.textos_busqueda:
+            self.desindexar_trigramas(codigo)
+        else:
+            self.orden_busqueda[codigo] = self.siguiente_orden
+            self.siguiente_orden += 1
+        
+        nombre_norm = normalizar_texto(producto['nombre'])
+        codigo_norm = normalizar_texto(codigo)
+        self.textos_busqueda[codigo] = (nombre_norm, codigo_norm)
+        for trigrama in obtener_trigramas(nombre_norm) | obtener_trigramas(codigo_norm):
+            self.indice_trigramas[trigrama].add(codigo)
+    
+    def desindexar_trigramas(self, codigo):
+        """Quita los trigramas de un producto del índice invertido"""
+        nombre_norm, codigo_norm = self.textos_busqueda[codigo]
+        for trigrama in obtener_trigramas(nombre_norm) | obtener_trigramas(codigo_norm):
+            codigos = self.indice_trigramas.get(trigrama)
+            if codigos is not None:
+                codigos.discard(codigo)
+                if not codigos:
+                    del self.indice_trigramas[trigrama]
+    
+    def desindexar_busqueda(self, codigo):
+        """Quita un producto del índice de búsqueda"""
+        if codigo not in self.textos_busqueda:
+            return
+        self.desindexar_trigramas(codigo)
+        del self.textos_busqueda[codigo]
+        del self.orden_busqueda[codigo]
+    
+    def buscar_coincidencias(self, texto, limite=10):
+        """
+        Busca productos cuyo nombre o código contenga el texto (sin distinguir tildes)
+        Returns: lista con hasta `limite` productos, en orden de catálogo
+        """
+        consulta = normalizar_texto(texto)
+        if not consulta:
+            return []
+        
+        if len(consulta) < 3:
+            return self.recorrer_coincidencias(consulta, limite)
+        
+        # Intersectar listas de trigramas, empezando por la más corta
+        listas = sorted((self.indice_trigramas.get(t, ()) for t in obtener_trigramas(consulta)),
+                        key=len)
+        if not listas[0]:
+            return []
+        
+        # Si hasta la lista más corta es muy grande, las coincidencias abundan y
+        # recorrer en orden encuentra las primeras `limite` antes que intersectar
+        if len(listas[0]) ** 2 > limite * len(self.textos_busqueda):
+            return self.recorrer_coincidencias(consulta, limite)
+        
+        candidatos = listas[0].intersection(*listas[1:])
+        
+        # Verificar la subcadena completa (los trigramas pueden dar falsos positivos)
+        coincidencias = []
+        for codigo in candidatos:
+            nombre_norm, codigo_norm = self.textos_busqueda[codigo]
+            if consulta in nombre_norm or consulta in codigo_norm:
+                coincidencias.append(codigo)
+        
+        mejores = heapq.nsmallest(limite, coincidencias, key=self.orden_busqueda.__getitem__)
+        return [self.indice_codigos[codigo] for codigo in mejores]
+    
+    def recorrer_coincidencias(self, consulta, limite):
+        """Recorre el catálogo en orden y se detiene al llegar al límite"""
+        resultado = []
+        for codigo, (nombre_norm, codigo_norm) in self.textos_busqueda.items():
+            if consulta in nombre_norm or consulta in codigo_norm:
+                resultado.append(self.indice_codigos[codigo])
+                if len(resultado) >= limite:
+                    break
+        return resultado
+    
+    def guardar_productos(self, al_fallar=None):
+        """
+        Guarda el catálogo completo (CSV o SQLite), en el hilo escritor si lo hay.
+        El CSV completo ya incluye lo que hubiera en el journal, así que se borra
+        (si no, un journal de cuando estaba activado se reaplicaría en cada carga).
+        """
+        if not self.cargado:
+            return False
+        
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            return ejecutar(self.escritor, "guardar productos",
+                            obtener_almacenamiento().guardar_productos,
+                            [p.como_dict() for p in self.productos], al_fallar=al_fallar)
+        return ejecutar(self.escritor, "guardar productos", escribir_productos_csv,
+                        RUTA_PRODUCTOS, [p.como_tupla() for p in self.productos],
+                        RUTA_JOURNAL_PRODUCTOS, al_fallar=al_fallar)
+    
+    def registrar_cambio(self, registro, diferido=False):
+        """
+        Registra un cambio de producto para persistirlo.
+        diferido=True (stock): queda pendiente hasta el próximo guardado en lote.
+        diferido=False (alta/edición/baja): se guarda de inmediato junto con lo pendiente.
+        """
+        self.cambios_pendientes.append(registro)
+        if diferido and len(self.cambios_pendientes) < MAX_CAMBIOS_PENDIENTES:
+            return True
+        return self.guardar_pendientes()
+    
+    def devolver_pendientes(self, registros):
+        """Vuelve a dejar pendientes los registros de una escritura fallida (se reintentan)"""
+        self.cambios_pendientes[:0] = registros
+    
+    def guardar_pendientes(self):
+        """
+        Escribe en disco los cambios pendientes en una sola operación.
+        Con journal: agrega las líneas al final de productos.journal (costo O(cambios)).
+        Sin journal: reescribe el CSV completo una sola vez para todo el lote.
+        SQLite: aplica el lote en una sola transacción.
+        """
+        if not self.cambios_pendientes:
             return True
+        
+        registros = self.cambios_pendientes
+        self.cambios_pendientes = []
+        al_fallar = lambda error: self.devolver_pendientes(registros)
+        
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            return ejecutar(self.escritor, "guardar productos",
+                            obtener_almacenamiento().aplicar_cambios, registros,
+                            al_fallar=al_fallar)
+        
+        if not JOURNAL_PRODUCTOS_ACTIVADO:
+            return self.guardar_productos(al_fallar=al_fallar)
+        
+        lineas = ''.join(json.dumps(registro, ensure_ascii=False) + '\n'
+                         for registro in registros)
+        bytes_lineas = len(lineas.encode('utf-8'))
+        return ejecutar(self.escritor, "escribir journal de productos", agregar_lineas,
+                        RUTA_JOURNAL_PRODUCTOS, lineas, al_fallar=al_fallar,
+                        al_terminar=lambda resultado: self.journal_escrito(bytes_lineas))
+    
+    def journal_escrito(self, bytes_lineas):
+        """Suma al tamaño del journal lo ya escrito y lo compacta si pasó el límite"""
+        self.bytes_journal += bytes_lineas
+        if self.bytes_journal > LIMITE_JOURNAL_BYTES:
+            self.compactar_journal()
+    
+    def cerrar(self):
+        """Persiste todo lo pendiente antes de cerrar el programa"""
+        if MOTOR_ALMACENAMIENTO == 'csv' and JOURNAL_PRODUCTOS_ACTIVADO:
+            return self.compactar_journal()
+        return self.guardar_pendientes()
+    
+    def aplicar_journal(self):
+        """Reaplica sobre el catálogo los cambios pendientes del journal"""
+        if not os.path.exists(RUTA_JOURNAL_PRODUCTOS):
+            return
+        
+        try:
+            self.bytes_journal = os.path.getsize(RUTA_JOURNAL_PRODUCTOS)
+            with open(RUTA_JOURNAL_PRODUCTOS, 'r', encoding='utf-8') as archivo:
+                for linea in archivo:
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        # Línea incompleta (p. ej. corte de luz a mitad de escritura)
+                        continue
+                    self.aplicar_registro(registro)
         except Exception as e:
-            print(f"Error al guardar productos: {e}")
+            print(f"Error al leer journal de productos: {e}")
+    
+    def aplicar_registro(self, registro):
+        """
+        Aplica un registro del journal. Los registros guardan valores finales
+        (no solo deltas), así que reaplicarlos es idempotente.
+        """
+        operacion = registro.get('op')
+        if operacion == 'stock':
+            producto = self.indice_codigos.get(registro['codigo'])
+            if producto is not None:
+                self.cambiar_stock(producto, int(registro['stock']), avisar=False)
+        elif operacion == 'guardar':
+            datos = registro['producto']
+            producto = self.indice_codigos.get(datos['codigo'])
+            if producto is None:
+                producto = Producto(datos['codigo'], '', 0.0, '')
+                self.productos.append(producto)
+                self.indice_codigos[datos['codigo']] = producto
+            else:
+                self.quitar_de_vistas(producto)
+                self.desindexar_stock(producto)
+            producto['nombre'] = datos['nombre']
+            producto['precio'] = float(datos['precio'])
+            producto['categoria'] = datos['categoria']
+            producto['stock'] = int(datos['stock'])
+            self.indexar_busqueda(producto)
+            self.indexar_stock(producto)
+            self.agregar_a_vistas(producto)
+        elif operacion == 'eliminar':
+            codigo = registro['codigo']
+            producto = self.indice_codigos.pop(codigo, None)
+            if producto is not None:
+                self.productos = [p for p in self.productos if p['codigo'] != codigo]
+                self.desindexar_busqueda(codigo)
+                self.desindexar_stock(producto)
+                self.quitar_de_vistas(producto)
+    
+    def compactar_journal(self):
+        """Vuelca el catálogo completo al CSV y vacía el journal"""
+        if not self.cargado:
             return False
+        
+        # El CSV que se escribe ya refleja todo lo que está en memoria
+        registros = self.cambios_pendientes
+        self.cambios_pendientes = []
+        self.bytes_journal = 0
+        return ejecutar(self.escritor, "compactar journal de productos", escribir_productos_csv,
+                        RUTA_PRODUCTOS, [p.como_tupla() for p in self.productos],
+                        RUTA_JOURNAL_PRODUCTOS,
+                        al_fallar=lambda error: self.devolver_pendientes(registros))
     
     def agregar_producto(self, codigo, nombre, precio, categoria, stock=0):
         """Agrega un nuevo producto"""
         # Verificar si el código ya existe
-        if any(p['codigo'] == codigo for p in self.productos):
+        if codigo in self.indice_codigos:
             return False, "El código ya existe"
         
-        nuevo_producto = {
-            'codigo': codigo,
-            'nombre': nombre,
-            'precio': float(precio),
-            'categoria': categoria,
-            'stock': int(stock)
-        }
+        nuevo_producto = Producto(codigo, nombre, float(precio), categoria, int(stock))
         self.productos.append(nuevo_producto)
-        return self.guardar_productos(), "Producto agregado exitosamente"
+        self.indice_codigos[codigo] = nuevo_producto
+        self.indexar_busqueda(nuevo_producto)
+        self.indexar_stock(nuevo_producto)
+        self.agregar_a_vistas(nuevo_producto)
+        exito = self.registrar_cambio({'op': 'guardar', 'producto': nuevo_producto.como_dict()})
+        return exito, "Producto agregado exitosamente"
     
     def editar_producto(self, codigo, nombre, precio, categoria, stock=None):
         """Edita un producto existente"""
-        for producto in self.productos:
-            if producto['codigo'] == codigo:
-                producto['nombre'] = nombre
-                producto['precio'] = float(precio)
-                producto['categoria'] = categoria
-                if stock is not None:
-                    producto['stock'] = int(stock)
-                return self.guardar_productos(), "Producto editado exitosamente"
-        return False, "Producto no encontrado"
+        producto = self.indice_codigos.get(codigo)
+        if producto is None:
+            return False, "Producto no encontrado"
+        
+        self.quitar_de_vistas(producto)
+        self.desindexar_stock(producto)
+        producto['nombre'] = nombre
+        producto['precio'] = float(precio)
+        producto['categoria'] = categoria
+        if stock is not None:
+            producto['stock'] = int(stock)
+        self.indexar_busqueda(producto)
+        self.indexar_stock(producto)
+        self.agregar_a_vistas(producto)
+        exito = self.registrar_cambio({'op': 'guardar', 'producto': producto.como_dict()})
+        return exito, "Producto editado exitosamente"
     
     def eliminar_producto(self, codigo):
         """Elimina un producto"""
         self.productos = [p for p in self.productos if p['codigo'] != codigo]
-        return self.guardar_productos()
+        producto = self.indice_codigos.pop(codigo, None)
+        if producto is not None:
+            self.desindexar_busqueda(codigo)
+            self.desindexar_stock(producto)
+            self.quitar_de_vistas(producto)
+        return self.registrar_cambio({'op': 'eliminar', 'codigo': codigo})
     
     def buscar_producto(self, codigo):
         """Busca un producto por código"""
-        for producto in self.productos:
-            if producto['codigo'] == codigo:
-                return producto
-        return None
+        return self.indice_codigos.get(codigo)
     
     def obtener_nombres_productos(self):
         """Retorna lista de nombres con precio para el combobox"""
-        resultado = []
-        for p in self.productos:
-            texto = f"{p['nombre']} - S/ {p['precio']:.2f}"
-            # Si el stock está activado, mostrar stock
-            if STOCK_ACTIVADO:
-                texto += f" [STOCK: {p['stock']}]"
-            resultado.append(texto)
-        return resultado
+        # Se arma con los textos memoizados; solo se rehace si cambió el catálogo
+        if self.version_nombres != self.version:
+            self.nombres_productos = [self.texto_producto(p) for p in self.productos]
+            self.version_nombres = self.version
+        return list(self.nombres_productos)
+    
+    def obtener_mapa_textos(self):
+        """Retorna el diccionario texto mostrado -> producto (se mantiene al día solo)"""
+        return self.mapa_textos
+    
+    def obtener_textos_codigo_nombre(self):
+        """Retorna lista "codigo - nombre" para los filtros de reportes"""
+        if self.textos_codigo_nombre is None:
+            self.textos_codigo_nombre = [f"{p['codigo']} - {p['nombre']}" for p in self.productos]
+        return list(self.textos_codigo_nombre)
     
     def obtener_categorias(self):
         """Retorna lista de categorías únicas"""
-        categorias = set(p['categoria'] for p in self.productos)
-        return sorted(list(categorias))
+        if self.categorias_ordenadas is None:
+            self.categorias_ordenadas = sorted(self.conteo_categorias)
+        return list(self.categorias_ordenadas)
     
     def actualizar_stock(self, codigo, cantidad_vendida):
-        """Actualiza el stock de un producto después de una venta"""
-        if not STOCK_ACTIVADO:
+        """
+        Actualiza el stock de un producto después de una venta.
+        La alerta de stock bajo la emite el callback al_stock_bajo al cruzar el umbral.
+        """
+        if not config.STOCK_ACTIVADO:
             return True, "Stock desactivado"
         
-        for producto in self.productos:
-            if producto['codigo'] == codigo:
-                nuevo_stock = producto['stock'] - cantidad_vendida
-                if nuevo_stock < 0:
-                    return False, f"Stock insuficiente. Disponible: {producto['stock']}"
-                producto['stock'] = nuevo_stock
-                self.guardar_productos()
-                
-                # Advertencia si el stock es bajo
-                if nuevo_stock <= 5:
-                    return True, f"ADVERTENCIA: Stock bajo para '{producto['nombre']}': {nuevo_stock} unidades"
-                return True, "Stock actualizado"
-        return False, "Producto no encontrado"
-    
-    def productos_stock_bajo(self, umbral=10):
-        """Retorna productos con stock bajo"""
-        if not STOCK_ACTIVADO:
+        producto = self.indice_codigos.get(codigo)
+        if producto is None:
+            return False, "Producto no encontrado"
+        
+        nuevo_stock = producto['stock'] - cantidad_vendida
+        if nuevo_stock < 0:
+            return False, f"Stock insuficiente. Disponible: {producto['stock']}"
+        self.cambiar_stock(producto, nuevo_stock)
+        self.registrar_cambio({'op': 'stock', 'codigo': codigo,
+                               'delta': -cantidad_vendida, 'stock': nuevo_stock},
+                              diferido=True)
+        return True, "Stock actualizado"
+    
+    def devolver_stock(self, codigo, cantidad):
+        """Devuelve al stock las unidades de una venta eliminada"""
+        producto = self.indice_codigos.get(codigo)
+        if producto is None:
+            return False
+        
+        self.cambiar_stock(producto, producto['stock'] + cantidad)
+        return self.registrar_cambio({'op': 'stock', 'codigo': codigo,
+                                      'delta': cantidad, 'stock': producto['stock']},
+                                     diferido=True)
+    
+    def productos_stock_bajo(self, umbral=UMBRAL_STOCK_LISTADO):
+        """Retorna productos con stock <= umbral, de menor a mayor stock (O(k) con el índice)"""
+        if not config.STOCK_ACTIVADO:
             return []
         
-        return [p for p in self.productos if p['stock'] <= umbral]
+        fin = bisect.bisect_left(self.indice_stock, (umbral + 1,))
+        return [self.indice_codigos[codigo] for _, codigo in self.indice_stock[:fin]]
     
     def obtener_siguiente_codigo_variable(self):
         """
@@ -187,11 +735,153 @@ class GestorProductos:
         return f'VAR{siguiente:03d}'  # VAR001, VAR002, etc.
 
 
+def leer_ventas_dia(fecha_str, ruta_ventas=None):
+    """Recorre las ventas de un día del CSV de Excel_app, sin armar una lista"""
+    ruta = os.path.join(ruta_ventas or RUTA_VENTAS_APP, f'ventas_{fecha_str}.csv')
+    if not os.path.exists(ruta):
+        return
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        yield from csv.DictReader(archivo)
+
+
+def generar_excel_dia(fecha_str, ventas=None, ruta_ventas=None, ruta_registro=None):
+    """
+    Genera el Excel visual (registro humano) con TODAS las ventas del día.
+    Usa el modo write_only de openpyxl: las filas se escriben en flujo y en
+    memoria solo quedan los productos distintos pagados en efectivo.
+    Es una función de módulo para poder ejecutarse en el pool de procesos.
+    ventas: ventas del día (SQLite); si es None se leen del CSV de ruta_ventas
+    Returns: True si se generó, False si el día no tiene ventas
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+
+    # Agrupar: efectivo por producto, pagos digitales uno por venta
+    ventas_efectivo = {}  # nombre -> [cantidad, subtotal]
+    montos_digitales = []
+    if ventas is None:
+        ventas = leer_ventas_dia(fecha_str, ruta_ventas)
+    for venta in ventas:
+        subtotal = float(venta['subtotal'])
+        if venta['metodo_pago'] == 'E':
+            acumulado = ventas_efectivo.get(venta['nombre'])
+            if acumulado is None:
+                ventas_efectivo[venta['nombre']] = [int(venta['cantidad']), subtotal]
+            else:
+                acumulado[0] += int(venta['cantidad'])
+                acumulado[1] += subtotal
+        else:
+            montos_digitales.append(subtotal)
+
+    if not ventas_efectivo and not montos_digitales:
+        return False
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Ventas")
+
+    # Anchos de columna
+    ws.column_dimensions['A'].width = 30
+    ws.column_dimensions['B'].width = 15
+    ws.column_dimensions['C'].width = 5
+    ws.column_dimensions['D'].width = 20
+    ws.column_dimensions['E'].width = 15
+
+    negrita = Font(bold=True)
+    centro = Alignment(horizontal='center')
+    derecha = Alignment(horizontal='right')
+    izquierda = Alignment(horizontal='left')
+
+    def celda(valor, alineacion, fuente=None):
+        c = WriteOnlyCell(ws, value=valor)
+        c.alignment = alineacion
+        if fuente:
+            c.font = fuente
+        return c
+
+    # ENCABEZADOS
+    ws.append([celda('Productos', centro, negrita), celda('Efectivo', centro, negrita), None,
+               celda(' ', centro, negrita), celda('Yape / Plin', centro, negrita)])
+
+    # PRODUCTOS (EFECTIVO) a la izquierda y PAGOS DIGITALES a la derecha
+    total_efectivo = 0
+    total_digital = 0
+    for producto, monto in zip_longest(ventas_efectivo.items(), montos_digitales):
+        fila = [None] * 5
+        if producto:
+            nombre, (cantidad, subtotal) = producto
+            fila[0] = f"{nombre} x{cantidad}"
+            fila[1] = celda(f"S/ {subtotal:.2f}", derecha)
+            total_efectivo += subtotal
+        if monto is not None:
+            fila[4] = celda(f"S/ {monto:.2f}", derecha)
+            total_digital += monto
+        ws.append(fila)
+
+    # TOTALES (tras una fila en blanco)
+    ws.append([None])
+    ws.append([celda('TOTAL', izquierda, negrita),
+               celda(f"S/ {total_efectivo:.2f}", derecha, negrita), None, None,
+               celda(f"S/ {total_digital:.2f}", derecha, negrita)])
+
+    # Guardar (a un temporal y luego se renombra: nunca queda un .xlsx a medio escribir)
+    nombre_excel = os.path.join(ruta_registro or RUTA_VENTAS_REGISTRO, f'ventas_{fecha_str}.xlsx')
+    wb.save(nombre_excel + '.tmp')
+    os.replace(nombre_excel + '.tmp', nombre_excel)
+    print(f"✅ Excel visual guardado en: {nombre_excel}")
+    return True
+
+
+def buscar_venta(ventas, indice, codigo=None):
+    """
+    Posición de la venta a eliminar: la indicada si su código coincide; si no, la última
+    venta con ese código. Sin código se usa solo la posición. None si no hay ninguna.
+    """
+    if 0 <= indice < len(ventas) and (codigo is None or ventas[indice]['codigo'] == codigo):
+        return indice
+    if codigo is not None:
+        for i in range(len(ventas) - 1, -1, -1):
+            if ventas[i]['codigo'] == codigo:
+                return i
+    return None
+
+
 class GestorVentas:
     """Maneja el registro de ventas y cálculos"""
     
     def __init__(self):
         self.ventas_actuales = []
+        # Totales acumulados por método de pago, como fracciones exactas de los subtotales
+        # (sin redondear a céntimos ni acumular error al agregar y eliminar)
+        self.totales_metodo = {}
+        self.reiniciar_totales()
+        # Registros de la venta en curso aún no escritos en el temporal (WAL)
+        self.registros_temporal = []
+        self.escrituras_sin_fsync = 0
+        self.escritor = None  # EscritorDisco (lo asigna la interfaz); None = escribir aquí mismo
+        # Excel de registro en curso en el pool de procesos: fecha -> repetir al terminar
+        self.excel_en_curso = {}
+        self.candado_excel = threading.Lock()
+        # Reporte de hoy en memoria (se suma cada cierre al escribirlo)
+        self.reporte_hoy = ReporteVivo()
+        # Fecha del último cierre que ya dejó en columnar el día anterior
+        self.columnar_hasta = None
+    
+    def reiniciar_totales(self):
+        """Pone en cero los totales acumulados"""
+        self.totales_metodo = {codigo: Fraction(0) for codigo in METODOS_PAGO}
+    
+    def recalcular_totales(self):
+        """Rehace los totales acumulados desde ventas_actuales (p. ej. al recuperar el temporal)"""
+        self.reiniciar_totales()
+        for venta in self.ventas_actuales:
+            self.sumar_a_totales(venta, 1)
+    
+    def sumar_a_totales(self, venta, signo):
+        """Suma (signo=1) o resta (signo=-1) una venta de los totales acumulados"""
+        metodo = venta['metodo_pago']
+        subtotal = Fraction(venta['subtotal'])
+        self.totales_metodo[metodo] = self.totales_metodo.get(metodo, 0) + signo * subtotal
     
     def agregar_venta(self, producto, cantidad, metodo_pago):
         """Agrega una venta a la lista actual"""
@@ -205,35 +895,96 @@ class GestorVentas:
             'categoria': producto['categoria']
         }
         self.ventas_actuales.append(venta)
+        self.sumar_a_totales(venta, 1)
+        self.registros_temporal.append({'op': 'agregar', 'venta': venta})
         return venta
     def autoguardar_temporal(self):
-        """Guarda automáticamente las ventas en archivo temporal (en segundo plano)"""
-        if not self.ventas_actuales:
-            return
+        """
+        Agrega al temporal (WAL) los registros de las ventas agregadas/eliminadas
+        desde el último autoguardado: una línea compacta por operación, sin reescribir todo.
+        Si la escritura falla se reescribe el temporal completo desde ventas_actuales.
+        Returns: True si se encoló o se escribió bien, False si falló
+        """
+        if not self.registros_temporal:
+            return True
         
-        try:
-            # Calcular totales para el resumen
-            totales = self.calcular_totales()
-            
-            datos_temporal = {
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'total': totales['general'],
-                'cantidad_productos': len(self.ventas_actuales),
-                'ventas': self.ventas_actuales
-            }
-            
-            with open(RUTA_TEMPORAL, 'w', encoding='utf-8') as f:
-                json.dump(datos_temporal, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            # Silencioso - no interrumpir flujo normal si falla
-            print(f"Error en autoguardado temporal: {e}") 
+        lineas = self.lineas_temporal(self.registros_temporal)
+        self.registros_temporal = []
+        
+        self.escrituras_sin_fsync += 1
+        sincronizar = bool(FSYNC_TEMPORAL_CADA) and self.escrituras_sin_fsync >= FSYNC_TEMPORAL_CADA
+        if sincronizar:
+            self.escrituras_sin_fsync = 0
+        
+        # Si falla no se interrumpe el flujo normal: el error se informa y el temporal
+        # se rehace desde la memoria para que no quede desfasado
+        return ejecutar(self.escritor, "autoguardar temporal", agregar_lineas,
+                        RUTA_TEMPORAL_WAL, lineas, sincronizar,
+                        al_fallar=lambda error: self.reescribir_temporal())
+    
+    def lineas_temporal(self, registros):
+        """Convierte registros del temporal en líneas JSON compactas con la hora actual"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return ''.join(
+            json.dumps(dict(registro, t=timestamp), ensure_ascii=False, separators=(',', ':')) + '\n'
+            for registro in registros)
+    
+    def reescribir_temporal(self):
+        """Reescribe el temporal completo con las ventas actuales (tras un guardado fallido)"""
+        self.registros_temporal = []
+        lineas = self.lineas_temporal({'op': 'agregar', 'venta': v} for v in self.ventas_actuales)
+        ejecutar(self.escritor, "reescribir temporal", reemplazar_archivo, RUTA_TEMPORAL_WAL, lineas)
 
 
     def cargar_temporal(self):
         """
-        Carga ventas desde archivo temporal si existe
+        Carga ventas desde archivo temporal si existe (reaplica el WAL)
         Returns: (exito: bool, datos: dict o None)
         """
+        if not os.path.exists(RUTA_TEMPORAL_WAL):
+            # Temporal en el formato anterior (JSON completo)
+            return self.cargar_temporal_json()
+        
+        ventas = []
+        timestamp = None
+        try:
+            with open(RUTA_TEMPORAL_WAL, 'r', encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        # Línea incompleta (corte a mitad de escritura)
+                        continue
+                    if registro.get('op') == 'agregar':
+                        ventas.append(registro['venta'])
+                    elif registro.get('op') == 'eliminar':
+                        indice = buscar_venta(ventas, registro['indice'], registro.get('codigo'))
+                        if indice is not None:
+                            ventas.pop(indice)
+                    timestamp = registro.get('t', timestamp)
+        except Exception as e:
+            print(f"Error al cargar temporal: {e}")
+            return False, None
+        
+        # Verificar que tenga ventas
+        if not ventas:
+            self.limpiar_temporal()
+            return False, None
+        
+        # Cargar ventas (sin modificar stock)
+        self.ventas_actuales = ventas
+        self.registros_temporal = []
+        self.recalcular_totales()
+        
+        return True, {
+            'timestamp': timestamp,
+            'total': self.calcular_totales()['general'],
+            'cantidad_productos': len(ventas),
+            'ventas': ventas
+        }
+    
+    def cargar_temporal_json(self):
+        """Carga un ventas_temporales.json de versiones anteriores y lo pasa al WAL"""
         if not os.path.exists(RUTA_TEMPORAL):
             return False, None
         
@@ -248,6 +999,11 @@ class GestorVentas:
             
             # Cargar ventas (sin modificar stock)
             self.ventas_actuales = datos['ventas']
+            self.recalcular_totales()
+            
+            # Reescribir como WAL y descartar el JSON
+            self.reescribir_temporal()
+            ejecutar(self.escritor, "limpiar temporal", eliminar_archivos, RUTA_TEMPORAL)
             
             return True, datos
         except Exception as e:
@@ -257,37 +1013,82 @@ class GestorVentas:
 
 
     def limpiar_temporal(self):
-        """Elimina el archivo temporal"""
-        try:
-            if os.path.exists(RUTA_TEMPORAL):
-                os.remove(RUTA_TEMPORAL)
-        except Exception as e:
-            print(f"Error al limpiar temporal: {e}")
+        """Elimina el archivo temporal (WAL y el JSON de versiones anteriores)"""
+        self.registros_temporal = []
+        ejecutar(self.escritor, "limpiar temporal", eliminar_archivos,
+                 RUTA_TEMPORAL_WAL, RUTA_TEMPORAL)
 
 
 
-    def eliminar_venta(self, indice):
-        """Elimina una venta de la lista actual"""
-        if 0 <= indice < len(self.ventas_actuales):
-            self.ventas_actuales.pop(indice)
-            return True
-        return False
+    def eliminar_venta(self, indice, codigo=None):
+        """
+        Elimina una venta de la lista actual. Con codigo, la venta se busca por su producto
+        (la de esa posición o, si no coincide, la última con ese código).
+        La memoria se cambia solo después de anotar la eliminación en el temporal.
+        """
+        indice = buscar_venta(self.ventas_actuales, indice, codigo)
+        if indice is None:
+            return False
+        
+        venta = self.ventas_actuales[indice]
+        self.registros_temporal.append({'op': 'eliminar', 'indice': indice, 'codigo': venta['codigo']})
+        if not self.autoguardar_temporal():
+            return False
+        
+        self.ventas_actuales.pop(indice)
+        self.sumar_a_totales(venta, -1)
+        return True
     
     def calcular_totales(self):
-        """Calcula los totales de las ventas actuales"""
-        total_general = sum(v['subtotal'] for v in self.ventas_actuales)
-        total_efectivo = sum(v['subtotal'] for v in self.ventas_actuales if v['metodo_pago'] == 'E')
-        total_virtual = sum(v['subtotal'] for v in self.ventas_actuales 
-                           if v['metodo_pago'] in METODOS_VIRTUALES)
+        """
+        Retorna los totales de las ventas actuales en O(1) (se acumulan al agregar/eliminar)
+        'metodos' trae el desglose por código de método de pago
+        """
+        acumulados = self.totales_metodo
+        totales = {
+            'general': float(sum(acumulados.values())),
+            'efectivo': float(acumulados.get('E', 0)),
+            'virtual': float(sum(acumulados.get(m, 0) for m in METODOS_VIRTUALES)),
+            'metodos': {metodo: float(valor) for metodo, valor in acumulados.items()}
+        }
+        if VERIFICAR_TOTALES:
+            self.verificar_totales(totales)
+        return totales
+    
+    def calcular_totales_completo(self):
+        """Calcula los totales recorriendo todas las ventas (referencia para verificar)"""
+        metodos = {codigo: 0.0 for codigo in METODOS_PAGO}
+        for venta in self.ventas_actuales:
+            metodos[venta['metodo_pago']] = metodos.get(venta['metodo_pago'], 0.0) + venta['subtotal']
         
         return {
-            'general': total_general,
-            'efectivo': total_efectivo,
-            'virtual': total_virtual
+            'general': sum(metodos.values()),
+            'efectivo': metodos.get('E', 0.0),
+            'virtual': sum(metodos.get(m, 0.0) for m in METODOS_VIRTUALES),
+            'metodos': metodos
         }
     
+    def verificar_totales(self, totales=None):
+        """Compara los totales acumulados con un recálculo completo (AssertionError si difieren)"""
+        if totales is None:
+            totales = self.calcular_totales()
+        # raise y no assert: la verificación tiene que correr también con python -O
+        referencia = self.calcular_totales_completo()
+        for clave in ('general', 'efectivo', 'virtual'):
+            if abs(totales[clave] - referencia[clave]) >= 0.005:
+                raise AssertionError(
+                    f"Total '{clave}' desincronizado: {totales[clave]} != {referencia[clave]}")
+        for metodo in set(totales['metodos']) | set(referencia['metodos']):
+            if abs(totales['metodos'].get(metodo, 0) - referencia['metodos'].get(metodo, 0)) >= 0.005:
+                raise AssertionError(f"Total del método '{metodo}' desincronizado")
+        return True
+    
     def guardar_ventas(self):
-        """Guarda las ventas EN CSV (Excel_app) y EXCEL (Excel_registro)"""
+        """
+        Guarda las ventas EN CSV (Excel_app) y EXCEL (Excel_registro).
+        Con hilo escritor la caja se limpia de inmediato y la escritura sigue en
+        segundo plano; si falla, las ventas vuelven a la caja (restaurar_ventas).
+        """
         if not self.ventas_actuales:
             return False, "No hay ventas para guardar"
         
@@ -295,170 +1096,247 @@ class GestorVentas:
         fecha_str = fecha_actual.strftime('%Y-%m-%d')
         hora_str = fecha_actual.strftime('%H:%M:%S')
         
-        # 1. GUARDAR CSV EN Excel_app (para el programa)
-        nombre_csv = os.path.join(RUTA_VENTAS_APP, f'ventas_{fecha_str}.csv')
-        archivo_existe = os.path.exists(nombre_csv)
-        
-        try:
-            with open(nombre_csv, 'a', newline='', encoding='utf-8') as archivo:
-                escritor = csv.DictWriter(archivo, fieldnames=COLUMNAS_VENTAS)
-                
-                if not archivo_existe:
-                    escritor.writeheader()
-                
-                # Agregar fecha y hora a cada venta
-                for venta in self.ventas_actuales:
-                    venta['fecha'] = fecha_str
-                    venta['hora'] = hora_str
-                    escritor.writerow(venta)
-        except Exception as e:
-            return False, f"Error al guardar CSV: {e}"
+        # Agregar fecha y hora a cada venta
+        ventas = self.ventas_actuales
+        for venta in ventas:
+            venta['fecha'] = fecha_str
+            venta['hora'] = hora_str
         
-        # 2. GENERAR EXCEL EN Excel_registro (para visualización)
-        if OPENPYXL_DISPONIBLE:
-            try:
-                self._generar_excel_visual(fecha_str)
-            except Exception as e:
-                print(f"⚠️ Error al generar Excel visual: {e}")
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            destino = RUTA_BD
+        else:
+            destino = os.path.join(RUTA_VENTAS_APP, f'ventas_{fecha_str}.csv')
         
         # Calcular totales antes de limpiar
         totales = self.calcular_totales()
-        num_productos = len(self.ventas_actuales)
+        num_productos = len(ventas)
         
-        # Limpiar lista automáticamente después de guardar
+        # Limpiar lista automáticamente (el temporal se borra cuando la escritura termina)
         self.ventas_actuales = []
+        self.reiniciar_totales()
+        self.registros_temporal = []
+        
+        errores = []
+        def al_fallar(error):
+            errores.append(error)
+            self.restaurar_ventas(ventas)
+        
+        if not ejecutar(self.escritor, "guardar ventas", self.escribir_ventas,
+                        ventas, fecha_str, destino, al_fallar=al_fallar):
+            return False, f"Error al guardar ventas: {errores[0]}"
         
         return True, {
-            'archivo': nombre_csv,
+            'archivo': destino,
             'total': totales['general'],
             'efectivo': totales['efectivo'],
             'virtual': totales['virtual'],
             'productos': num_productos
         }
     
-    def _generar_excel_visual(self, fecha_str):
-        """Genera un Excel visual para registro humano"""
-        nombre_excel = os.path.join(RUTA_VENTAS_REGISTRO, f'ventas_{fecha_str}.xlsx')
+    def escribir_ventas(self, ventas, fecha_str, destino):
+        """
+        Escribe en disco un cierre de caja (se ejecuta en el hilo escritor):
+        CSV de Excel_app o SQLite, Excel de registro y, al final, borra el temporal.
+        Solo un error al guardar las ventas llega a al_fallar (y las devuelve a la caja);
+        lo que falle después se informa sin deshacer el cierre, que ya está en disco.
+        """
+        # 1. GUARDAR CSV EN Excel_app (para el programa) o en la base SQLite.
+        #    Con el candado del reporte de hoy: si se está leyendo el archivo para
+        #    armarlo, espera y después suma el cierre (nunca lo cuenta dos veces)
+        with self.reporte_hoy.candado:
+            if MOTOR_ALMACENAMIENTO == 'sqlite':
+                obtener_almacenamiento().insertar_ventas(ventas)
+            else:
+                archivo_existe = os.path.exists(destino)
+                firma_anterior = resumenes.firma_archivo(destino) if archivo_existe else None
+                with open(destino, 'a', newline='', encoding='utf-8') as archivo:
+                    escritor = csv.DictWriter(archivo, fieldnames=COLUMNAS_VENTAS)
+                    
+                    if not archivo_existe:
+                        escritor.writeheader()
+                    escritor.writerows(ventas)
+            self.reporte_hoy.agregar(fecha_str, ventas)
+        
+        # Resumen del día para los reportes por rango (si falla se rehace al leerlo)
+        if MOTOR_ALMACENAMIENTO != 'sqlite':
+            try:
+                resumenes.actualizar_resumen(fecha_str, ventas, firma_anterior,
+                                             RUTA_VENTAS_APP, RUTA_RESUMENES)
+            except Exception as e:
+                print(f"Error al actualizar resumen del día: {e}")
+            
+            # Copia columnar del último día cerrado: se arma una sola vez, en el primer
+            # cierre de un día nuevo (el día en curso se lee del CSV, que aún cambia)
+            if self.columnar_hasta != fecha_str:
+                try:
+                    columnar.convertir_anterior(fecha_str, RUTA_VENTAS_APP)
+                    self.columnar_hasta = fecha_str
+                except Exception as e:
+                    print(f"Error al armar archivo columnar del día anterior: {e}")
         
-        # Agrupar ventas por método de pago
-        ventas_efectivo = []
-        ventas_digitales = []
+        # El reporte del día que estuviera en caché ya no incluye este cierre
+        cache_reportes.invalidar(fecha_str)
         
-        for venta in self.ventas_actuales:
-            if venta['metodo_pago'] == 'E':
-                # Buscar si ya existe este producto en efectivo
-                encontrado = False
-                for v in ventas_efectivo:
-                    if v['nombre'] == venta['nombre']:
-                        v['cantidad'] += venta['cantidad']
-                        v['subtotal'] += venta['subtotal']
-                        encontrado = True
-                        break
-                if not encontrado:
-                    ventas_efectivo.append({
-                        'nombre': venta['nombre'],
-                        'cantidad': venta['cantidad'],
-                        'subtotal': venta['subtotal']
-                    })
-            else:
-                # Método digital
-                ventas_digitales.append({
-                    'metodo': METODOS_PAGO.get(venta['metodo_pago'], 'Otros'),
-                    'monto': venta['subtotal']
-                })
-        
-        # Crear Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Ventas"
-        
-        # Anchos de columna
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 5
-        ws.column_dimensions['D'].width = 20
-        ws.column_dimensions['E'].width = 15
-        
-        # ENCABEZADOS
-        ws['A1'] = 'Productos'
-        ws['B1'] = 'Efectivo'
-        ws['D1'] = ' '
-        ws['E1'] = 'Yape / Plin'
-        
-        # Formato encabezados (opcional, simple)
-        for cell in ['A1', 'B1', 'D1', 'E1']:
-            ws[cell].font = Font(bold=True)
-            ws[cell].alignment = Alignment(horizontal='center')
-        
-        # PRODUCTOS (EFECTIVO)
-        fila = 2
-        total_efectivo = 0
-        for v in ventas_efectivo:
-            ws[f'A{fila}'] = f"{v['nombre']} x{v['cantidad']}"
-            ws[f'B{fila}'] = f"S/ {v['subtotal']:.2f}"
-            ws[f'B{fila}'].alignment = Alignment(horizontal='right')
-            total_efectivo += v['subtotal']
-            fila += 1
-        
-        # PAGOS DIGITALES
-        fila_digital = 2
-        total_digital = 0
-        for v in ventas_digitales:
-            ws[f'E{fila_digital}'] = f"S/ {v['monto']:.2f}"
-            ws[f'E{fila_digital}'].alignment = Alignment(horizontal='right')
-            total_digital += v['monto']
-            fila_digital += 1
-        
-        # TOTALES
-        fila_total = max(fila, fila_digital) + 1
-        ws[f'A{fila_total}'] = 'TOTAL'
-        ws[f'B{fila_total}'] = f"S/ {total_efectivo:.2f}"
-        ws[f'E{fila_total}'] = f"S/ {total_digital:.2f}"
-        
-        # Formato totales (opcional, simple)
-        for cell in [f'A{fila_total}', f'B{fila_total}', f'E{fila_total}']:
-            ws[cell].font = Font(bold=True)
-            ws[cell].alignment = Alignment(horizontal='right' if cell != f'A{fila_total}' else 'left')
-        
-        # Guardar
-        wb.save(nombre_excel)
-        print(f"✅ Excel visual guardado en: {nombre_excel}")
+        # 2. Las ventas ya están guardadas: el temporal ya no hace falta
+        try:
+            eliminar_archivos(RUTA_TEMPORAL_WAL, RUTA_TEMPORAL)
+        except Exception as e:
+            print(f"Error al limpiar temporal: {e}")
+        
+        # 3. GENERAR EXCEL EN Excel_registro (para visualización) con el día completo,
+        #    en el pool de procesos para no demorar el cierre
+        self.programar_excel(fecha_str)
+    
+    def restaurar_ventas(self, ventas):
+        """Devuelve a la caja las ventas de un guardado fallido (delante de las nuevas)"""
+        for venta in ventas:
+            venta.pop('fecha', None)
+            venta.pop('hora', None)
+        self.ventas_actuales = ventas + self.ventas_actuales
+        self.recalcular_totales()
+        self.reescribir_temporal()
+    
+    def programar_excel(self, fecha_str):
+        """
+        Genera el Excel de registro del día en el pool de procesos (o aquí mismo sin escritor).
+        Si ya hay uno en curso para esa fecha, se repite al terminar para incluir lo último.
+        """
+        if not OPENPYXL_DISPONIBLE:
+            return
+    
+        if self.escritor is None:
+            try:
+                generar_excel_dia(*self.argumentos_excel(fecha_str))
+            except Exception as e:
+                print(f"⚠️ Error al generar Excel visual: {e}")
+            return
+    
+        with self.candado_excel:
+            if fecha_str in self.excel_en_curso:
+                self.excel_en_curso[fecha_str] = True  # repetir al terminar
+                return
+            self.excel_en_curso[fecha_str] = False
+    
+        # Si no se puede encolar (pool cerrado o roto, error al leer las ventas) se informa
+        # y se libera la fecha para que el próximo cierre lo intente de nuevo
+        terminar = lambda resultado: self.excel_terminado(fecha_str)
+        try:
+            self.escritor.en_proceso("generar Excel de registro", generar_excel_dia,
+                                     *self.argumentos_excel(fecha_str),
+                                     al_terminar=terminar, al_fallar=terminar)
+        except Exception as e:
+            print(f"⚠️ Error al generar Excel visual: {e}")
+            with self.candado_excel:
+                self.excel_en_curso.pop(fecha_str, None)
+    
+    def excel_terminado(self, fecha_str):
+        """Marca terminado el Excel de una fecha y lo repite si hubo otro cierre mientras tanto"""
+        with self.candado_excel:
+            repetir = self.excel_en_curso.pop(fecha_str, False)
+        if repetir:
+            self.programar_excel(fecha_str)
+    
+    def argumentos_excel(self, fecha_str):
+        """
+        Argumentos para generar_excel_dia (las rutas se pasan porque el proceso hijo
+        no comparte memoria). Con SQLite las ventas se leen aquí: la conexión no se comparte.
+        """
+        ventas = None
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            ventas = obtener_almacenamiento().ventas_fecha(fecha_str)
+        return fecha_str, ventas, RUTA_VENTAS_APP, RUTA_VENTAS_REGISTRO
+    
+    def fechas_con_ventas(self, fecha_inicio, fecha_fin):
+        """Retorna las fechas (YYYY-MM-DD) del rango que tienen ventas guardadas"""
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            return obtener_almacenamiento().fechas_con_ventas(fecha_inicio, fecha_fin)
+        return list(resumenes.fechas_en_rango(fecha_inicio, fecha_fin, RUTA_VENTAS_APP))
+    
+    def regenerar_registros_excel(self, fecha_inicio, fecha_fin):
+        """
+        Regenera desde el historial los Excel de registro de un rango de fechas
+        (YYYY-MM-DD), uno tras otro en este proceso
+        Returns: cantidad de archivos generados
+        """
+        generados = 0
+        for fecha_str in self.fechas_con_ventas(fecha_inicio, fecha_fin):
+            if generar_excel_dia(*self.argumentos_excel(fecha_str)):
+                generados += 1
+        return generados
+    
+    def regenerar_registros(self, fecha_inicio, fecha_fin, al_terminar=None):
+        """
+        Regenera los Excel de un rango repartiendo un día por tarea entre los núcleos
+        (pool de procesos). al_terminar(cantidad) se llama cuando terminan todos.
+        """
+        if self.escritor is None:
+            generados = self.regenerar_registros_excel(fecha_inicio, fecha_fin)
+            if al_terminar:
+                al_terminar(generados)
+            return True
+    
+        fechas = self.fechas_con_ventas(fecha_inicio, fecha_fin)
+        if not fechas:
+            if al_terminar:
+                al_terminar(0)
+            return True
+    
+        # Los callbacks corren en el hilo de la interfaz: no hace falta candado
+        estado = {'faltan': len(fechas), 'generados': 0}
+        def contar(resultado):
+            estado['faltan'] -= 1
+            if resultado is True:
+                estado['generados'] += 1
+            if estado['faltan'] == 0 and al_terminar:
+                al_terminar(estado['generados'])
+    
+        for fecha_str in fechas:
+            self.escritor.en_proceso(f"regenerar Excel del {fecha_str}", generar_excel_dia,
+                                     *self.argumentos_excel(fecha_str),
+                                     al_terminar=contar, al_fallar=contar)
+        return True
     
     def limpiar_ventas(self):
         """Limpia la lista de ventas actuales (EMERGENCIA)"""
         self.ventas_actuales = []
+        self.reiniciar_totales()
         self.limpiar_temporal() 
     
     def obtener_ventas(self):
         """Retorna la lista de ventas actuales"""
         return self.ventas_actuales
     
+    def reporte_del_dia(self, carrito=()):
+        """
+        Reporte de hoy sin leer el disco (salvo la primera vez). carrito: copia de la
+        venta en curso aún no guardada, que se suma solo a este reporte. Puede esperar
+        a que el hilo escritor termine un cierre: llamarlo fuera del hilo de Tk.
+        Returns: dict como AnalizadorVentas.reporte_dia, o None si no hay ventas
+        """
+        return self.reporte_hoy.reporte(carrito)
+    
     def obtener_historial(self, fecha=None):
         """Lee el historial de ventas de una fecha específica o todas"""
         historial = []
         
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            almacen = obtener_almacenamiento()
+            return almacen.ventas_fecha(fecha) if fecha else almacen.todas_las_ventas()
+        
         if fecha:
-            # Leer archivo específico
-            nombre_archivo = os.path.join(RUTA_VENTAS, f'ventas_{fecha}.csv')
-            if os.path.exists(nombre_archivo):
-                try:
-                    with open(nombre_archivo, 'r', encoding='utf-8') as archivo:
-                        lector = csv.DictReader(archivo)
-                        historial = list(lector)
-                except Exception as e:
-                    print(f"Error al leer historial: {e}")
+            fechas = resumenes.fechas_en_rango(fecha, fecha, RUTA_VENTAS_APP)
         else:
-            # Leer todos los archivos de ventas
-            if os.path.exists(RUTA_VENTAS):
-                for archivo in sorted(os.listdir(RUTA_VENTAS)):
-                    if archivo.startswith('ventas_') and archivo.endswith('.csv'):
-                        ruta_completa = os.path.join(RUTA_VENTAS, archivo)
-                        try:
-                            with open(ruta_completa, 'r', encoding='utf-8') as f:
-                                lector = csv.DictReader(f)
-                                historial.extend(list(lector))
-                        except Exception as e:
-                            print(f"Error al leer {archivo}: {e}")
+            # Todos los días con ventas (índice de la carpeta, ya ordenado)
+            fechas = resumenes.fechas_disponibles(RUTA_VENTAS_APP)
+        
+        for fecha_str in fechas:
+            nombre_archivo = os.path.join(RUTA_VENTAS_APP, f'ventas_{fecha_str}.csv')
+            try:
+                with open(nombre_archivo, 'r', encoding='utf-8') as archivo:
+                    lector = csv.DictReader(archivo)
+                    historial.extend(lector)
+            except Exception as e:
+                print(f"Error al leer historial de {fecha_str}: {e}")
         
         return historial
 
@@ -2,16 +2,25 @@
 Sistema de Gestión de Bazar
 Punto de entrada principal
 """
+import arranque  # primero, para medir el arranque completo
+import multiprocessing
 import tkinter as tk
 from interfaz import VentanaPrincipal
 
+arranque.marcar('imports')
+
 
 def main():
     """Función principal del programa"""
     root = tk.Tk()
     app = VentanaPrincipal(root)
+    arranque.marcar('ventana')
+    # Se ejecuta cuando el loop de Tk ya dibujó la ventana
+    root.after(0, lambda: arranque.marcar('primer_cuadro'))
     root.mainloop()
 
 
 if __name__ == "__main__":
+    # Necesario en Windows si se empaqueta como .exe (el pool de procesos de los Excel)
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Agregación con NumPy del Sistema de Bazar (opcional)
+Suma las ventas de un día guardado en formato columnar (ver columnar.py) sobre las
+columnas completas, con np.unique / np.bincount / np.add.at, en lugar de recorrer
+fila por fila. El resultado es idéntico al cálculo en Python: bincount suma los
+montos de cada grupo en el orden de las filas, igual que el bucle.
+Sin NumPy instalado se usa siempre el cálculo en Python.
+"""
+import importlib.util
+import sys
+import columnar
+from datetime import date
+from config import MOTOR_AGREGACION, MIN_FILAS_NUMPY, MIN_FILAS_DIA_NUMPY, METODOS_PAGO
+
+# NumPy se importa recién al primer cálculo (no demora el arranque)
+NUMPY_DISPONIBLE = importlib.util.find_spec('numpy') is not None
+if MOTOR_AGREGACION == 'numpy' and not NUMPY_DISPONIBLE:
+    print("⚠️ Advertencia: NumPy no está instalado. Los reportes se calcularán en Python.")
+    print("   Para instalar: pip install numpy")
+
+
+def conviene(filas):
+    """
+    Indica si un día con esa cantidad de ventas se agrega con NumPy (ver MOTOR_AGREGACION).
+    Si NumPy ya está importado no hay que pagar la importación: alcanza con MIN_FILAS_DIA_NUMPY.
+    """
+    if not NUMPY_DISPONIBLE or filas == 0 or MOTOR_AGREGACION == 'python':
+        return False
+    if MOTOR_AGREGACION == 'numpy':
+        return True
+    return filas >= (MIN_FILAS_DIA_NUMPY if 'numpy' in sys.modules else MIN_FILAS_NUMPY)
+
+
+def conviene_rango(fechas, ruta_ventas=None):
+    """
+    Indica si los días de un rango se agregan con NumPy: decide el total de ventas
+    columnares del rango (solo se leen los encabezados), no las de cada día
+    """
+    if not NUMPY_DISPONIBLE or MOTOR_AGREGACION == 'python':
+        return False
+    if MOTOR_AGREGACION == 'numpy':
+        return True
+    return sum(columnar.filas_dia(fecha, ruta_ventas) for fecha in fechas) >= MIN_FILAS_NUMPY
+
+
+def leer_columnas(archivo, *nombres):
+    """Copia columnas del archivo a arrays int64 (copias: el mmap se puede cerrar después)"""
+    import numpy as np
+    return [np.array(archivo.columnas[nombre], dtype=np.int64) for nombre in nombres]
+
+
+def agrupar(*claves):
+    """
+    Numera las combinaciones distintas de las claves (columnas de índices de diccionario)
+    en orden de primera aparición, como un dict de Python.
+    Returns: (grupo de cada fila, primera fila de cada grupo)
+    """
+    import numpy as np
+    grupo = np.zeros(len(claves[0]), dtype=np.int64)
+    for clave in claves:
+        # Se renumera después de cada columna para que la clave combinada no desborde
+        _, primeras, grupo = np.unique(grupo * (int(clave.max()) + 1) + clave,
+                                       return_index=True, return_inverse=True)
+        grupo = grupo.reshape(-1)
+    # np.unique numera por valor: pasar a orden de aparición
+    orden = np.argsort(primeras, kind='stable')
+    numero = np.empty_like(orden)
+    numero[orden] = np.arange(len(orden))
+    return numero[grupo], primeras[orden]
+
+
+def ultimas_filas(grupo):
+    """Última fila de cada grupo (grupos numerados 0..n-1 sin huecos)"""
+    import numpy as np
+    _, desde_el_final = np.unique(grupo[::-1], return_index=True)
+    return len(grupo) - 1 - desde_el_final
+
+
+def sumar_enteros(grupo, valores, grupos):
+    """Suma exacta por grupo de una columna entera"""
+    import numpy as np
+    total = np.zeros(grupos, dtype=np.int64)
+    np.add.at(total, grupo, valores)
+    return total
+
+
+def grupos_resumen(archivo, claves, cantidad, subtotal, horas=None):
+    """
+    Grupos de resumen ([codigo, nombre, categoria, metodo, cantidad, ingresos, primera,
+    ultima] y la hora al final si se pasa) de las columnas clave, en orden de aparición
+    """
+    import numpy as np
+    grupo, primeras = agrupar(*claves, *([] if horas is None else [horas]))
+    grupos = len(primeras)
+    cantidades = sumar_enteros(grupo, cantidad, grupos)
+    ingresos = np.bincount(grupo, weights=subtotal, minlength=grupos)
+
+    diccionarios = archivo.encabezado['diccionarios']
+    textos = [[diccionarios[nombre][i] for i in clave[primeras].tolist()]
+              for nombre, clave in zip(('codigo', 'nombre', 'categoria', 'metodo_pago'), claves)]
+    resultado = [[*campos, cantidad_total, ingresos_total, primera, ultima]
+                 for *campos, cantidad_total, ingresos_total, primera, ultima in zip(
+                     *textos, cantidades.tolist(), ingresos.tolist(), primeras.tolist(),
+                     ultimas_filas(grupo).tolist())]
+    if horas is not None:
+        for lista, hora in zip(resultado, horas[primeras].tolist()):
+            lista.append(hora)
+    return resultado
+
+
+def resumen_dia(archivo, resumen, por_hora=None):
+    """
+    Llena un resumen vacío (ver resumenes.nuevo_resumen) con las ventas de un día
+    columnar, y su tabla por hora si se pasa: mismo resultado que resumenes.acumular
+    sobre sus filas
+    """
+    import numpy as np
+    resumen['filas'] = archivo.filas
+    if por_hora is not None:
+        por_hora['filas'] = archivo.filas
+    if archivo.filas == 0:
+        return resumen
+
+    codigo, nombre, categoria, metodo, hora, cantidad, subtotal = leer_columnas(
+        archivo, 'codigo', 'nombre', 'categoria', 'metodo_pago', 'hora', 'cantidad', 'subtotal')
+    hora //= 3600
+    subtotal = subtotal / 100
+    claves = (codigo, nombre, categoria, metodo)
+    resumen['grupos'] = grupos_resumen(archivo, claves, cantidad, subtotal)
+    if por_hora is not None:
+        por_hora['grupos'] = grupos_resumen(archivo, claves, cantidad, subtotal, hora)
+
+    # Cantidad e ingresos por hora (todo el archivo es un mismo día de la semana)
+    dia = date.fromisoformat(archivo.encabezado['fecha']).weekday()
+    por_hora_dia, primeras = agrupar(hora)
+    cantidades = sumar_enteros(por_hora_dia, cantidad, len(primeras))
+    ingresos = np.bincount(por_hora_dia, weights=subtotal, minlength=len(primeras))
+    resumen['horas'] = [[dia, h, cantidad_hora, ingresos_hora] for h, cantidad_hora, ingresos_hora
+                        in zip(hora[primeras].tolist(), cantidades.tolist(), ingresos.tolist())]
+    return resumen
+
+
+def agregar_reporte_dia(archivo, acumulado):
+    """
+    Llena un acumulado vacío del reporte del día (ver reportes.nuevo_acumulado_dia)
+    con las ventas del archivo: mismo resultado que sumar_venta_dia fila por fila
+    """
+    import numpy as np
+    acumulado['cantidad_ventas'] = archivo.filas
+    if archivo.filas == 0:
+        return acumulado
+
+    codigo, nombre, metodo, cantidad, precio, subtotal = leer_columnas(
+        archivo, 'codigo', 'nombre', 'metodo_pago', 'cantidad', 'precio_unitario', 'subtotal')
+    subtotal = subtotal / 100
+    diccionarios = archivo.encabezado['diccionarios']
+    metodos = diccionarios['metodo_pago']
+
+    # Totales por método (los códigos desconocidos van a 'Otros')
+    nombres_metodo = list(acumulado['totales_metodos'])
+    posicion = np.array([nombres_metodo.index(METODOS_PAGO.get(m, 'Otros')) for m in metodos],
+                        dtype=np.int64)
+    totales = np.bincount(posicion[metodo], weights=subtotal, minlength=len(nombres_metodo))
+    for nombre_metodo, total in zip(nombres_metodo, totales.tolist()):
+        acumulado['totales_metodos'][nombre_metodo] += total
+
+    # Productos (código y nombre), con el precio de su última venta
+    producto, primeras = agrupar(codigo, nombre)
+    productos = len(primeras)
+    cantidades = sumar_enteros(producto, cantidad, productos)
+    subtotales = np.bincount(producto, weights=subtotal, minlength=productos)
+    precios = precio[ultimas_filas(producto)] / 100
+    lista = []
+    for c, n, cantidad_total, precio_unitario, subtotal_total in zip(
+            codigo[primeras].tolist(), nombre[primeras].tolist(), cantidades.tolist(),
+            precios.tolist(), subtotales.tolist()):
+        datos = {
+            'cantidad_total': cantidad_total,
+            'precio_unitario': precio_unitario,
+            'subtotal_total': subtotal_total,
+            'desglose_metodos': {}
+        }
+        acumulado['productos'][(diccionarios['codigo'][c], diccionarios['nombre'][n])] = datos
+        lista.append(datos)
+
+    # Desglose de cada producto por método, en orden de aparición
+    desglose, primeras = agrupar(producto, metodo)
+    cantidades = sumar_enteros(desglose, cantidad, len(primeras))
+    subtotales = np.bincount(desglose, weights=subtotal, minlength=len(primeras))
+    for p, m, cantidad_metodo, subtotal_metodo in zip(
+            producto[primeras].tolist(), metodo[primeras].tolist(), cantidades.tolist(),
+            subtotales.tolist()):
+        lista[p]['desglose_metodos'][metodos[m]] = {'cantidad': cantidad_metodo,
+                                                   'subtotal': subtotal_metodo}
+    return acumulado
@@ -2,37 +2,464 @@
 Módulo de Reportes del Sistema de Bazar - VERSIÓN LIMPIA
 Solo funcionalidades esenciales: Reporte del Día e Inventario Vendido
 """
+import calendar
 import csv
 import os
+import sys
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from collections import defaultdict
 from config import *
+from almacenamiento import obtener_almacenamiento
+import resumenes
+import columnar
+import motor_numpy
+
+
+def leer_filas(fecha):
+    """
+    Genera las ventas de una fecha (YYYY-MM-DD) una por una, con cantidad, precio y
+    subtotal convertidos a número. No deja las filas en memoria.
+    Usa el archivo columnar del día si está al día con el CSV (sin convertir texto).
+    """
+    if MOTOR_ALMACENAMIENTO == 'sqlite':
+        yield from obtener_almacenamiento().recorrer_ventas(fecha, fecha)
+        return
+    
+    archivo = columnar.abrir_dia(fecha, RUTA_VENTAS_APP)
+    if archivo is not None:
+        with archivo:
+            yield from archivo.filas_dict()
+        return
+    
+    with open(os.path.join(RUTA_VENTAS_APP, f'ventas_{fecha}.csv'), 'r', encoding='utf-8') as f:
+        for venta in csv.DictReader(f):
+            venta['cantidad'] = int(venta['cantidad'])
+            venta['precio_unitario'] = float(venta['precio_unitario'])
+            venta['subtotal'] = float(venta['subtotal'])
+            yield venta
+
+
+def filtrar_ventas(ventas, categoria=None, codigo_producto=None):
+    """Deja pasar solo las ventas de la categoría y/o el producto indicados"""
+    for venta in ventas:
+        if categoria and venta['categoria'] != categoria:
+            continue
+        if codigo_producto and venta['codigo'] != codigo_producto:
+            continue
+        yield venta
+
+
+def agregar_inventario(ventas):
+    """
+    Inventario vendido en una sola pasada (memoria por producto distinto, no por venta).
+    Nombre y categoría de la última venta; ordenado por cantidad descendente.
+    """
+    inventario = {}
+    for venta in ventas:
+        codigo = venta['codigo']
+        item = inventario.get(codigo)
+        if item is None:
+            item = inventario[codigo] = {
+                'nombre': '', 'categoria': '', 'cantidad_total': 0,
+                'ingresos_totales': 0.0, 'codigo': codigo
+            }
+        item['nombre'] = venta['nombre']
+        item['categoria'] = venta['categoria']
+        item['cantidad_total'] += venta['cantidad']
+        item['ingresos_totales'] += venta['subtotal']
+    
+    return sorted(inventario.values(), key=lambda x: x['cantidad_total'], reverse=True)
+
+
+def nuevo_acumulado_dia():
+    """Acumulado vacío del reporte del día"""
+    return {
+        'productos': {},  # (codigo, nombre) -> cantidades, subtotal y desglose por método
+        'totales_metodos': {'Efectivo': 0.0, 'Yape': 0.0, 'Plin': 0.0, 'Otros': 0.0},
+        'cantidad_ventas': 0
+    }
+
+
+def sumar_venta_dia(acumulado, venta):
+    """Suma una venta al acumulado del día (O(1))"""
+    acumulado['cantidad_ventas'] += 1
+    metodo = venta['metodo_pago']
+    clave = (venta['codigo'], venta['nombre'])  # Clave única por producto
+    
+    datos = acumulado['productos'].get(clave)
+    if datos is None:
+        datos = acumulado['productos'][clave] = {
+            'cantidad_total': 0,
+            'precio_unitario': 0.0,
+            'subtotal_total': 0.0,
+            'desglose_metodos': {}
+        }
+    
+    # Acumular totales por producto
+    datos['cantidad_total'] += venta['cantidad']
+    datos['precio_unitario'] = venta['precio_unitario']
+    datos['subtotal_total'] += venta['subtotal']
+    
+    # Acumular por método de pago
+    desglose = datos['desglose_metodos'].setdefault(metodo, {'cantidad': 0, 'subtotal': 0.0})
+    desglose['cantidad'] += venta['cantidad']
+    desglose['subtotal'] += venta['subtotal']
+    
+    acumulado['totales_metodos'][METODOS_PAGO.get(metodo, 'Otros')] += venta['subtotal']
+
+
+def agregar_reporte_dia(ventas, acumulado=None):
+    """
+    Agrupa en una sola pasada por producto (código y nombre) y por método de pago.
+    Returns: acumulado (ver nuevo_acumulado_dia)
+    """
+    if acumulado is None:
+        acumulado = nuevo_acumulado_dia()
+    for venta in ventas:
+        sumar_venta_dia(acumulado, venta)
+    return acumulado
+
+
+def acumular_dia(fecha):
+    """
+    Acumulado del reporte de una fecha leyendo sus ventas guardadas.
+    Los días columnares grandes se suman con NumPy (ver motor_numpy), el resto fila por fila.
+    """
+    if MOTOR_ALMACENAMIENTO != 'sqlite':
+        archivo = columnar.abrir_dia(fecha, RUTA_VENTAS_APP)
+        if archivo is not None:
+            with archivo:
+                if motor_numpy.conviene(archivo.filas):
+                    return motor_numpy.agregar_reporte_dia(archivo, nuevo_acumulado_dia())
+                return agregar_reporte_dia(archivo.filas_dict())
+    return agregar_reporte_dia(leer_filas(fecha))
+
+
+def copiar_acumulado_dia(acumulado):
+    """Copia independiente de un acumulado (para sumarle ventas sin tocar el original)"""
+    return {
+        'productos': {clave: dict(datos, desglose_metodos={metodo: dict(desglose) for metodo, desglose
+                                                           in datos['desglose_metodos'].items()})
+                      for clave, datos in acumulado['productos'].items()},
+        'totales_metodos': dict(acumulado['totales_metodos']),
+        'cantidad_ventas': acumulado['cantidad_ventas']
+    }
+
+
+def armar_reporte_dia(fecha, acumulado):
+    """
+    Convierte el acumulado en el reporte que muestra la interfaz
+    Returns: dict del reporte o None si no hay ventas
+    """
+    if acumulado['cantidad_ventas'] == 0:
+        return None
+    
+    # Convertir a lista para la interfaz
+    productos_vendidos = []
+    for (codigo, nombre), datos in acumulado['productos'].items():
+        # Crear string de métodos de pago
+        metodos_str = []
+        for metodo_cod, metodo_datos in datos['desglose_metodos'].items():
+            metodo_nombre = METODOS_PAGO.get(metodo_cod, 'Desconocido')
+            metodos_str.append(f"{metodo_nombre} ({metodo_datos['cantidad']})")
+        
+        productos_vendidos.append({
+            'codigo': codigo,
+            'nombre': nombre,
+            'cantidad': datos['cantidad_total'],
+            'precio_unitario': datos['precio_unitario'],
+            'subtotal': datos['subtotal_total'],
+            'metodos_pago': ', '.join(metodos_str)
+        })
+    
+    # Ordenar por nombre
+    productos_vendidos.sort(key=lambda x: x['nombre'])
+    
+    # Total general
+    totales_metodos = dict(acumulado['totales_metodos'])
+    total_general = sum(totales_metodos.values())
+    
+    # Calcular porcentajes
+    porcentajes = {}
+    for metodo, total in totales_metodos.items():
+        porcentaje = (total / total_general * 100) if total_general > 0 else 0
+        porcentajes[metodo] = porcentaje
+    
+    return {
+        'fecha': fecha,
+        'productos': productos_vendidos,
+        'totales_metodos': totales_metodos,
+        'porcentajes': porcentajes,
+        'total_general': total_general,
+        'cantidad_ventas': acumulado['cantidad_ventas']
+    }
+
+
+class ReporteVivo:
+    """
+    Reporte del día de hoy mantenido en memoria: se arma una vez desde el archivo del
+    día y después GestorVentas le suma cada cierre de caja, sin volver a leer el disco.
+    """
+    
+    def __init__(self):
+        self.fecha = None  # día del acumulado (None = aún no se leyó)
+        self.acumulado = None
+        # El hilo escritor agrega al CSV y suma al acumulado con este candado tomado,
+        # así leer el archivo al sembrar nunca cuenta dos veces un cierre
+        self.candado = threading.RLock()
+    
+    def sembrar(self, fecha):
+        """Arma el acumulado leyendo las ventas guardadas del día"""
+        with self.candado:
+            try:
+                acumulado = acumular_dia(fecha)
+            except FileNotFoundError:
+                acumulado = nuevo_acumulado_dia()
+            self.fecha = fecha
+            self.acumulado = acumulado
+    
+    def agregar(self, fecha, ventas):
+        """Suma ventas recién guardadas (si aún no se sembró, las leerá del archivo)"""
+        with self.candado:
+            if fecha != self.fecha:
+                return
+            for venta in ventas:
+                sumar_venta_dia(self.acumulado, venta)
+    
+    def reporte(self, carrito=()):
+        """
+        Reporte de hoy (mismo formato que reporte_dia). carrito: ventas aún no guardadas
+        que se suman solo a esta vista. Espera el candado mientras el hilo escritor
+        agrega un cierre y la primera vez lee el archivo: no llamarlo desde el hilo de Tk.
+        Returns: dict o None si no hay ventas
+        """
+        hoy = datetime.now().strftime('%Y-%m-%d')
+        with self.candado:
+            if self.fecha != hoy:
+                self.sembrar(hoy)
+            acumulado = self.acumulado
+            if carrito:
+                acumulado = agregar_reporte_dia(carrito, copiar_acumulado_dia(acumulado))
+            return armar_reporte_dia(hoy, acumulado)
+
+
+class CacheReportes:
+    """
+    Caché LRU de reportes del día, acotada por cantidad y por memoria estimada.
+    Cada reporte se guarda con la firma (mtime, tamaño) del CSV: si el archivo cambió
+    la entrada ya no sirve. Con SQLite se invalida al guardar ventas.
+    """
+    
+    def __init__(self, max_reportes=MAX_REPORTES_CACHE, max_mb=MAX_MB_CACHE_REPORTES):
+        self.max_reportes = max_reportes
+        self.max_bytes = max_mb * 1_000_000
+        self.reportes = OrderedDict()  # fecha -> (firma, reporte, bytes)
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.candado = threading.Lock()  # invalidar() llega desde el hilo escritor
+    
+    def obtener(self, fecha, firma):
+        """Retorna el reporte guardado si sigue vigente (no modificarlo), si no None"""
+        with self.candado:
+            entrada = self.reportes.get(fecha)
+            if entrada is None or entrada[0] != firma:
+                self.fallos += 1
+                return None
+            self.reportes.move_to_end(fecha)
+            self.aciertos += 1
+            return entrada[1]
+    
+    def guardar(self, fecha, firma, reporte):
+        """Guarda un reporte y descarta los menos usados si se pasa de los límites"""
+        tamano = estimar_bytes(reporte)
+        with self.candado:
+            self.quitar(fecha)
+            self.reportes[fecha] = (firma, reporte, tamano)
+            self.bytes += tamano
+            while self.reportes and (len(self.reportes) > self.max_reportes
+                                     or self.bytes > self.max_bytes):
+                self.quitar(next(iter(self.reportes)))
+    
+    def invalidar(self, fecha):
+        """Descarta el reporte de una fecha (al guardar ventas de ese día)"""
+        with self.candado:
+            self.quitar(fecha)
+    
+    def quitar(self, fecha):
+        """Quita una entrada (con el candado ya tomado)"""
+        entrada = self.reportes.pop(fecha, None)
+        if entrada is not None:
+            self.bytes -= entrada[2]
+    
+    def estadisticas(self):
+        """Aciertos, fallos, reportes guardados y memoria estimada"""
+        with self.candado:
+            return {'aciertos': self.aciertos, 'fallos': self.fallos,
+                    'reportes': len(self.reportes), 'bytes': self.bytes}
+
+
+def estimar_bytes(reporte):
+    """Memoria aproximada de un reporte del día (dicts de productos y sus textos)"""
+    total = 2000
+    for producto in reporte['productos']:
+        total += sys.getsizeof(producto) + sum(sys.getsizeof(valor) for valor in producto.values())
+    return total
+
+
+cache_reportes = CacheReportes()
+
+
+# Columnas que admite el índice bitmap -> posición en los grupos del resumen
+# ('hora' solo existe en los grupos de la tabla por hora)
+COLUMNAS_FILTRO = {
+    'categoria': resumenes.CATEGORIA,
+    'metodo_pago': resumenes.METODO,
+    'codigo': resumenes.CODIGO,
+    'hora': resumenes.HORA
+}
+
+
+def bitmap(posiciones, total):
+    """Entero con un bit encendido en cada posición indicada (total = cantidad de bits)"""
+    bits = bytearray((total + 7) // 8)
+    for i in posiciones:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def posiciones_bitmap(mascara):
+    """Posiciones de los bits encendidos, de menor a mayor"""
+    bits = bin(mascara)[:1:-1]  # el bit 0 queda primero
+    i = bits.find('1')
+    while i != -1:
+        yield i
+        i = bits.find('1', i + 1)
+
+
+def agregar_inventario_grupos(grupos):
+    """
+    Inventario vendido a partir de grupos de resumen: O(grupos).
+    Mismo resultado que sobre las filas: nombre y categoría de la última venta,
+    orden por cantidad y, a igual cantidad, por orden de aparición.
+    """
+    inventario = {}
+    primera = {}  # codigo -> posición de su primera venta
+    ultima = {}   # codigo -> posición de su última venta
+    for grupo in grupos:
+        codigo = grupo[resumenes.CODIGO]
+        item = inventario.get(codigo)
+        if item is None:
+            item = inventario[codigo] = {
+                'nombre': '', 'categoria': '', 'cantidad_total': 0,
+                'ingresos_totales': 0.0, 'codigo': codigo
+            }
+            primera[codigo] = grupo[resumenes.PRIMERA]
+            ultima[codigo] = grupo[resumenes.ULTIMA]
+        item['cantidad_total'] += grupo[resumenes.CANTIDAD]
+        item['ingresos_totales'] += grupo[resumenes.INGRESOS]
+        primera[codigo] = min(primera[codigo], grupo[resumenes.PRIMERA])
+        if grupo[resumenes.ULTIMA] >= ultima[codigo]:
+            ultima[codigo] = grupo[resumenes.ULTIMA]
+            item['nombre'] = grupo[resumenes.NOMBRE]
+            item['categoria'] = grupo[resumenes.CATEGORIA]
+    
+    # Ordenar por cantidad (desempate: primera aparición, como en el cálculo por filas)
+    return sorted(inventario.values(), key=lambda x: (-x['cantidad_total'], primera[x['codigo']]))
+
+
+class IndiceVentas:
+    """
+    Índices bitmap de un periodo cargado. Cada grupo del resumen del periodo (producto y
+    método, o también hora en la tabla por hora) es un bit; por cada valor de las
+    columnas indicadas se guarda un entero con los bits de sus grupos, así un filtro es
+    solo & y | de enteros.
+    """
+    
+    def __init__(self, grupos, columnas=tuple(COLUMNAS_FILTRO)):
+        self.grupos = grupos
+        self.todos = (1 << len(grupos)) - 1
+        self.bitmaps = {}  # columna -> {valor: bitmap}
+        for columna in columnas:
+            posicion = COLUMNAS_FILTRO[columna]
+            filas = {}
+            for i, grupo in enumerate(grupos):
+                filas.setdefault(grupo[posicion], []).append(i)
+            self.bitmaps[columna] = {valor: bitmap(lista, len(grupos))
+                                     for valor, lista in filas.items()}
+    
+    def valores(self, columna):
+        """Valores distintos de una columna en el periodo, ordenados"""
+        return sorted(self.bitmaps[columna])
+    
+    def seleccionar(self, columna, valores):
+        """Bitmap de los grupos con alguno de los valores en la columna (OR)"""
+        mascara = 0
+        for valor in valores:
+            mascara |= self.bitmaps[columna].get(valor, 0)
+        return mascara
+    
+    def filtrar(self, *condiciones):
+        """
+        Bitmap de los grupos que cumplen alguna de las condiciones (OR). Cada condición es
+        un dict {columna: valores} y se cumple si todas sus columnas coinciden (AND).
+        Sin condiciones, o con un dict vacío, se seleccionan todos los grupos.
+        """
+        if not condiciones:
+            return self.todos
+        resultado = 0
+        for condicion in condiciones:
+            mascara = self.todos
+            for columna, valores in condicion.items():
+                mascara &= self.seleccionar(columna, valores)
+            resultado |= mascara
+        return resultado
+    
+    def grupos_filtrados(self, *condiciones):
+        """Grupos que cumplen el filtro (ver filtrar), en su orden original"""
+        return [self.grupos[i] for i in posiciones_bitmap(self.filtrar(*condiciones))]
 
 
 class AnalizadorVentas:
     """Analiza las ventas y genera reportes"""
     
-    def __init__(self):
+    def __init__(self, guardar_filas=False):
+        # Los reportes recorren las filas sin guardarlas; con guardar_filas=True
+        # reporte_dia deja además las filas leídas en self.ventas
+        self.guardar_filas = guardar_filas
         self.ventas = []
+        self.rango = None  # (fecha_inicio, fecha_fin) del último cargar_ventas_rango
+        self.plan = None  # periodos que cubren el rango (motor CSV, ver planificar_rango)
+        self.resumenes = None  # resúmenes diarios del rango (motor CSV)
+        self.indice = None  # índice bitmap del periodo (ver indice_ventas)
+        self.periodo = None  # resumen combinado del periodo (ver resumen_periodo)
+        self.indice_horas = None  # índice bitmap con la hora (ver indice_por_hora)
+        self.periodo_horas = None  # tabla por hora del periodo (ver resumen_por_hora)
+    
+    def limpiar_periodo(self):
+        """Descarta las ventas, resúmenes e índices de la carga anterior"""
+        self.ventas = []
+        self.rango = None
+        self.plan = None
+        self.resumenes = None
+        self.indice = None
+        self.periodo = None
+        self.indice_horas = None
+        self.periodo_horas = None
     
     def cargar_ventas_fecha(self, fecha):
         """Carga ventas de una fecha específica (YYYY-MM-DD)"""
-        self.ventas = []
+        self.limpiar_periodo()
         
-        nombre_archivo = os.path.join(RUTA_VENTAS_APP, f'ventas_{fecha}.csv')
-        
-        if not os.path.exists(nombre_archivo):
-            return False
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            self.ventas = obtener_almacenamiento().ventas_fecha(fecha)
+            return len(self.ventas) > 0
         
         try:
-            with open(nombre_archivo, 'r', encoding='utf-8') as f:
-                lector = csv.DictReader(f)
-                for venta in lector:
-                    # Convertir valores numéricos
-                    venta['cantidad'] = int(venta['cantidad'])
-                    venta['precio_unitario'] = float(venta['precio_unitario'])
-                    venta['subtotal'] = float(venta['subtotal'])
-                    self.ventas.append(venta)
+            self.ventas = list(leer_filas(fecha))
+        except FileNotFoundError:
+            return False
         except Exception as e:
             print(f"Error al leer archivo: {e}")
             return False
@@ -40,11 +467,13 @@ class AnalizadorVentas:
         return len(self.ventas) > 0
     
     def cargar_ventas_rango(self, fecha_inicio, fecha_fin):
-        """Carga todas las ventas dentro de un rango de fechas"""
-        self.ventas = []
-        
-        if not os.path.exists(RUTA_VENTAS_APP):
-            return False
+        """
+        Carga todas las ventas dentro de un rango de fechas.
+        No se leen filas: con CSV se cargan los resúmenes de años, meses y días que
+        cubren el rango (ver planificar_rango) y con SQLite solo se recuerda el rango
+        para agregar en SQL.
+        """
+        self.limpiar_periodo()
         
         # Convertir strings a datetime
         try:
@@ -53,151 +482,269 @@ class AnalizadorVentas:
         except ValueError:
             return False
         
-        # Recorrer cada día en el rango
-        fecha_actual = inicio
-        while fecha_actual <= fin:
-            fecha_str = fecha_actual.strftime('%Y-%m-%d')
-            archivo = os.path.join(RUTA_VENTAS_APP, f'ventas_{fecha_str}.csv')
-            
-            if os.path.exists(archivo):
-                try:
-                    with open(archivo, 'r', encoding='utf-8') as f:
-                        lector = csv.DictReader(f)
-                        for venta in lector:
-                            # Convertir valores numéricos
-                            venta['cantidad'] = int(venta['cantidad'])
-                            venta['precio_unitario'] = float(venta['precio_unitario'])
-                            venta['subtotal'] = float(venta['subtotal'])
-                            self.ventas.append(venta)
-                except Exception as e:
-                    print(f"Error al leer {archivo}: {e}")
-            
-            fecha_actual += timedelta(days=1)
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            self.rango = (fecha_inicio, fecha_fin)
+            return obtener_almacenamiento().hay_ventas(fecha_inicio, fecha_fin)
         
-        return len(self.ventas) > 0
+        if not os.path.exists(RUTA_VENTAS_APP):
+            return False
+        
+        # Los días sin archivo se descartan con el índice de la carpeta (sin stat por día)
+        disponibles = set(resumenes.fechas_en_rango(fecha_inicio, fecha_fin, RUTA_VENTAS_APP))
+        plan = [periodo for periodo in self.planificar_rango(inicio, fin)
+                if len(periodo) != 10 or periodo in disponibles]
+        
+        self.rango = (fecha_inicio, fecha_fin)
+        self.plan = plan
+        self.resumenes = self.cargar_piezas(resumenes.TABLA_RESUMEN)
+        return len(self.resumenes) > 0
+    
+    def cargar_piezas(self, tabla):
+        """
+        Resúmenes de una tabla para cada periodo del plan cargado
+        Returns: lista de (resumen, fecha) con fecha None si es acumulado
+        """
+        # Los resúmenes diarios que falten se calculan primero, en paralelo si son muchos
+        # (primer uso o historial editado); el resto ya queda leído en vigentes
+        try:
+            vigentes, faltan = resumenes.revisar_periodos(self.plan, RUTA_VENTAS_APP,
+                                                          RUTA_RESUMENES, tabla)
+            vigentes.update(resumenes.calcular_en_paralelo(faltan, RUTA_VENTAS_APP,
+                                                           RUTA_RESUMENES, tabla=tabla))
+        except Exception as e:
+            print(f"Error al preparar resúmenes: {e}")
+            vigentes = {}
+        
+        piezas = []
+        for periodo in self.plan:
+            try:
+                if len(periodo) == 10:
+                    resumen = resumenes.obtener_resumen(periodo, RUTA_VENTAS_APP,
+                                                        RUTA_RESUMENES, vigentes, tabla)
+                    pieza = (resumen, periodo)
+                else:
+                    resumen = resumenes.obtener_acumulado(periodo, RUTA_VENTAS_APP,
+                                                          RUTA_RESUMENES, vigentes, tabla)
+                    pieza = (resumen, None)
+                if resumen and resumen['filas']:
+                    piezas.append(pieza)
+            except Exception as e:
+                print(f"Error al leer ventas de {periodo}: {e}")
+        return piezas
+    
+    def planificar_rango(self, inicio, fin):
+        """
+        Cubre [inicio, fin] con los periodos más grandes que entren completos:
+        años ('YYYY'), luego meses ('YYYY-MM') y días sueltos en los bordes.
+        Returns: lista de periodos en orden cronológico
+        """
+        plan = []
+        fecha = inicio
+        while fecha <= fin:
+            fin_mes = fecha.replace(day=calendar.monthrange(fecha.year, fecha.month)[1])
+            if fecha.month == 1 and fecha.day == 1 and fecha.replace(month=12, day=31) <= fin:
+                plan.append(fecha.strftime('%Y'))
+                fecha = fecha.replace(year=fecha.year + 1)
+            elif fecha.day == 1 and fin_mes <= fin:
+                plan.append(fecha.strftime('%Y-%m'))
+                fecha = fin_mes + timedelta(days=1)
+            else:
+                plan.append(fecha.strftime('%Y-%m-%d'))
+                fecha += timedelta(days=1)
+        return plan
     
     def inventario_vendido(self, categoria=None, codigo_producto=None):
         """
         Retorna inventario vendido con opciones de filtrado
         Returns: dict con productos y sus cantidades vendidas
         """
-        inventario = defaultdict(lambda: {
-            'nombre': '',
-            'categoria': '',
-            'cantidad_total': 0,
-            'ingresos_totales': 0.0,
-            'codigo': ''
-        })
+        if MOTOR_ALMACENAMIENTO == 'sqlite' and self.rango:
+            return obtener_almacenamiento().inventario_vendido(
+                self.rango[0], self.rango[1], categoria, codigo_producto)
+        if self.resumenes is not None:
+            return self.inventario_desde_resumenes(categoria, codigo_producto)
         
-        for venta in self.ventas:
-            codigo = venta['codigo']
-            
-            # Aplicar filtros
-            if categoria and venta['categoria'] != categoria:
-                continue
-            if codigo_producto and codigo != codigo_producto:
-                continue
-            
-            inventario[codigo]['nombre'] = venta['nombre']
-            inventario[codigo]['categoria'] = venta['categoria']
-            inventario[codigo]['codigo'] = codigo
-            inventario[codigo]['cantidad_total'] += venta['cantidad']
-            inventario[codigo]['ingresos_totales'] += venta['subtotal']
-        
-        # Convertir a lista ordenada por cantidad
-        resultado = sorted(inventario.values(), 
-                          key=lambda x: x['cantidad_total'], 
-                          reverse=True)
-        return resultado
+        return agregar_inventario(filtrar_ventas(self.ventas, categoria, codigo_producto))
+    
+    def inventario_desde_resumenes(self, categoria=None, codigo_producto=None):
+        """inventario_vendido con los filtros simples, resuelto con el índice del periodo"""
+        condicion = {}
+        if categoria:
+            condicion['categoria'] = [categoria]
+        if codigo_producto:
+            condicion['codigo'] = [codigo_producto]
+        return self.consultar(condicion)
+    
+    def consultar(self, *condiciones):
+        """
+        Inventario vendido del periodo cargado con filtros combinados, sin releer archivos.
+        condiciones: dicts {columna: valores} con columnas de COLUMNAS_FILTRO (hora: 0-23);
+        dentro de un dict las columnas se combinan con AND y los valores con OR, y los
+        dicts entre sí con OR. Ej.: {'categoria': ['Bebidas'], 'hora': range(18, 22)}
+        Solo si alguna condición filtra por hora se usa la tabla por hora (más grupos).
+        """
+        if any('hora' in condicion for condicion in condiciones):
+            indice = self.indice_por_hora()
+        else:
+            indice = self.indice_ventas()
+        return agregar_inventario_grupos(indice.grupos_filtrados(*condiciones))
+    
+    def indice_ventas(self):
+        """Índice bitmap del periodo cargado, sin la hora (se arma en la primera consulta)"""
+        if self.indice is None:
+            columnas = [columna for columna in COLUMNAS_FILTRO if columna != 'hora']
+            self.indice = IndiceVentas(self.grupos_periodo(), columnas)
+        return self.indice
+    
+    def indice_por_hora(self):
+        """Índice bitmap del periodo cargado con la hora (se arma al primer filtro por hora)"""
+        if self.indice_horas is None:
+            self.indice_horas = IndiceVentas(self.resumen_por_hora()['grupos'])
+        return self.indice_horas
+    
+    def grupos_periodo(self):
+        """Grupos (producto y método) del periodo cargado, con el formato de resumenes"""
+        return self.resumen_periodo()['grupos']
+    
+    def resumen_periodo(self):
+        """
+        Resumen combinado del periodo cargado (grupos y tabla 'horas', ver resumenes.acumular).
+        Se arma una vez por carga.
+        """
+        if self.periodo is None:
+            if MOTOR_ALMACENAMIENTO == 'sqlite' and self.rango:
+                almacen = obtener_almacenamiento()
+                self.periodo = {'grupos': almacen.grupos_ventas(self.rango[0], self.rango[1]),
+                                'horas': almacen.horas_ventas(self.rango[0], self.rango[1])}
+            elif self.resumenes is not None:
+                self.periodo = resumenes.combinar(self.resumenes)
+            else:
+                self.periodo = resumenes.acumular(resumenes.nuevo_resumen(), self.ventas)
+        return self.periodo
+    
+    def resumen_por_hora(self):
+        """
+        Tabla por hora combinada del periodo cargado (grupos con la hora al final, ver
+        resumenes.acumular). Se lee solo cuando hace falta y una vez por carga.
+        """
+        if self.periodo_horas is None:
+            if MOTOR_ALMACENAMIENTO == 'sqlite' and self.rango:
+                self.periodo_horas = {'grupos': obtener_almacenamiento().grupos_ventas(
+                    self.rango[0], self.rango[1], por_hora=True)}
+            elif self.plan is not None:
+                self.periodo_horas = resumenes.combinar(self.cargar_piezas(resumenes.TABLA_HORAS))
+            else:
+                self.periodo_horas = resumenes.nuevo_resumen()
+                resumenes.acumular(resumenes.nuevo_resumen(), self.ventas, self.periodo_horas)
+        return self.periodo_horas
+    
+    def dias_por_semana(self):
+        """Cuántos días con ventas tiene el periodo de cada día de la semana (0 = lunes)"""
+        if self.rango is None:
+            fechas = {venta['fecha'] for venta in self.ventas}
+        elif MOTOR_ALMACENAMIENTO == 'sqlite':
+            fechas = obtener_almacenamiento().fechas_con_ventas(self.rango[0], self.rango[1])
+        else:
+            fechas = resumenes.fechas_en_rango(self.rango[0], self.rango[1], RUTA_VENTAS_APP)
+        
+        dias = [0] * 7
+        for fecha in fechas:
+            dias[datetime.strptime(fecha, '%Y-%m-%d').weekday()] += 1
+        return dias
+    
+    def mapa_semana(self, medida='cantidad', promedio=False):
+        """
+        Mapa de calor día de la semana × hora del periodo cargado
+        medida: 'cantidad' (unidades) o 'ingresos'. promedio: dividir por la cantidad de
+        días de cada día de la semana (ej. unidades de un lunes típico a cada hora)
+        Returns: mapa[dia][hora], 7 × 24, con dia 0 = lunes
+        """
+        posicion = resumenes.HORAS_CANTIDAD if medida == 'cantidad' else resumenes.HORAS_INGRESOS
+        mapa = [[0] * 24 for _ in range(7)]
+        for entrada in self.resumen_periodo()['horas']:
+            mapa[entrada[resumenes.DIA_SEMANA]][entrada[resumenes.HORA_DIA]] += entrada[posicion]
+        
+        if promedio:
+            for dia, cantidad_dias in enumerate(self.dias_por_semana()):
+                if cantidad_dias:
+                    mapa[dia] = [valor / cantidad_dias for valor in mapa[dia]]
+        return mapa
+    
+    def mapa_productos(self, medida='cantidad', limite=20):
+        """
+        Mapa de calor producto × hora del periodo cargado
+        medida: 'cantidad' (unidades) o 'ingresos'
+        Returns: lista de {'codigo', 'nombre', 'horas' (24 valores), 'total'} con los
+        `limite` productos de mayor total, de mayor a menor
+        """
+        posicion = resumenes.CANTIDAD if medida == 'cantidad' else resumenes.INGRESOS
+        productos = {}
+        ultima = {}  # codigo -> posición de su última venta (para tomar el nombre vigente)
+        for grupo in self.resumen_por_hora()['grupos']:
+            codigo = grupo[resumenes.CODIGO]
+            item = productos.get(codigo)
+            if item is None:
+                item = productos[codigo] = {'codigo': codigo, 'nombre': grupo[resumenes.NOMBRE],
+                                            'horas': [0] * 24, 'total': 0}
+                ultima[codigo] = grupo[resumenes.ULTIMA]
+            item['horas'][grupo[resumenes.HORA]] += grupo[posicion]
+            item['total'] += grupo[posicion]
+            if grupo[resumenes.ULTIMA] >= ultima[codigo]:
+                ultima[codigo] = grupo[resumenes.ULTIMA]
+                item['nombre'] = grupo[resumenes.NOMBRE]
+        
+        return sorted(productos.values(), key=lambda x: x['total'], reverse=True)[:limite]
     
     def reporte_dia(self, fecha=None):
         """
         Genera reporte de un día específico con desglose por producto y método de pago
-        Si fecha es None, usa el día actual
+        Si fecha es None, usa el día actual. Los reportes se guardan en cache_reportes:
+        el dict retornado se comparte y no se debe modificar.
         Returns: dict con productos AGRUPADOS, totales por método y total general
         """
         if fecha is None:
             fecha = datetime.now().strftime('%Y-%m-%d')
+        if self.guardar_filas:
+            return self.calcular_reporte_dia(fecha)
         
-        # Cargar solo ventas de la fecha especificada
-        if not self.cargar_ventas_fecha(fecha):
-            return None
+        # Reutilizar el reporte si el CSV no cambió desde que se calculó
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            firma = None
+        else:
+            try:
+                firma = resumenes.firma_archivo(resumenes.ruta_ventas_dia(fecha, RUTA_VENTAS_APP))
+            except OSError:
+                return None
         
-        # Agrupar ventas por producto y método de pago
-        productos_agrupados = defaultdict(lambda: {
-            'cantidad_total': 0,
-            'precio_unitario': 0.0,
-            'subtotal_total': 0.0,
-            'desglose_metodos': defaultdict(lambda: {'cantidad': 0, 'subtotal': 0.0})
-        })
-        
-        for venta in self.ventas:
-            codigo = venta['codigo']
-            nombre = venta['nombre']
-            metodo = venta['metodo_pago']
-            key = f"{codigo}|{nombre}"  # Clave única por producto
-            
-            # Acumular totales por producto
-            productos_agrupados[key]['cantidad_total'] += venta['cantidad']
-            productos_agrupados[key]['precio_unitario'] = venta['precio_unitario']
-            productos_agrupados[key]['subtotal_total'] += venta['subtotal']
-            
-            # Acumular por método de pago
-            productos_agrupados[key]['desglose_metodos'][metodo]['cantidad'] += venta['cantidad']
-            productos_agrupados[key]['desglose_metodos'][metodo]['subtotal'] += venta['subtotal']
-        
-        # Convertir a lista para la interfaz
-        productos_vendidos = []
-        for key, datos in productos_agrupados.items():
-            codigo, nombre = key.split('|', 1)
-            
-            # Crear string de métodos de pago
-            metodos_str = []
-            for metodo_cod, metodo_datos in datos['desglose_metodos'].items():
-                metodo_nombre = METODOS_PAGO.get(metodo_cod, 'Desconocido')
-                metodos_str.append(f"{metodo_nombre} ({metodo_datos['cantidad']})")
-            
-            productos_vendidos.append({
-                'codigo': codigo,
-                'nombre': nombre,
-                'cantidad': datos['cantidad_total'],
-                'precio_unitario': datos['precio_unitario'],
-                'subtotal': datos['subtotal_total'],
-                'metodos_pago': ', '.join(metodos_str)
-            })
-        
-        # Ordenar por nombre
-        productos_vendidos.sort(key=lambda x: x['nombre'])
-        
-        # Calcular totales por método de pago
-        totales_metodos = {
-            'Efectivo': 0.0,
-            'Yape': 0.0,
-            'Plin': 0.0,
-            'Otros': 0.0
-        }
+        reporte = cache_reportes.obtener(fecha, firma)
+        if reporte is None:
+            reporte = self.calcular_reporte_dia(fecha)
+            if reporte is not None:
+                cache_reportes.guardar(fecha, firma, reporte)
+        return reporte
+    
+    def calcular_reporte_dia(self, fecha):
+        """Calcula el reporte del día leyendo las ventas (ver reporte_dia)"""
+        # Leer, agrupar y totalizar en una sola pasada (sin guardar las filas)
+        try:
+            if self.guardar_filas:
+                acumulado = agregar_reporte_dia(self.conservar_filas(leer_filas(fecha)))
+            else:
+                acumulado = acumular_dia(fecha)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error al leer archivo: {e}")
+            return None
         
-        for venta in self.ventas:
-            metodo_nombre = METODOS_PAGO.get(venta['metodo_pago'], 'Otros')
-            totales_metodos[metodo_nombre] += venta['subtotal']
-        
-        # Total general
-        total_general = sum(totales_metodos.values())
-        
-        # Calcular porcentajes
-        porcentajes = {}
-        for metodo, total in totales_metodos.items():
-            porcentaje = (total / total_general * 100) if total_general > 0 else 0
-            porcentajes[metodo] = porcentaje
-        
-        return {
-            'fecha': fecha,
-            'productos': productos_vendidos,
-            'totales_metodos': totales_metodos,
-            'porcentajes': porcentajes,
-            'total_general': total_general,
-            'cantidad_ventas': len(self.ventas)
-        }
+        return armar_reporte_dia(fecha, acumulado)
+    
+    def conservar_filas(self, filas):
+        """Deja en self.ventas una copia de cada fila a medida que pasa (opcional)"""
+        self.ventas = []
+        for venta in filas:
+            self.ventas.append(venta)
+            yield venta
 
 
 class ExportadorReportes:
@@ -0,0 +1,392 @@
+"""
+Resúmenes diarios del Sistema de Bazar
+Junto a cada ventas_YYYY-MM-DD.csv se guarda un resumen precalculado (por producto y
+método de pago: cantidad e ingresos) para que los reportes por rango no relean cada fila.
+Los resúmenes se acumulan además por mes (YYYY-MM) y por año (YYYY).
+El desglose por hora del día va en una tabla aparte (por_hora_*.json), que solo se lee
+para los filtros y mapas por hora.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import threading
+import columnar
+import motor_numpy
+from archivos_ventas import ruta_ventas_dia, fechas_disponibles, fechas_en_rango, firma_archivo
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from config import RUTA_RESUMENES, PROCESOS_LECTURA, MIN_DIAS_PARALELO, DIAS_POR_TANDA
+
+# Posiciones dentro de cada grupo del resumen (la clave son los campos antes de CANTIDAD
+# y, en la tabla por hora, HORA al final: ver clave_grupo)
+CODIGO, NOMBRE, CATEGORIA, METODO, CANTIDAD, INGRESOS, PRIMERA, ULTIMA, HORA = range(9)
+# Posiciones dentro de cada entrada de 'horas' (la clave es día de la semana y hora)
+DIA_SEMANA, HORA_DIA, HORAS_CANTIDAD, HORAS_INGRESOS = range(4)
+# Formato del resumen: uno guardado con otra versión se rehace
+VERSION_RESUMEN = 1
+
+# Tablas de resúmenes: grupos sin hora (reportes) y grupos por hora (filtros por hora)
+TABLA_RESUMEN = 'resumen'
+TABLA_HORAS = 'por_hora'
+TABLAS = (TABLA_RESUMEN, TABLA_HORAS)
+
+
+def ruta_resumen(fecha, ruta_resumenes=None, tabla=TABLA_RESUMEN):
+    """Ruta del resumen de una fecha (o de un mes YYYY-MM / año YYYY) en una tabla"""
+    return os.path.join(ruta_resumenes or RUTA_RESUMENES, f'{tabla}_{fecha}.json')
+
+
+def nuevo_resumen():
+    """Resumen vacío"""
+    return {'version': VERSION_RESUMEN, 'firma': None, 'filas': 0, 'grupos': [], 'horas': []}
+
+
+def clave_grupo(grupo):
+    """Clave de un grupo: producto y método, más la hora en la tabla por hora"""
+    return (*grupo[:CANTIDAD], *grupo[HORA:])
+
+
+def sumar_a_grupo(grupos, indices, clave, cantidad, subtotal, fila):
+    """Suma una venta al grupo de su clave (lo crea al final si no existe)"""
+    grupo = indices.get(clave)
+    if grupo is None:
+        grupo = indices[clave] = [*clave[:CANTIDAD], 0, 0.0, fila, fila, *clave[CANTIDAD:]]
+        grupos.append(grupo)
+    grupo[CANTIDAD] += cantidad
+    grupo[INGRESOS] += subtotal
+    grupo[ULTIMA] = fila
+
+
+def acumular(resumen, ventas, por_hora=None):
+    """
+    Suma ventas (dicts con los valores del CSV) al resumen y, si se pasa, a su tabla
+    por hora (otro resumen, con las mismas filas).
+    Cada grupo es [codigo, nombre, categoria, metodo, cantidad, ingresos, primera, ultima],
+    con primera/ultima los números de fila (para conservar el orden de aparición); en la
+    tabla por hora lleva además al final la hora del día (0-23).
+    Cada entrada de 'horas' es [dia de la semana (0 = lunes), hora, cantidad, ingresos].
+    """
+    indices = {clave_grupo(g): g for g in resumen['grupos']}
+    if por_hora is not None:
+        indices_hora = {clave_grupo(g): g for g in por_hora['grupos']}
+    horas = {tuple(h[:HORAS_CANTIDAD]): h for h in resumen['horas']}
+    dias_semana = {}
+
+    fila = resumen['filas']
+    for venta in ventas:
+        hora = int(venta['hora'].split(':', 1)[0])
+        clave = (venta['codigo'], venta['nombre'], venta['categoria'], venta['metodo_pago'])
+        cantidad = int(venta['cantidad'])
+        subtotal = float(venta['subtotal'])
+        sumar_a_grupo(resumen['grupos'], indices, clave, cantidad, subtotal, fila)
+        if por_hora is not None:
+            sumar_a_grupo(por_hora['grupos'], indices_hora, (*clave, hora), cantidad, subtotal, fila)
+        fila += 1
+
+        dia = dias_semana.get(venta['fecha'])
+        if dia is None:
+            dia = dias_semana[venta['fecha']] = date.fromisoformat(venta['fecha']).weekday()
+        entrada = horas.get((dia, hora))
+        if entrada is None:
+            entrada = horas[(dia, hora)] = [dia, hora, 0, 0.0]
+            resumen['horas'].append(entrada)
+        entrada[HORAS_CANTIDAD] += cantidad
+        entrada[HORAS_INGRESOS] += subtotal
+    resumen['filas'] = fila
+    if por_hora is not None:
+        por_hora['filas'] = fila
+    return resumen
+
+
+def calcular_tablas(fecha, ruta_ventas=None, con_numpy=None):
+    """
+    Arma el resumen y la tabla por hora recorriendo las ventas del día una sola vez
+    (del archivo columnar si está al día con el CSV, si no del CSV; los días
+    columnares se suman con NumPy si está instalado y conviene)
+    con_numpy: motor ya decidido para todo el rango (None = según las ventas del día)
+    Returns: {tabla: resumen}
+    """
+    resumen, por_hora = nuevo_resumen(), nuevo_resumen()
+    ruta_csv = ruta_ventas_dia(fecha, ruta_ventas)
+    firma = firma_archivo(ruta_csv)
+    archivo = columnar.abrir_dia(fecha, ruta_ventas, firma)
+    if archivo is not None:
+        with archivo:
+            if motor_numpy.conviene(archivo.filas) if con_numpy is None else con_numpy:
+                motor_numpy.resumen_dia(archivo, resumen, por_hora)
+            else:
+                acumular(resumen, archivo.filas_dict(), por_hora)
+    else:
+        with open(ruta_csv, 'r', encoding='utf-8') as f:
+            acumular(resumen, csv.DictReader(f), por_hora)
+    resumen['firma'] = por_hora['firma'] = firma
+    return {TABLA_RESUMEN: resumen, TABLA_HORAS: por_hora}
+
+
+def calcular_resumen(fecha, ruta_ventas=None, tabla=TABLA_RESUMEN):
+    """Arma el resumen de un día en una tabla (ver calcular_tablas)"""
+    return calcular_tablas(fecha, ruta_ventas)[tabla]
+
+
+def leer_resumen(fecha, ruta_resumenes=None, tabla=TABLA_RESUMEN):
+    """Lee el resumen guardado de una fecha (None si no existe o está dañado)"""
+    try:
+        with open(ruta_resumen(fecha, ruta_resumenes, tabla), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def guardar_resumen(fecha, resumen, ruta_resumenes=None, tabla=TABLA_RESUMEN):
+    """Guarda el resumen de forma atómica (temporal propio de cada hilo + renombrar)"""
+    ruta = ruta_resumen(fecha, ruta_resumenes, tabla)
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporal, ruta)
+
+
+def guardar_tablas(fecha, tablas, ruta_resumenes=None):
+    """Guarda las tablas de un día ({tabla: resumen}); si falla solo se informa"""
+    for tabla, resumen in tablas.items():
+        try:
+            guardar_resumen(fecha, resumen, ruta_resumenes, tabla)
+        except OSError as e:
+            print(f"Error al guardar resumen de {fecha}: {e}")
+
+
+def resumen_vigente(periodo, firma, ruta_resumenes=None, tabla=TABLA_RESUMEN):
+    """Resumen guardado del periodo si su firma coincide; None si falta o está desactualizado"""
+    resumen = leer_resumen(periodo, ruta_resumenes, tabla)
+    if resumen is not None and resumen.get('version') == VERSION_RESUMEN and resumen.get('firma') == firma:
+        return resumen
+    return None
+
+
+def obtener_resumen(fecha, ruta_ventas=None, ruta_resumenes=None, memo=None, tabla=TABLA_RESUMEN):
+    """
+    Retorna el resumen de una fecha, rehaciéndolo si el CSV cambió desde que se guardó
+    (al rehacerlo se guardan las dos tablas, que salen de la misma pasada).
+    memo: {periodo: resumen} ya vigentes (ver revisar_periodos), para no volver a leerlos
+    Returns: dict o None si ese día no tiene ventas
+    """
+    if memo and fecha in memo:
+        return memo[fecha]
+    
+    ruta_csv = ruta_ventas_dia(fecha, ruta_ventas)
+    try:
+        firma = firma_archivo(ruta_csv)
+    except OSError:
+        return None
+
+    resumen = resumen_vigente(fecha, firma, ruta_resumenes, tabla)
+    if resumen is not None:
+        return resumen
+
+    tablas = calcular_tablas(fecha, ruta_ventas)
+    guardar_tablas(fecha, tablas, ruta_resumenes)
+    return tablas[tabla]
+
+
+def calcular_resumenes(fechas, ruta_ventas=None, ruta_resumenes=None, tabla=TABLA_RESUMEN,
+                       con_numpy=None):
+    """
+    Calcula y guarda los resúmenes (las dos tablas) de varias fechas: una tanda de un
+    proceso del pool. Al proceso principal solo vuelven los resúmenes de la tabla pedida.
+    con_numpy: motor decidido para todo el rango (None = según el total de estas fechas)
+    Returns: {fecha: resumen}
+    """
+    if con_numpy is None:
+        con_numpy = motor_numpy.conviene_rango(fechas, ruta_ventas)
+    calculados = {}
+    for fecha in fechas:
+        try:
+            tablas = calcular_tablas(fecha, ruta_ventas, con_numpy)
+        except OSError:
+            continue  # el día se borró mientras tanto
+        guardar_tablas(fecha, tablas, ruta_resumenes)
+        calculados[fecha] = tablas[tabla]
+    return calculados
+
+
+def calcular_en_paralelo(fechas, ruta_ventas=None, ruta_resumenes=None, procesos=None,
+                         tabla=TABLA_RESUMEN):
+    """
+    Calcula los resúmenes de muchas fechas repartiéndolas en tandas entre procesos.
+    Con menos de MIN_DIAS_PARALELO fechas (o un solo núcleo) los calcula aquí mismo:
+    arrancar los procesos cuesta más que leer unos pocos días.
+    Returns: {fecha: resumen} de la tabla pedida
+    """
+    procesos = procesos or PROCESOS_LECTURA or os.cpu_count() or 1
+    # El motor se decide una vez con el total del rango, no por tanda
+    con_numpy = motor_numpy.conviene_rango(fechas, ruta_ventas)
+    if len(fechas) < MIN_DIAS_PARALELO or procesos < 2:
+        return calcular_resumenes(fechas, ruta_ventas, ruta_resumenes, tabla, con_numpy)
+    
+    tandas = [fechas[i:i + DIAS_POR_TANDA] for i in range(0, len(fechas), DIAS_POR_TANDA)]
+    calculados = {}
+    # 'spawn' para no copiar los hilos (Tk, escritor) al proceso hijo
+    with ProcessPoolExecutor(max_workers=min(procesos, len(tandas)),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        for parcial in pool.map(calcular_resumenes, tandas, repeat(ruta_ventas),
+                                repeat(ruta_resumenes), repeat(tabla), repeat(con_numpy)):
+            calculados.update(parcial)
+    return calculados
+
+
+def actualizar_resumen(fecha, ventas, firma_anterior, ruta_ventas=None, ruta_resumenes=None):
+    """
+    Suma a las dos tablas del día las ventas recién agregadas al CSV (al cerrar caja),
+    sin releerlo. firma_anterior es la firma del CSV antes de agregar; si alguna tabla
+    no correspondía a ella, se rehacen completas.
+    Returns: el resumen (tabla sin hora)
+    """
+    if firma_anterior is None:
+        tablas = {tabla: nuevo_resumen() for tabla in TABLAS}
+    else:
+        tablas = {tabla: resumen_vigente(fecha, firma_anterior, ruta_resumenes, tabla)
+                  for tabla in TABLAS}
+        if None in tablas.values():
+            return obtener_resumen(fecha, ruta_ventas, ruta_resumenes)
+
+    resumen = tablas[TABLA_RESUMEN]
+    acumular(resumen, ventas, tablas[TABLA_HORAS])
+    firma = firma_archivo(ruta_ventas_dia(fecha, ruta_ventas))
+    for tabla in TABLAS:
+        tablas[tabla]['firma'] = firma
+        guardar_resumen(fecha, tablas[tabla], ruta_resumenes, tabla)
+    return resumen
+
+
+def fechas_periodo(periodo, ruta_ventas=None):
+    """Fechas con ventas de un mes 'YYYY-MM' o de un año 'YYYY'"""
+    if len(periodo) == 4:
+        return fechas_en_rango(f"{periodo}-01-01", f"{periodo}-12-31", ruta_ventas)
+    return fechas_en_rango(f"{periodo}-01", f"{periodo}-31", ruta_ventas)
+
+
+def firmas_periodo(periodo, ruta_ventas=None):
+    """Firma de cada CSV de ventas del periodo: {fecha: [mtime_ns, tamaño]}"""
+    firmas = {}
+    for fecha in fechas_periodo(periodo, ruta_ventas):
+        try:
+            firmas[fecha] = firma_archivo(ruta_ventas_dia(fecha, ruta_ventas))
+        except OSError:
+            pass
+    return firmas
+
+
+def combinar(piezas):
+    """
+    Junta resúmenes en uno acumulado. piezas: (resumen, fecha) en orden cronológico,
+    con fecha None si el resumen ya es acumulado. En el acumulado primera/ultima
+    son [fecha, fila] para poder seguir ordenando por aparición entre días.
+    """
+    acumulado = nuevo_resumen()
+    indices = {}
+    horas = {}
+    for resumen, fecha in piezas:
+        acumulado['filas'] += resumen['filas']
+        for entrada in resumen['horas']:
+            clave = tuple(entrada[:HORAS_CANTIDAD])
+            suma = horas.get(clave)
+            if suma is None:
+                suma = horas[clave] = [*clave, 0, 0.0]
+                acumulado['horas'].append(suma)
+            suma[HORAS_CANTIDAD] += entrada[HORAS_CANTIDAD]
+            suma[HORAS_INGRESOS] += entrada[HORAS_INGRESOS]
+        for grupo in resumen['grupos']:
+            if fecha is None:
+                primera, ultima = grupo[PRIMERA], grupo[ULTIMA]
+            else:
+                primera, ultima = [fecha, grupo[PRIMERA]], [fecha, grupo[ULTIMA]]
+            
+            clave = clave_grupo(grupo)
+            suma = indices.get(clave)
+            if suma is None:
+                suma = [*grupo[:CANTIDAD], 0, 0.0, primera, ultima, *grupo[HORA:]]
+                indices[clave] = suma
+                acumulado['grupos'].append(suma)
+            suma[CANTIDAD] += grupo[CANTIDAD]
+            suma[INGRESOS] += grupo[INGRESOS]
+            suma[PRIMERA] = min(suma[PRIMERA], primera)
+            suma[ULTIMA] = max(suma[ULTIMA], ultima)
+    return acumulado
+
+
+def meses_del_anio(anio):
+    """Periodos 'YYYY-MM' de un año"""
+    return [f"{anio}-{mes:02d}" for mes in range(1, 13)]
+
+
+def obtener_acumulado(periodo, ruta_ventas=None, ruta_resumenes=None, memo=None,
+                      tabla=TABLA_RESUMEN):
+    """
+    Retorna el resumen acumulado de un mes ('YYYY-MM') o un año ('YYYY') en una tabla.
+    Guarda la firma de cada día: si un CSV del periodo cambió, apareció o se borró,
+    se rehace (el año a partir de sus meses, el mes a partir de sus días).
+    Returns: dict o None si el periodo no tiene ventas
+    """
+    if memo and periodo in memo:
+        return memo[periodo]
+    
+    firmas = firmas_periodo(periodo, ruta_ventas)
+    if not firmas:
+        return None
+    
+    acumulado = resumen_vigente(periodo, firmas, ruta_resumenes, tabla)
+    if acumulado is not None:
+        return acumulado
+    
+    if len(periodo) == 4:
+        piezas = ((obtener_acumulado(mes, ruta_ventas, ruta_resumenes, memo, tabla), None)
+                  for mes in meses_del_anio(periodo))
+    else:
+        piezas = ((obtener_resumen(fecha, ruta_ventas, ruta_resumenes, memo, tabla), fecha)
+                  for fecha in sorted(firmas))
+    acumulado = combinar((resumen, fecha) for resumen, fecha in piezas if resumen)
+    acumulado['firma'] = firmas
+    try:
+        guardar_resumen(periodo, acumulado, ruta_resumenes, tabla)
+    except OSError as e:
+        print(f"Error al guardar resumen de {periodo}: {e}")
+    return acumulado
+
+
+def revisar_periodos(periodos, ruta_ventas=None, ruta_resumenes=None, tabla=TABLA_RESUMEN):
+    """
+    Lee los resúmenes vigentes de los periodos (en una tabla) sin calcular nada: si un
+    acumulado está desactualizado baja a sus meses y días.
+    Returns: (vigentes {periodo: resumen}, fechas cuyo resumen diario hay que calcular)
+    """
+    vigentes = {}
+    faltan = []
+    
+    def revisar(periodo):
+        if len(periodo) == 10:
+            try:
+                firma = firma_archivo(ruta_ventas_dia(periodo, ruta_ventas))
+            except OSError:
+                return
+        else:
+            firma = firmas_periodo(periodo, ruta_ventas)
+            if not firma:
+                return
+        
+        resumen = resumen_vigente(periodo, firma, ruta_resumenes, tabla)
+        if resumen is not None:
+            vigentes[periodo] = resumen
+        elif len(periodo) == 10:
+            faltan.append(periodo)
+        elif len(periodo) == 4:
+            for mes in meses_del_anio(periodo):
+                revisar(mes)
+        else:
+            for fecha in sorted(firma):
+                revisar(fecha)
+    
+    for periodo in periodos:
+        revisar(periodo)
+    return vigentes, faltan
@@ -0,0 +1,79 @@
+"""
+Pruebas del archivo columnar de ventas
+Un día convertido tiene que leerse igual que su CSV, y la copia se ignora si el CSV cambió
+"""
+import csv
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columnar
+import reportes
+
+ENCABEZADO = ['fecha', 'hora', 'codigo', 'nombre', 'cantidad', 'precio_unitario',
+              'subtotal', 'metodo_pago', 'categoria']
+
+
+class PruebaColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.originales = (reportes.RUTA_VENTAS_APP, reportes.MOTOR_ALMACENAMIENTO)
+        reportes.RUTA_VENTAS_APP = self.carpeta.name
+        reportes.MOTOR_ALMACENAMIENTO = 'csv'
+
+    def tearDown(self):
+        reportes.RUTA_VENTAS_APP, reportes.MOTOR_ALMACENAMIENTO = self.originales
+        self.carpeta.cleanup()
+
+    def escribir_dia(self, fecha, filas, modo='w'):
+        with open(os.path.join(self.carpeta.name, f'ventas_{fecha}.csv'), modo,
+                  newline='', encoding='utf-8') as f:
+            escritor = csv.writer(f)
+            if modo == 'w':
+                escritor.writerow(ENCABEZADO)
+            escritor.writerows(filas)
+
+    def ventas_del_dia(self, fecha, cantidad=50):
+        return [[fecha, f'{9 + i // 10:02d}:{i % 60:02d}:{i * 7 % 60:02d}', f'P{i % 7}',
+                 f'Producto {i % 7} ñandú', i % 5 + 1, f'{1.05 + i % 7:.2f}',
+                 f'{(1.05 + i % 7) * (i % 5 + 1):.2f}', 'EY'[i % 2], f'Categoría {i % 3}']
+                for i in range(cantidad)]
+
+    def test_ida_y_vuelta(self):
+        fecha = '2025-02-10'
+        self.escribir_dia(fecha, self.ventas_del_dia(fecha))
+        del_csv = list(reportes.leer_filas(fecha))
+
+        self.assertTrue(columnar.convertir_dia(fecha, self.carpeta.name))
+        archivo = columnar.abrir_dia(fecha, self.carpeta.name)
+        self.assertIsNotNone(archivo)
+        archivo.cerrar()
+        self.assertEqual(list(reportes.leer_filas(fecha)), del_csv)
+        self.assertEqual(columnar.filas_dia(fecha, self.carpeta.name), len(del_csv))
+
+        # Si el CSV cambia, la copia se ignora y se vuelve a leer el CSV
+        self.escribir_dia(fecha, [[fecha, '20:00:00', 'P9', 'Otro', 1, '2.00', '2.00', 'E', 'Varios']], 'a')
+        self.assertIsNone(columnar.abrir_dia(fecha, self.carpeta.name))
+        self.assertEqual(len(list(reportes.leer_filas(fecha))), len(del_csv) + 1)
+
+    def test_valor_no_representable(self):
+        fecha = '2025-02-11'
+        self.escribir_dia(fecha, [[fecha, '10:00:00', 'P1', 'Uno', 3, '0.333', '0.999', 'E', 'Varios']])
+        self.assertFalse(columnar.convertir_dia(fecha, self.carpeta.name))
+        self.assertIsNone(columnar.abrir_dia(fecha, self.carpeta.name))
+
+    def test_historial_omite_el_dia_en_curso(self):
+        hoy = date.today().isoformat()
+        for fecha in ('2025-02-12', hoy):
+            self.escribir_dia(fecha, self.ventas_del_dia(fecha, 5))
+        self.assertEqual(columnar.convertir_historial(self.carpeta.name), (1, 0, 0))
+        self.assertIsNone(columnar.abrir_dia(hoy, self.carpeta.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
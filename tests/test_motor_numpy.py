@@ -0,0 +1,94 @@
+"""
+Pruebas de la agregación con NumPy
+Los resúmenes y el reporte del día de un archivo columnar tienen que salir idénticos
+(mismo orden de grupos y mismos montos) con el motor de Python y con el de NumPy
+"""
+import csv
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columnar
+import motor_numpy
+import reportes
+import resumenes
+
+ENCABEZADO = ['fecha', 'hora', 'codigo', 'nombre', 'cantidad', 'precio_unitario',
+              'subtotal', 'metodo_pago', 'categoria']
+
+
+def escribir_dia(carpeta, fecha, filas, azar):
+    """Escribe un CSV de ventas con productos, métodos y horas al azar"""
+    with open(os.path.join(carpeta, f'ventas_{fecha}.csv'), 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(ENCABEZADO)
+        for i in range(filas):
+            codigo, cantidad = azar.randint(1, 300), azar.randint(1, 9)
+            precio = round(azar.uniform(0.1, 50), 2)
+            # Algunos productos cambian de nombre a mitad del día
+            nombre = f'Prod {codigo}' if azar.random() > 0.05 else f'Prod {codigo} bis'
+            hora = f'{8 + i * 12 // filas:02d}:{i % 60:02d}:{i * 7 % 60:02d}'
+            escritor.writerow([fecha, hora, f'{codigo:03d}', nombre, cantidad, f'{precio:.2f}',
+                               f'{precio * cantidad:.2f}', azar.choice('EYPOX'),
+                               azar.choice(['Bebidas', 'Snacks', 'Varios'])])
+
+
+@unittest.skipUnless(motor_numpy.NUMPY_DISPONIBLE, "NumPy no está instalado")
+class PruebaMotorNumpy(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.originales = (motor_numpy.MOTOR_AGREGACION, reportes.RUTA_VENTAS_APP,
+                           reportes.MOTOR_ALMACENAMIENTO)
+        reportes.RUTA_VENTAS_APP = self.carpeta.name
+        reportes.MOTOR_ALMACENAMIENTO = 'csv'
+
+    def tearDown(self):
+        (motor_numpy.MOTOR_AGREGACION, reportes.RUTA_VENTAS_APP,
+         reportes.MOTOR_ALMACENAMIENTO) = self.originales
+        self.carpeta.cleanup()
+
+    def calcular(self, motor, fecha):
+        motor_numpy.MOTOR_AGREGACION = motor
+        tablas = resumenes.calcular_tablas(fecha, self.carpeta.name)
+        acumulado = reportes.acumular_dia(fecha)
+        return tablas, acumulado, reportes.armar_reporte_dia(fecha, acumulado)
+
+    def test_mismo_resultado(self):
+        azar = random.Random(7)
+        for i, filas in enumerate([1, 5, 3000]):
+            fecha = f'2025-03-0{i + 1}'
+            escribir_dia(self.carpeta.name, fecha, filas, azar)
+            self.assertTrue(columnar.convertir_dia(fecha, self.carpeta.name))
+
+            tablas, acumulado, reporte = self.calcular('python', fecha)
+            tablas_np, acumulado_np, reporte_np = self.calcular('numpy', fecha)
+            self.assertEqual(tablas_np, tablas, fecha)
+            # repr: mismo orden y mismos float exactos
+            self.assertEqual(repr(acumulado_np), repr(acumulado), fecha)
+            self.assertEqual(repr(reporte_np), repr(reporte), fecha)
+
+    def test_rango_decide_por_el_total(self):
+        azar = random.Random(3)
+        fechas = [f'2025-04-{dia:02d}' for dia in range(1, 6)]
+        for fecha in fechas:
+            escribir_dia(self.carpeta.name, fecha, 40, azar)
+            self.assertTrue(columnar.convertir_dia(fecha, self.carpeta.name))
+        self.assertEqual(columnar.filas_dia(fechas[0], self.carpeta.name), 40)
+
+        motor_numpy.MOTOR_AGREGACION = 'auto'
+        minimo = motor_numpy.MIN_FILAS_NUMPY
+        try:
+            motor_numpy.MIN_FILAS_NUMPY = 200
+            self.assertTrue(motor_numpy.conviene_rango(fechas, self.carpeta.name))
+            self.assertFalse(motor_numpy.conviene_rango(fechas[:4], self.carpeta.name))
+        finally:
+            motor_numpy.MIN_FILAS_NUMPY = minimo
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Pruebas de los totales acumulados de GestorVentas
+Con VERIFICAR_TOTALES cada calcular_totales() se compara con calcular_totales_completo(),
+el recálculo en float de ventas_actuales (precios con fracciones de céntimo)
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logica
+from logica import GestorProductos, GestorVentas
+from config import METODOS_PAGO
+
+
+class PruebaTotales(unittest.TestCase):
+
+    def setUp(self):
+        # Archivos en una carpeta temporal para no tocar los del programa
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.rutas = {}
+        for nombre, archivo in [('RUTA_PRODUCTOS', 'productos.csv'),
+                                ('RUTA_JOURNAL_PRODUCTOS', 'productos.journal'),
+                                ('RUTA_TEMPORAL_WAL', 'ventas_temporales.wal'),
+                                ('RUTA_TEMPORAL', 'ventas_temporales.json')]:
+            self.rutas[nombre] = getattr(logica, nombre)
+            setattr(logica, nombre, os.path.join(self.carpeta.name, archivo))
+        # Motor CSV y modo de verificación: calcular_totales() compara con el recálculo
+        for nombre, valor in [('MOTOR_ALMACENAMIENTO', 'csv'), ('VERIFICAR_TOTALES', True)]:
+            self.rutas[nombre] = getattr(logica, nombre)
+            setattr(logica, nombre, valor)
+
+        self.productos = GestorProductos()
+        self.ventas = GestorVentas()
+        self.metodos = list(METODOS_PAGO)
+
+    def tearDown(self):
+        for nombre, valor in self.rutas.items():
+            setattr(logica, nombre, valor)
+        self.carpeta.cleanup()
+
+    def comparar(self):
+        # Con VERIFICAR_TOTALES, calcular_totales() ya llama a verificar_totales()
+        totales = self.ventas.calcular_totales()
+        referencia = self.ventas.calcular_totales_completo()
+        for clave in ('general', 'efectivo', 'virtual'):
+            self.assertAlmostEqual(totales[clave], referencia[clave], places=9, msg=clave)
+
+    def test_agregar_editar_eliminar(self):
+        precios = ['0.333', '1.005', '2.675', '0.125', '9.999']
+        for i, precio in enumerate(precios):
+            exito, _ = self.productos.agregar_producto(f'P{i}', f'Producto {i}', precio, 'Pruebas', 100)
+            self.assertTrue(exito)
+
+        # Agregar: muchas líneas con subtotales que no son céntimos exactos
+        for i in range(300):
+            producto = self.productos.buscar_producto(f'P{i % len(precios)}')
+            self.ventas.agregar_venta(producto, i % 7 + 1, self.metodos[i % len(self.metodos)])
+            self.comparar()
+
+        # Editar el precio de un producto: las ventas ya agregadas conservan su precio
+        self.productos.editar_producto('P0', 'Producto 0', '0.3337', 'Pruebas')
+        for i in range(20):
+            self.ventas.agregar_venta(self.productos.buscar_producto('P0'), 3, self.metodos[0])
+            self.comparar()
+
+        # Eliminar desde distintas posiciones hasta vaciar la caja
+        paso = 0
+        while self.ventas.ventas_actuales:
+            indice = (paso * 37) % len(self.ventas.ventas_actuales)
+            codigo = self.ventas.ventas_actuales[indice]['codigo']
+            self.assertTrue(self.ventas.eliminar_venta(indice, codigo))
+            self.comparar()
+            paso += 1
+
+        self.assertEqual(self.ventas.calcular_totales()['general'], 0)
+
+    def test_verificacion_detecta_desfase(self):
+        self.productos.agregar_producto('P1', 'Producto 1', '0.333', 'Pruebas', 100)
+        self.ventas.agregar_venta(self.productos.buscar_producto('P1'), 3, 'E')
+        self.comparar()
+
+        # Totales acumulados desfasados de ventas_actuales: la verificación tiene que fallar
+        self.ventas.totales_metodo['E'] += 1
+        with self.assertRaises(AssertionError):
+            self.ventas.verificar_totales()
+        with self.assertRaises(AssertionError):
+            self.ventas.calcular_totales()
+
+    def test_recuperar_temporal(self):
+        self.productos.agregar_producto('P1', 'Producto 1', '0.333', 'Pruebas', 100)
+        producto = self.productos.buscar_producto('P1')
+        for i in range(10):
+            self.ventas.agregar_venta(producto, i + 1, self.metodos[i % len(self.metodos)])
+        self.ventas.autoguardar_temporal()
+        self.ventas.eliminar_venta(4, 'P1')
+
+        recuperado = GestorVentas()
+        exito, _ = recuperado.cargar_temporal()
+        self.assertTrue(exito)
+        self.assertEqual(recuperado.ventas_actuales, self.ventas.ventas_actuales)
+        self.assertEqual(recuperado.calcular_totales(), self.ventas.calcular_totales())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 """
 Ventanas de Reportes del Sistema de Bazar - VERSIÓN LIMPIA
-Solo: Reporte del Día e Inventario Vendido
+Reporte del Día, Inventario Vendido y Ventas por Hora
 """
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime, timedelta
@@ -9,10 +11,39 @@ from config import *
 from reportes import AnalizadorVentas, ExportadorReportes
 
 
+def en_segundo_plano(ventana, trabajo, al_terminar):
+    """
+    Ejecuta trabajo() en un hilo aparte y llama a al_terminar(resultado) desde el hilo
+    de Tk, revisando con after() (como la carga del catálogo). Si trabajo falla, el
+    error se informa y resultado es None.
+    """
+    cola = queue.Queue()
+    
+    def ejecutar():
+        try:
+            cola.put(trabajo())
+        except Exception as e:
+            print(f"Error al cargar reporte: {e}")
+            cola.put(None)
+    
+    def revisar():
+        if not ventana.winfo_exists():
+            return  # la ventana se cerró mientras tanto
+        try:
+            resultado = cola.get_nowait()
+        except queue.Empty:
+            ventana.after(50, revisar)
+            return
+        al_terminar(resultado)
+    
+    threading.Thread(target=ejecutar, daemon=True).start()
+    ventana.after(50, revisar)
+
+
 class VentanaReporteDia:
     """Ventana para consultar ventas de días específicos"""
     
-    def __init__(self, parent):
+    def __init__(self, parent, gestor_ventas=None):
         self.ventana = tk.Toplevel(parent)
         self.ventana.title("📊 Consultar Ventas Diarias")
         self.ventana.geometry("800x600")
@@ -21,8 +52,12 @@ class VentanaReporteDia:
         self.ventana.configure(bg=COLORES['fondo'])
         
         self.analizador = AnalizadorVentas()
+        # El día de hoy se toma del reporte en memoria de GestorVentas (sin leer el disco)
+        self.gestor_ventas = gestor_ventas
+        self.var_carrito = tk.BooleanVar(value=False)
         self.datos = None
         self.fecha_seleccionada = datetime.now().strftime('%Y-%m-%d')
+        self.cargas = 0  # número de la última carga pedida (las anteriores se descartan)
         
         self.crear_interfaz()
         self.cargar_datos()
@@ -77,6 +112,13 @@ class VentanaReporteDia:
                      bg='#1976D2', fg='white', font=FUENTES['pequeña'],
                      cursor='hand2', padx=10).pack(side=tk.LEFT, padx=3)
         
+        if self.gestor_ventas is not None:
+            tk.Checkbutton(frame_rapidos, text="Incluir venta en curso (hoy)",
+                          variable=self.var_carrito, command=self.cargar_datos,
+                          bg=COLORES['primario'], fg='white', selectcolor=COLORES['primario'],
+                          activebackground=COLORES['primario'],
+                          font=FUENTES['pequeña']).pack(side=tk.LEFT, padx=8)
+        
         # Label de fecha actual
         self.label_fecha = tk.Label(self.ventana, text="", 
                                    font=FUENTES['titulo'], bg=COLORES['fondo'])
@@ -174,8 +216,34 @@ class VentanaReporteDia:
         self.cargar_datos()
     
     def cargar_datos(self):
-        """Carga los datos de la fecha seleccionada"""
-        self.datos = self.analizador.reporte_dia(self.fecha_seleccionada)
+        """
+        Carga los datos de la fecha seleccionada en segundo plano: leer el archivo del
+        día (o esperar a que el hilo escritor termine un cierre) no congela la ventana
+        """
+        fecha = self.fecha_seleccionada
+        en_vivo = (self.gestor_ventas is not None and
+                   fecha == datetime.now().strftime('%Y-%m-%d'))
+        con_carrito = en_vivo and self.var_carrito.get()
+        if en_vivo:
+            # La venta en curso se copia aquí, en el hilo de Tk, que es el que la modifica
+            carrito = list(self.gestor_ventas.obtener_ventas()) if con_carrito else ()
+            trabajo = lambda: self.gestor_ventas.reporte_del_dia(carrito)
+        else:
+            trabajo = lambda: self.analizador.reporte_dia(fecha)
+        
+        self.cargas += 1
+        numero = self.cargas
+        self.label_fecha.config(text=f"⏳ Cargando ventas del {fecha}...", fg=COLORES['texto'])
+        
+        def terminar(datos):
+            if numero == self.cargas:  # si se pidió otra fecha mientras tanto, se ignora
+                self.mostrar_datos(datos, con_carrito)
+        
+        en_segundo_plano(self.ventana, trabajo, terminar)
+    
+    def mostrar_datos(self, datos, con_carrito=False):
+        """Muestra el reporte cargado por cargar_datos"""
+        self.datos = datos
         
         if not self.datos:
             # Mostrar mensaje de no hay ventas
@@ -203,8 +271,9 @@ class VentanaReporteDia:
             fecha_obj = datetime.strptime(self.fecha_seleccionada, '%Y-%m-%d')
             dia_semana = fecha_obj.strftime('%A')
             fecha_formateada = fecha_obj.strftime('%d/%m/%Y')
+            detalle = " (incluye venta en curso)" if con_carrito else ""
             self.label_fecha.config(
-                text=f"📅 {dia_semana} {fecha_formateada}",
+                text=f"📅 {dia_semana} {fecha_formateada}{detalle}",
                 fg=COLORES['texto']
             )
         except:
@@ -321,13 +390,15 @@ class VentanaInventarioVendido:
     def __init__(self, parent):
         self.ventana = tk.Toplevel(parent)
         self.ventana.title("📋 Inventario Vendido")
-        self.ventana.geometry("650x600")
-        self.ventana.minsize(750, 550)
+        self.ventana.geometry("900x700")
+        self.ventana.minsize(850, 650)
         self.ventana.resizable(True, True)
         self.ventana.configure(bg=COLORES['fondo'])
         
         self.analizador = AnalizadorVentas()
         self.gestor_productos = None
+        self.rango_cargado = None  # (desde, hasta) ya cargado: cambiar filtros no relee archivos
+        self.cargando = False  # hay una carga de rango en curso (en segundo plano)
         
         self.crear_interfaz()
     
@@ -360,33 +431,45 @@ class VentanaInventarioVendido:
         self.entry_fecha_fin.insert(0, fecha_fin.strftime('%Y-%m-%d'))
         self.entry_fecha_fin.grid(row=0, column=3, padx=3, pady=3)
         
-        # Filtros adicionales
+        # Filtros adicionales (selección múltiple; sin selección = todos)
         frame_filtros_extra = tk.Frame(frame_filtros, bg=COLORES['fondo'])
         frame_filtros_extra.pack(pady=5)
         
-        tk.Label(frame_filtros_extra, text="Categoría:", font=FUENTES['normal'],
-                bg=COLORES['fondo']).grid(row=0, column=0, padx=3, pady=3)
-        
-        self.combo_categoria = ttk.Combobox(frame_filtros_extra, font=FUENTES['normal'], 
-                                            width=15, state='readonly')
-        self.combo_categoria.set('Todas')
-        self.combo_categoria.grid(row=0, column=1, padx=3, pady=3)
-        
-        tk.Label(frame_filtros_extra, text="Producto:", font=FUENTES['normal'],
-                bg=COLORES['fondo']).grid(row=0, column=2, padx=3, pady=3)
-        
-        self.combo_producto = ttk.Combobox(frame_filtros_extra, font=FUENTES['normal'], 
-                                           width=25, state='readonly')
-        self.combo_producto.set('Todos')
-        self.combo_producto.grid(row=0, column=3, padx=3, pady=3)
+        self.lista_categorias = self.crear_lista(frame_filtros_extra, "Categorías:", 0, 15)
+        self.lista_metodos = self.crear_lista(frame_filtros_extra, "Métodos de pago:", 1, 12)
+        self.lista_productos = self.crear_lista(frame_filtros_extra, "Productos:", 2, 30)
+        self.codigos_metodos = list(METODOS_PAGO)
+        for codigo in self.codigos_metodos:
+            self.lista_metodos.insert(tk.END, METODOS_PAGO[codigo])
+        
+        # Rango de horas
+        frame_horas = tk.Frame(frame_filtros_extra, bg=COLORES['fondo'])
+        frame_horas.grid(row=0, column=3, rowspan=2, padx=5, sticky='n')
+        tk.Label(frame_horas, text="Horas:", font=FUENTES['normal'],
+                bg=COLORES['fondo']).pack(anchor='w')
+        self.spin_hora_desde = tk.Spinbox(frame_horas, from_=0, to=23, width=4, font=FUENTES['normal'],
+                                          format='%02.0f', command=self.aplicar_filtros)
+        self.spin_hora_desde.pack(pady=2)
+        tk.Label(frame_horas, text="a", font=FUENTES['normal'], bg=COLORES['fondo']).pack()
+        self.spin_hora_hasta = tk.Spinbox(frame_horas, from_=0, to=23, width=4, font=FUENTES['normal'],
+                                          format='%02.0f', command=self.aplicar_filtros)
+        self.spin_hora_hasta.delete(0, tk.END)
+        self.spin_hora_hasta.insert(0, '23')
+        self.spin_hora_hasta.pack(pady=2)
+        for spin in (self.spin_hora_desde, self.spin_hora_hasta):
+            spin.bind('<Return>', lambda e: self.aplicar_filtros())
         
         # Botones
         frame_botones = tk.Frame(frame_filtros, bg=COLORES['fondo'])
         frame_botones.pack(pady=10)
         
-        tk.Button(frame_botones, text="Analizar", command=self.analizar,
-                 bg=COLORES['primario'], fg='white', font=FUENTES['normal'],
-                 cursor='hand2', padx=20).pack(side=tk.LEFT, padx=5)
+        self.btn_analizar = tk.Button(frame_botones, text="Analizar", command=self.analizar,
+                                      bg=COLORES['primario'], fg='white', font=FUENTES['normal'],
+                                      cursor='hand2', padx=20)
+        self.btn_analizar.pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(frame_botones, text="Limpiar filtros", command=self.limpiar_filtros,
+                 font=FUENTES['normal'], cursor='hand2', padx=20).pack(side=tk.LEFT, padx=3)
         
         tk.Button(frame_botones, text="Exportar CSV", command=self.exportar,
                  bg=COLORES['secundario'], fg='white', font=FUENTES['normal'],
@@ -430,45 +513,133 @@ class VentanaInventarioVendido:
                                       font=FUENTES['normal'], bg='#e8f5e9')
         self.label_resumen.pack(pady=10)
     
+    def crear_lista(self, padre, titulo, columna, ancho):
+        """Lista de selección múltiple con su título y barra de desplazamiento"""
+        frame = tk.Frame(padre, bg=COLORES['fondo'])
+        frame.grid(row=0, column=columna, padx=5, sticky='n')
+        tk.Label(frame, text=titulo, font=FUENTES['normal'], bg=COLORES['fondo']).pack(anchor='w')
+        
+        scroll = tk.Scrollbar(frame, orient=tk.VERTICAL)
+        lista = tk.Listbox(frame, selectmode=tk.MULTIPLE, exportselection=False, height=5,
+                           width=ancho, font=FUENTES['normal'], yscrollcommand=scroll.set)
+        scroll.config(command=lista.yview)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        lista.pack(side=tk.LEFT)
+        lista.bind('<<ListboxSelect>>', lambda e: self.aplicar_filtros())
+        return lista
+    
     def set_gestor_productos(self, gestor):
-        """Asigna el gestor de productos para llenar combos"""
+        """Asigna el gestor de productos para llenar las listas"""
         self.gestor_productos = gestor
         if gestor:
-            # Llenar combo de categorías
-            categorias = ['Todas'] + gestor.obtener_categorias()
-            self.combo_categoria['values'] = categorias
+            # Llenar lista de categorías
+            self.lista_categorias.delete(0, tk.END)
+            for categoria in gestor.obtener_categorias():
+                self.lista_categorias.insert(tk.END, categoria)
             
-            # Llenar combo de productos
-            productos = ['Todos'] + [f"{p['codigo']} - {p['nombre']}" 
-                                    for p in gestor.productos]
-            self.combo_producto['values'] = productos
+            # Llenar lista de productos
+            self.lista_productos.delete(0, tk.END)
+            for texto in gestor.obtener_textos_codigo_nombre():
+                self.lista_productos.insert(tk.END, texto)
     
     def analizar(self):
-        """Realiza el análisis con los filtros seleccionados"""
+        """
+        Carga el rango de fechas en un hilo aparte (la ventana sigue respondiendo mientras
+        se leen o calculan los resúmenes) y después aplica los filtros seleccionados
+        """
+        if self.cargando:
+            return
         fecha_inicio = self.entry_fecha_inicio.get()
         fecha_fin = self.entry_fecha_fin.get()
-        
-        # Cargar ventas
-        if not self.analizador.cargar_ventas_rango(fecha_inicio, fecha_fin):
+        con_hora = 'hora' in self.condicion_filtros()
+        
+        # Cargar ventas (siempre: los archivos del rango pueden haber cambiado)
+        self.rango_cargado = None
+        self.cargando = True
+        self.btn_analizar.config(state='disabled')
+        self.label_resumen.config(text="⏳ Cargando ventas del rango...")
+        
+        analizador = AnalizadorVentas()
+        def cargar():
+            if not analizador.cargar_ventas_rango(fecha_inicio, fecha_fin):
+                return False
+            # Los índices también se arman aquí: después filtrar es inmediato
+            analizador.indice_ventas()
+            if con_hora:
+                analizador.indice_por_hora()
+            return True
+        
+        en_segundo_plano(self.ventana, cargar,
+                         lambda cargado: self.terminar_analisis(analizador, fecha_inicio,
+                                                                fecha_fin, cargado))
+    
+    def terminar_analisis(self, analizador, fecha_inicio, fecha_fin, cargado):
+        """Muestra el rango cargado en segundo plano (se llama desde el hilo de Tk)"""
+        self.cargando = False
+        self.btn_analizar.config(state='normal')
+        if not cargado:
+            self.limpiar_tabla()
+            self.label_resumen.config(text="Sin datos")
             messagebox.showwarning("Sin datos", 
                                   "No hay ventas registradas en el rango seleccionado")
             return
+        self.analizador = analizador
+        self.rango_cargado = (fecha_inicio, fecha_fin)
+        self.aplicar_filtros()
+    
+    def cargar_indice_horas(self):
+        """Arma en un hilo aparte el índice por hora del rango cargado y vuelve a filtrar"""
+        self.cargando = True
+        self.btn_analizar.config(state='disabled')
+        self.label_resumen.config(text="⏳ Cargando ventas por hora del rango...")
+        
+        def terminar(resultado):
+            self.cargando = False
+            self.btn_analizar.config(state='normal')
+            if resultado is None:
+                self.label_resumen.config(text="Error al cargar las ventas por hora")
+                return
+            self.aplicar_filtros()
+        
+        en_segundo_plano(self.ventana, self.analizador.indice_por_hora, terminar)
+    
+    def condicion_filtros(self):
+        """Filtros seleccionados como condición del índice: {columna: valores}"""
+        condicion = {}
+        categorias = [self.lista_categorias.get(i) for i in self.lista_categorias.curselection()]
+        if categorias:
+            condicion['categoria'] = categorias
+        metodos = [self.codigos_metodos[i] for i in self.lista_metodos.curselection()]
+        if metodos:
+            condicion['metodo_pago'] = metodos
+        productos = [self.lista_productos.get(i).split(' - ')[0]
+                     for i in self.lista_productos.curselection()]
+        if productos:
+            condicion['codigo'] = productos
         
-        # Aplicar filtros
-        categoria = self.combo_categoria.get()
-        categoria = None if categoria == 'Todas' else categoria
-        
-        producto_sel = self.combo_producto.get()
-        codigo_producto = None
-        if producto_sel != 'Todos':
-            codigo_producto = producto_sel.split(' - ')[0]
-        
-        # Obtener inventario
-        inventario = self.analizador.inventario_vendido(categoria, codigo_producto)
-        
-        # Limpiar tabla
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        try:
+            desde = int(self.spin_hora_desde.get())
+            hasta = int(self.spin_hora_hasta.get())
+        except ValueError:
+            desde, hasta = 0, 23
+        if (desde, hasta) != (0, 23):
+            # Un rango que pasa la medianoche (ej. 22 a 02) se parte en dos
+            horas = list(range(desde, hasta + 1)) if desde <= hasta else \
+                list(range(desde, 24)) + list(range(0, hasta + 1))
+            condicion['hora'] = horas
+        return condicion
+    
+    def aplicar_filtros(self):
+        """Vuelve a consultar el periodo ya cargado con los filtros actuales (sin releer archivos)"""
+        if self.rango_cargado is None or self.cargando:
+            return
+        condicion = self.condicion_filtros()
+        if 'hora' in condicion and self.analizador.indice_horas is None:
+            # El primer filtro por hora lee la tabla por hora del rango: en segundo plano
+            self.cargar_indice_horas()
+            return
+        inventario = self.analizador.consultar(condicion)
+        self.limpiar_tabla()
         
         # Llenar tabla
         total_cantidad = 0
@@ -492,6 +663,20 @@ class VentanaInventarioVendido:
                  f"Ingresos: S/ {total_ingresos:.2f}"
         )
     
+    def limpiar_filtros(self):
+        """Quita todas las selecciones y vuelve a consultar"""
+        for lista in (self.lista_categorias, self.lista_metodos, self.lista_productos):
+            lista.selection_clear(0, tk.END)
+        for spin, valor in ((self.spin_hora_desde, '00'), (self.spin_hora_hasta, '23')):
+            spin.delete(0, tk.END)
+            spin.insert(0, valor)
+        self.aplicar_filtros()
+    
+    def limpiar_tabla(self):
+        """Borra las filas de la tabla"""
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+    
     def exportar(self):
         """Exporta el inventario actual a CSV"""
         items = []
@@ -519,4 +704,225 @@ class VentanaInventarioVendido:
         if exito:
             messagebox.showinfo("Éxito", f"Reporte exportado en:\n{ruta}")
         else:
-            messagebox.showerror("Error", f"No se pudo exportar: {ruta}")
\ No newline at end of file
+            messagebox.showerror("Error", f"No se pudo exportar: {ruta}")
+
+
+class VentanaMapaHoras:
+    """Ventana con mapas de calor de ventas por hora (día de la semana y producto)"""
+    
+    DIAS_SEMANA = ('Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo')
+    
+    def __init__(self, parent):
+        self.ventana = tk.Toplevel(parent)
+        self.ventana.title("🕒 Ventas por Hora")
+        self.ventana.geometry("1000x650")
+        self.ventana.minsize(800, 550)
+        self.ventana.resizable(True, True)
+        self.ventana.configure(bg=COLORES['fondo'])
+        
+        self.analizador = AnalizadorVentas()
+        self.cargado = False
+        self.cargando = False  # hay una carga de rango en curso (en segundo plano)
+        self.var_medida = tk.StringVar(value='cantidad')
+        self.var_promedio = tk.BooleanVar(value=True)
+        
+        self.crear_interfaz()
+    
+    def crear_interfaz(self):
+        """Crea la interfaz"""
+        # Filtros: rango de fechas y medida
+        frame_filtros = tk.LabelFrame(self.ventana, text="Periodo",
+                                    font=FUENTES['titulo'], bg=COLORES['fondo'])
+        frame_filtros.pack(fill=tk.X, padx=10, pady=10)
+        
+        frame_fechas = tk.Frame(frame_filtros, bg=COLORES['fondo'])
+        frame_fechas.pack(pady=5)
+        
+        # Fecha por defecto: los últimos 90 días
+        fecha_fin = datetime.now()
+        fecha_inicio = fecha_fin - timedelta(days=90)
+        
+        tk.Label(frame_fechas, text="Desde:", font=FUENTES['normal'],
+                bg=COLORES['fondo']).pack(side=tk.LEFT, padx=3)
+        self.entry_fecha_inicio = tk.Entry(frame_fechas, font=FUENTES['normal'], width=12)
+        self.entry_fecha_inicio.insert(0, fecha_inicio.strftime('%Y-%m-%d'))
+        self.entry_fecha_inicio.pack(side=tk.LEFT, padx=3)
+        
+        tk.Label(frame_fechas, text="Hasta:", font=FUENTES['normal'],
+                bg=COLORES['fondo']).pack(side=tk.LEFT, padx=3)
+        self.entry_fecha_fin = tk.Entry(frame_fechas, font=FUENTES['normal'], width=12)
+        self.entry_fecha_fin.insert(0, fecha_fin.strftime('%Y-%m-%d'))
+        self.entry_fecha_fin.pack(side=tk.LEFT, padx=3)
+        
+        for texto, dias in [("30 días", 30), ("90 días", 90), ("1 año", 365)]:
+            tk.Button(frame_fechas, text=texto, command=lambda d=dias: self.ultimos_dias(d),
+                     font=FUENTES['pequeña'], cursor='hand2', padx=8).pack(side=tk.LEFT, padx=3)
+        
+        self.btn_analizar = tk.Button(frame_fechas, text="Analizar", command=self.analizar,
+                                      bg=COLORES['primario'], fg='white', font=FUENTES['normal'],
+                                      cursor='hand2', padx=20)
+        self.btn_analizar.pack(side=tk.LEFT, padx=10)
+        
+        frame_medida = tk.Frame(frame_filtros, bg=COLORES['fondo'])
+        frame_medida.pack(pady=5)
+        
+        tk.Label(frame_medida, text="Mostrar:", font=FUENTES['normal'],
+                bg=COLORES['fondo']).pack(side=tk.LEFT, padx=3)
+        for texto, valor in [("Unidades", 'cantidad'), ("Ingresos (S/)", 'ingresos')]:
+            tk.Radiobutton(frame_medida, text=texto, variable=self.var_medida, value=valor,
+                          command=self.dibujar, font=FUENTES['normal'],
+                          bg=COLORES['fondo']).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(frame_medida, text="Promedio por día (día × hora)",
+                      variable=self.var_promedio, command=self.dibujar,
+                      font=FUENTES['normal'], bg=COLORES['fondo']).pack(side=tk.LEFT, padx=10)
+        
+        tk.Label(frame_medida, text="Productos:", font=FUENTES['normal'],
+                bg=COLORES['fondo']).pack(side=tk.LEFT, padx=3)
+        self.spin_limite = tk.Spinbox(frame_medida, from_=5, to=100, increment=5, width=4,
+                                      font=FUENTES['normal'], command=self.dibujar)
+        self.spin_limite.delete(0, tk.END)
+        self.spin_limite.insert(0, '20')
+        self.spin_limite.pack(side=tk.LEFT, padx=3)
+        
+        # Pestañas con un mapa cada una
+        pestanas = ttk.Notebook(self.ventana)
+        pestanas.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.canvas_semana = self.crear_canvas(pestanas, "Día de la semana × hora")
+        self.canvas_productos = self.crear_canvas(pestanas, "Producto × hora")
+        
+        self.label_resumen = tk.Label(self.ventana, text="Seleccione rango de fechas y presione Analizar",
+                                      font=FUENTES['normal'], bg='#e8f5e9')
+        self.label_resumen.pack(fill=tk.X, padx=10, pady=10, ipady=8)
+    
+    def crear_canvas(self, pestanas, titulo):
+        """Pestaña con un canvas desplazable para dibujar un mapa"""
+        frame = tk.Frame(pestanas, bg='white')
+        pestanas.add(frame, text=titulo)
+        
+        scroll_y = tk.Scrollbar(frame, orient=tk.VERTICAL)
+        scroll_x = tk.Scrollbar(frame, orient=tk.HORIZONTAL)
+        canvas = tk.Canvas(frame, bg='white', highlightthickness=0,
+                           yscrollcommand=scroll_y.set, xscrollcommand=scroll_x.set)
+        scroll_y.config(command=canvas.yview)
+        scroll_x.config(command=canvas.xview)
+        scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+        scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        return canvas
+    
+    def ultimos_dias(self, dias):
+        """Pone el rango en los últimos `dias` días y analiza"""
+        fin = datetime.now()
+        self.entry_fecha_inicio.delete(0, tk.END)
+        self.entry_fecha_inicio.insert(0, (fin - timedelta(days=dias)).strftime('%Y-%m-%d'))
+        self.entry_fecha_fin.delete(0, tk.END)
+        self.entry_fecha_fin.insert(0, fin.strftime('%Y-%m-%d'))
+        self.analizar()
+    
+    def analizar(self):
+        """
+        Carga el rango en un hilo aparte (usa los resúmenes por hora ya calculados)
+        y al terminar dibuja los mapas
+        """
+        if self.cargando:
+            return
+        fecha_inicio = self.entry_fecha_inicio.get()
+        fecha_fin = self.entry_fecha_fin.get()
+        self.cargando = True
+        self.btn_analizar.config(state='disabled')
+        self.label_resumen.config(text="⏳ Cargando ventas del rango...")
+        
+        analizador = AnalizadorVentas()
+        def cargar():
+            if not analizador.cargar_ventas_rango(fecha_inicio, fecha_fin):
+                return False
+            # Las dos tablas que usan los mapas se leen aquí: redibujar es inmediato
+            analizador.resumen_periodo()
+            analizador.resumen_por_hora()
+            return True
+        
+        en_segundo_plano(self.ventana, cargar,
+                         lambda cargado: self.terminar_analisis(analizador, cargado))
+    
+    def terminar_analisis(self, analizador, cargado):
+        """Dibuja el rango cargado en segundo plano (se llama desde el hilo de Tk)"""
+        self.cargando = False
+        self.btn_analizar.config(state='normal')
+        self.cargado = bool(cargado)
+        if not self.cargado:
+            for canvas in (self.canvas_semana, self.canvas_productos):
+                canvas.delete('all')
+            self.label_resumen.config(text="Sin datos")
+            messagebox.showwarning("Sin datos",
+                                  "No hay ventas registradas en el rango seleccionado")
+            return
+        self.analizador = analizador
+        self.dibujar()
+    
+    def dibujar(self):
+        """Redibuja ambos mapas con la medida elegida (sin volver a cargar el rango)"""
+        if not self.cargado:
+            return
+        medida = self.var_medida.get()
+        try:
+            limite = int(self.spin_limite.get())
+        except ValueError:
+            limite = 20
+        
+        semana = self.analizador.mapa_semana(medida, self.var_promedio.get())
+        productos = self.analizador.mapa_productos(medida, limite)
+        
+        # Solo las horas con alguna venta (de la primera a la última)
+        horas = [hora for hora in range(24) if any(fila[hora] for fila in semana)]
+        horas = list(range(horas[0], horas[-1] + 1)) if horas else list(range(24))
+        
+        self.dibujar_mapa(self.canvas_semana, self.DIAS_SEMANA, semana, horas)
+        self.dibujar_mapa(self.canvas_productos,
+                          [f"{p['codigo']} - {p['nombre']}"[:32] for p in productos],
+                          [p['horas'] for p in productos], horas)
+        
+        # Hora pico (en el total del periodo)
+        totales = [sum(fila[hora] for fila in semana) for hora in range(24)]
+        pico = max(range(24), key=lambda hora: totales[hora])
+        dia_pico = max(range(7), key=lambda dia: sum(semana[dia]))
+        self.label_resumen.config(
+            text=f"Hora pico: {pico:02d}:00 - {pico + 1:02d}:00 | "
+                 f"Día con más ventas: {self.DIAS_SEMANA[dia_pico]} | "
+                 f"Días con ventas en el periodo: {sum(self.analizador.dias_por_semana())}"
+        )
+    
+    def dibujar_mapa(self, canvas, etiquetas, filas, horas):
+        """Dibuja una grilla etiqueta × hora, con color más intenso cuanto mayor el valor"""
+        canvas.delete('all')
+        ancho_etiqueta, ancho, alto = 230, 52, 26
+        maximo = max((fila[hora] for fila in filas for hora in horas), default=0) or 1
+        
+        for columna, hora in enumerate(horas):
+            canvas.create_text(ancho_etiqueta + columna * ancho + ancho / 2, alto / 2,
+                               text=f"{hora:02d}h", font=FUENTES['pequeña'])
+        
+        for numero, (etiqueta, fila) in enumerate(zip(etiquetas, filas)):
+            y = (numero + 1) * alto
+            canvas.create_text(5, y + alto / 2, text=etiqueta, anchor='w', font=FUENTES['pequeña'])
+            for columna, hora in enumerate(horas):
+                valor = fila[hora]
+                x = ancho_etiqueta + columna * ancho
+                intensidad = valor / maximo
+                canvas.create_rectangle(x, y, x + ancho, y + alto, fill=color_calor(intensidad),
+                                        outline=COLORES['borde'])
+                if valor:
+                    # Promedios chicos con un decimal; el resto redondeado
+                    texto = f"{valor:.0f}" if valor >= 10 or valor == int(valor) else f"{valor:.1f}"
+                    canvas.create_text(x + ancho / 2, y + alto / 2, text=texto,
+                                       fill='white' if intensidad > 0.6 else COLORES['texto'],
+                                       font=FUENTES['pequeña'])
+        
+        canvas.config(scrollregion=(0, 0, ancho_etiqueta + len(horas) * ancho + 5,
+                                    (len(filas) + 1) * alto + 5))
+
+
+def color_calor(intensidad):
+    """Color entre blanco (0) y el color primario (1)"""
+    primario = COLORES['primario'].lstrip('#')
+    canales = (int(primario[i:i + 2], 16) for i in (0, 2, 4))
+    return '#' + ''.join(f"{round(255 + (canal - 255) * intensidad):02x}" for canal in canales)